@@ -0,0 +1,177 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gzip
+import json
+import requests
+import threading
+import time
+
+from RwsFetcher import ReadDeadlineExceeded, ResponseTooLarge
+from RwsHttpCache import response_from_dict, response_to_dict
+from RwsResolver import UnresolvableHost
+
+CASSETTE_VERSION = 2
+# The errors raised by RwsFetcher itself, while a response is read or
+# instead of requesting a host that did not resolve, which a replayed run
+# raises as they were recorded
+FETCHER_ERRORS = {
+    error_type.__name__: error_type
+    for error_type in (ReadDeadlineExceeded, ResponseTooLarge, UnresolvableHost)
+}
+
+
+class CassetteMiss(Exception):
+    """Raised when a replayed run makes a request that was never recorded"""
+
+    def __init__(self, url):
+        super().__init__(f"The cassette has no recorded response for {url}")
+        self.url = url
+
+
+def _rebuild_error(error):
+    # Rebuilds a recorded exception with its recorded message. The fetcher's
+    # own errors are built from a url or host and a limit or reason that
+    # were not recorded, so they are given the message as it is instead.
+    if error["type"] in FETCHER_ERRORS:
+        error_type = FETCHER_ERRORS[error["type"]]
+        inst = error_type.__new__(error_type)
+        requests.exceptions.RequestException.__init__(inst, error["message"])
+        return inst
+    error_type = getattr(requests.exceptions, error["type"], None)
+    if not isinstance(error_type, type) or not issubclass(error_type, Exception):
+        error_type = requests.exceptions.RequestException
+    return error_type(error["message"])
+
+
+def _interaction_key(method, url, kwargs):
+    # Streamed GET requests, whose bodies may be cut short, are told apart
+    # from the GET requests of the same url
+    if method == "GET" and kwargs.get("stream"):
+        method = "GET stream"
+    return f"{method} {url} {kwargs.get('allow_redirects', True)}"
+
+
+class CassetteRecorder:
+    """Records every request made by an RwsFetcher and what it returned
+
+    Interactions are kept in memory and written out by save as a gzipped JSON
+    file, with the response, or the exception raised, and the latency of
+    each request.
+    """
+
+    def __init__(self):
+        self._interactions = []
+        self._lock = threading.Lock()
+
+    def record(self, url, kwargs, latency, response=None, error=None, method="GET"):
+        """Records the outcome of a single request
+
+        Args:
+            url: the url that was requested
+            kwargs: the keyword arguments the request was made with
+            latency: the number of seconds the request took
+            response: the requests.Response received, if any
+            error: the exception raised by the request, if any
+            method: the method of the request
+        """
+        interaction = {
+            "key": _interaction_key(method, url, kwargs),
+            "latency": round(latency, 4),
+        }
+        if error is not None:
+            interaction["error"] = {"type": type(error).__name__, "message": str(error)}
+        else:
+            interaction["response"] = response_to_dict(response)
+        with self._lock:
+            self._interactions.append(interaction)
+
+    def save(self, path):
+        """Writes the recorded interactions to a cassette file
+
+        Args:
+            path: the path of the cassette file to write
+        """
+        with self._lock:
+            cassette = {
+                "version": CASSETTE_VERSION,
+                "interactions": list(self._interactions),
+            }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(cassette, f, separators=(",", ":"))
+
+
+class CassettePlayer:
+    """Serves the requests of an RwsFetcher from a recorded cassette
+
+    Takes the place of the fetcher's requests.Session. Requests are answered
+    in the order they were recorded for each url and redirect policy; once
+    they run out, the last one is repeated. Each answer is delayed by its
+    recorded latency multiplied by latency_scale.
+
+    Attributes:
+      latency_scale: the factor applied to recorded latencies; 0 replays
+      without any delay
+    """
+
+    def __init__(self, interactions, latency_scale=1.0, sleep=time.sleep):
+        self.latency_scale = latency_scale
+        self._sleep = sleep
+        self._interactions = {}
+        for interaction in interactions:
+            self._interactions.setdefault(interaction["key"], []).append(interaction)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, latency_scale=1.0):
+        """Returns a CassettePlayer for a cassette file written by
+        CassetteRecorder.save"""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            cassette = json.load(f)
+        if cassette.get("version") != CASSETTE_VERSION:
+            raise ValueError(
+                f"{path} is a version {cassette.get('version')} cassette, "
+                + f"expected version {CASSETTE_VERSION}"
+            )
+        return cls(cassette["interactions"], latency_scale)
+
+    def get(self, url, **kwargs):
+        """Replays the recorded response for a GET request
+
+        Args:
+            url: string
+            **kwargs: the keyword arguments of requests.Session.get
+        Returns:
+            requests.Response
+        Raises:
+            CassetteMiss if the request was never recorded, or the exception
+            recorded for it
+        """
+        return self._replay("GET", url, kwargs)
+
+    def head(self, url, **kwargs):
+        """Replays the recorded response for a HEAD request, see get"""
+        return self._replay("HEAD", url, kwargs)
+
+    def _replay(self, method, url, kwargs):
+        key = _interaction_key(method, url, kwargs)
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                raise CassetteMiss(url)
+            interaction = recorded.pop(0) if len(recorded) > 1 else recorded[0]
+        if self.latency_scale:
+            self._sleep(interaction["latency"] * self.latency_scale)
+        if "error" in interaction:
+            raise _rebuild_error(interaction["error"])
+        return response_from_dict(interaction["response"])
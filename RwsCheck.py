@@ -12,69 +12,164 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
-import requests
 
-from jsonschema import validate
-from publicsuffixlist import PublicSuffixList
+from typing import TYPE_CHECKING
 
-from RwsSet import RwsSet
+from RwsSet import FrozenRwsSet, RwsSet
+from RwsSuffixIndex import RwsSuffixIndex
+
+# jsonschema, and the network modules that import requests, are imported by
+# the checks that use them, so that runs which stop before those checks, such
+# as those of a list with a format or schema error, never import them
+if TYPE_CHECKING:
+    from publicsuffixlist import PublicSuffixList
+    from RwsFetcher import RwsFetcher
+    from RwsReporter import RwsReporter
 
 WELL_KNOWN = "/.well-known/related-website-set.json"
 
 
+def default_fetcher():
+    """Returns an RwsFetcher with the default settings"""
+    from RwsFetcher import RwsFetcher
+
+    return RwsFetcher()
+
+
 class RwsCheck:
     """Stores and runs checks on the list of rws sites
 
     Attributes:
       rws_sites: A json file read from canonical_sites that should contain all
       submitted related website sets
-      etlds: A string of effective top level domains read from public suffix list
+      etlds: The effective top level domains read from the public suffix list,
+             as an RwsSuffixIndex or a PublicSuffixList
       icanns: A set of domains associated with country codes
+      Both etlds and icanns may also be given as functions that load them,
+      which are called the first time a check needs them.
       schema: Static. Stores schema for format the canonical_sites should follow
       error_list: Stores all exceptions and issues generated by the checks. This
                   allows the issues to be shared in full when iterated through
                   without any given check failing halfway through and not
-                  catching other issues.
+                  catching other issues. With a reporter, it is a
+                  FindingList, which publishes each issue as it is added.
+      fetcher: The RwsFetcher used to make the network requests of the checks,
+               or a function that builds it when the first request is made.
+               A default RwsFetcher is built if none is given.
+      affected_sites: The sites the network checks check, such as the members
+                      of a set that a PR added, or None to check every site.
+                      The primary's well-known file of each set is always
+                      checked.
+      reporter: The RwsReporter the issues are published to as they are
+                found, or None.
     """
 
-    def __init__(self, rws_sites: json, etlds: PublicSuffixList, icanns: set):
+    def __init__(
+        self,
+        rws_sites: json,
+        etlds: "PublicSuffixList | RwsSuffixIndex",
+        icanns: set,
+        fetcher: "RwsFetcher" = None,
+        affected_sites: set = None,
+        reporter: "RwsReporter" = None,
+    ):
         """Stores the input from canonical_sites, effective_tld_names.dat, and
         ICANN_domains into the RwsCheck object"""
         self.rws_sites = rws_sites
         self.etlds = etlds
         self.icanns = icanns
-        self.error_list = []
-
-    def validate_schema(self, schema_file):
+        self.reporter = reporter
+        self.error_list = [] if reporter is None else reporter.finding_list()
+        self.fetcher = default_fetcher if fetcher is None else fetcher
+        self.affected_sites = affected_sites
+
+    @property
+    def etlds(self):
+        return self._load("_etlds")
+
+    @etlds.setter
+    def etlds(self, etlds):
+        self._etlds = etlds
+
+    @property
+    def icanns(self):
+        return self._load("_icanns")
+
+    @icanns.setter
+    def icanns(self, icanns):
+        self._icanns = icanns
+
+    @property
+    def fetcher(self):
+        return self._load("_fetcher")
+
+    @fetcher.setter
+    def fetcher(self, fetcher):
+        self._fetcher = fetcher
+
+    def _load(self, attribute):
+        # Replaces a function given for attribute with what it returns
+        value = getattr(self, attribute)
+        if callable(value):
+            value = value()
+            setattr(self, attribute, value)
+        return value
+
+    def validate_schema(self, schema_file, unchanged_sets=()):
         """Validates the canonical sites list
 
-        Calls the validate function from the jsonschema package on the input
-        from canonical_sites against our predertermined schema
+        Validates the input from canonical_sites against our predertermined
+        schema, as the validate function from the jsonschema package does,
+        with a validator that is compiled once per schema file. See
+        find_schema_errors.
 
         Args:
-            self
+            schema_file: the path of the schema
+            unchanged_sets: see find_schema_errors
         Returns:
             None
         Raises:
             jsonschema.exceptions.ValidationError if the schema does not match
             the format stored in SCHEMA
         """
-        with open(schema_file) as f:
-            SCHEMA = json.loads(f.read())
-        validate(self.rws_sites, schema=SCHEMA)
+        from RwsSchema import load_validator
+
+        load_validator(schema_file).validate(self.rws_sites, unchanged_sets)
+
+    def find_schema_errors(self, schema_file, unchanged_sets=()):
+        """Finds every error of the canonical sites list against the schema
+
+        Each set is validated on its own, so that every misformatted set is
+        reported in one pass, and the sets equal to one of unchanged_sets,
+        such as the sets of a list that was validated before, are not
+        validated again.
+
+        Args:
+            schema_file: the path of the schema
+            unchanged_sets: list of the sets, as JSON, that need no validation
+        Returns:
+            list[jsonschema.exceptions.ValidationError] in the order of the
+            list
+        """
+        from RwsSchema import load_validator
+
+        return list(
+            load_validator(schema_file).iter_errors(self.rws_sites, unchanged_sets)
+        )
 
     def load_sets(self):
         """Loads sets from the JSON file into a dictionary of primary->RwsSet
 
         Loads the sets from rws_list into check_sets, a dictionary of
-        string->RwsSet, where the key is the primary of the RwsSet
+        string->RwsSet, where the key is the primary of the RwsSet. The sets
+        are FrozenRwsSets, which are hashable and compact
         If any given primary is listed multiple times, will append an error to
         the error_list for any primary past the first
 
         Args:
             None
         Returns:
-            Dict[string, RwsSet]
+            Dict[string, FrozenRwsSet]
         """
         check_sets = {}
         load_sets_errors = []
@@ -88,7 +183,7 @@ class RwsCheck:
                     f"{primary} is already a primary of another site"
                 )
             else:
-                check_sets[primary] = RwsSet(
+                check_sets[primary] = FrozenRwsSet(
                     ccTLDs, primary, associated_sites, service_sites
                 )
         self.error_list += load_sets_errors
@@ -233,9 +328,9 @@ class RwsCheck:
     def is_eTLD_Plus1(self, site):
         """A helper function for checking if a domain is etld+1 compliant
 
-        calls privatesuffix from the publicsuffixlist package on the provided
-        domain name, returns true if the domain name matches is its own shortest
-        private suffix, else false
+        calls privatesuffix from the RwsSuffixIndex, or the publicsuffixlist
+        package, on the provided domain name, returns true if the domain name
+        matches is its own shortest private suffix, else false
 
         Args:
             site: a string corresponding to a domain name
@@ -288,35 +383,92 @@ class RwsCheck:
                     )
 
     def open_and_load_json(self, url):
-        """Calls requests.get and returns json from a site
+        """Makes a get request and returns json from a site
 
-        Calls requests.get(...).json() on a domain. Returns the json object.
+        Calls self.fetcher.get_json(...) on a domain, which reads at most the
+        fetcher's max_body_bytes. Returns the json object.
         This functionality is separated out here to make testing easier.
 
         Args:
             url: a domain that we want to load the json from
         """
-        return requests.get(url, timeout=10, headers={"User-Agent": "Chrome"}).json()
+        return self.fetcher.get_json(url, headers={"User-Agent": "Chrome"})
+
+    def is_affected(self, site):
+        """Returns whether the network checks check a site, see
+        affected_sites"""
+        return self.affected_sites is None or site in self.affected_sites
+
+    def resolve_hosts(self, check_sets):
+        """Resolves the hosts of every site in check_sets before any request
+
+        Sites whose host does not resolve then fail every network check
+        immediately, with a single error each. Only the primaries and the
+        affected sites are resolved, and the fetcher is not loaded if there
+        are none.
+
+        Args:
+            check_sets: Dict[string, RwsSet]
+        Returns:
+            None
+        """
+        sites = [
+            site
+            for primary, rws in check_sets.items()
+            for site in [primary]
+            + rws.associated_sites
+            + rws.service_sites
+            + [alias for aliases in rws.ccTLDs.values() for alias in aliases]
+            if site == primary or self.is_affected(site)
+        ]
+        if sites:
+            self.fetcher.resolve_hosts(sites)
+
+    def add_not_evaluated(self, check, site):
+        """Records that a check was skipped because the run ran out of time
+
+        Appends an error to the error_list, so that a run whose time budget
+        was exhausted never reports success.
+
+        Args:
+            check: the name of the check that was skipped
+            site: the site the check was skipped for
+        Returns:
+            None
+        """
+        self.error_list.append(
+            f"Not evaluated: {check} for {site}; "
+            + "the run's time budget was exhausted"
+        )
 
-    def check_list_sites(self, primary, site_list):
+    def check_list_sites(self, primary, site_list, well_knowns=None):
         """Checks that sites in a given list have the correct primary on their
         well-known page
 
         Calls self.open_and_load_json on a given list of sites, reads their json, and adds any
         sites that do not contain the passed in primary as their listed primary
         to the error list. Also catches and adds any exceptions when trying to
-        open or read the url
+        open or read the url. The well-known pages are fetched concurrently
+        unless they have already been fetched by the caller.
 
         Args:
             primary: the domain name of the primary site
             site_list: a list of domain names to access
+            well_knowns: optional Dict[string, object] of already fetched
+            well-known urls, as returned by RwsFetcher.fetch_all
         Returns:
             None
         """
+        from RwsFetcher import RunDeadlineExceeded, RwsFetcher
+
+        if well_knowns is None:
+            well_knowns = self.fetcher.fetch_all(
+                self.open_and_load_json, [site + WELL_KNOWN for site in site_list]
+            )
         for site in site_list:
             url = site + WELL_KNOWN
             try:
-                json_schema = self.open_and_load_json(url)
+                json_schema = RwsFetcher.result(well_knowns, url)
                 if "primary" not in json_schema.keys():
                     self.error_list.append(
                         "The listed associated site site did not have primary"
@@ -327,6 +479,8 @@ class RwsCheck:
                         "The listed associated site "
                         + f"did not have {primary} listed as its primary: {site}"
                     )
+            except RunDeadlineExceeded:
+                self.add_not_evaluated("check_list_sites", site)
             except Exception as inst:
                 self.error_list.append(
                     f"Experienced an error when trying to access {url}; "
@@ -363,15 +517,44 @@ class RwsCheck:
         Checks for a ./well-known page for related website sets under each
         domain, and checks that the format of the file aligns with the provided
         pages in the canonical list.
-        Calls check_list_sites on all ccTLDs, associated, and service sites.
+        Calls check_list_sites on all ccTLDs, associated, and service sites
+        that are affected, see affected_sites.
         Appends to the error_list whenever a site is unreachable, an incorrect
         format, or its contents do no match what is expected.
+        Every well-known page is fetched concurrently up front, and the results
+        are then checked set by set so that the error_list is in a
+        deterministic order.
 
         Args:
             check_sets: Dict[string, RwsSet]
         Returns:
             None
         """
+        from RwsFetcher import RunDeadlineExceeded, RwsFetcher
+
+        member_sites = {
+            primary: [
+                site
+                for site in curr_rws_set.associated_sites
+                + curr_rws_set.service_sites
+                + [
+                    alias
+                    for aliases in curr_rws_set.ccTLDs.values()
+                    for alias in aliases
+                ]
+                if self.is_affected(site)
+            ]
+            for primary, curr_rws_set in check_sets.items()
+        }
+        urls = [
+            site + WELL_KNOWN
+            for primary, members in member_sites.items()
+            for site in [primary] + members
+        ]
+        # The fetcher is not loaded when there are no sets to check
+        well_knowns = (
+            self.fetcher.fetch_all(self.open_and_load_json, urls) if urls else {}
+        )
         # Check the schema to ensure consistency
         for primary, curr_rws_set in check_sets.items():
             # First we check the primary sites
@@ -379,7 +562,7 @@ class RwsCheck:
             # Read the well-known files and check them against the schema we
             # have stored
             try:
-                json_schema = self.open_and_load_json(url)
+                json_schema = RwsFetcher.result(well_knowns, url)
                 well_known_set = RwsSet(
                     json_schema.get("ccTLDs"),
                     json_schema.get("primary"),
@@ -413,21 +596,14 @@ class RwsCheck:
                             well_known_set.ccTLDs.get(aliased_site, []),
                         )
                     )
+            except RunDeadlineExceeded:
+                self.add_not_evaluated("find_invalid_well_known", primary)
             except Exception as inst:
                 self.error_list.append(
                     f"Experienced an error when trying to access {url}; error was: {inst}"
                 )
             # Check the member sites.
-            self.check_list_sites(
-                primary,
-                curr_rws_set.associated_sites
-                + curr_rws_set.service_sites
-                + [
-                    alias
-                    for aliases in curr_rws_set.ccTLDs.values()
-                    for alias in aliases
-                ],
-            )
+            self.check_list_sites(primary, member_sites[primary], well_knowns)
 
     def find_invalid_removal(self, subtracted_sets):
         """Checks that any sets being removed were properly removed by owner
@@ -438,15 +614,19 @@ class RwsCheck:
             subtracted_sets: Dict[string, RwsSet]
         Returns:
             None"""
+        from RwsFetcher import RunDeadlineExceeded
+
         for primary in subtracted_sets:
             url = primary + WELL_KNOWN
             try:
-                r = requests.get(url, timeout=10)
+                r = self.fetcher.get_shared(url, probe=True)
                 if r.status_code != 404:
                     self.error_list.append(
                         f"The set associated with {primary}"
                         + f" was removed from the list, but {url} does not return error 404."
                     )
+            except RunDeadlineExceeded:
+                self.add_not_evaluated("find_invalid_removal", primary)
             except Exception as inst:
                 self.error_list.append(
                     f"Unexpected error when accessing {url}; Received error: {inst}"
@@ -501,20 +681,23 @@ class RwsCheck:
         """Checks service sites to see if they have a robots.txt subdomain.
 
 
-        Iterates through all service_sites in each RwsSet provided, and checks
-        that the returned page contains an X-Robots-Tag in its header. If not,
-        an error is appended to the error list.
+        Iterates through the affected service_sites in each RwsSet provided,
+        see affected_sites, and checks that the returned page contains an
+        X-Robots-Tag in its header. If not, an error is appended to the error
+        list.
 
         Args:
             check_sets: Dict[string, RwsSet]
         Returns:
             None
         """
+        from RwsFetcher import RunDeadlineExceeded
+
         for curr_set in check_sets.values():
-            for service_site in curr_set.service_sites:
+            for service_site in filter(self.is_affected, curr_set.service_sites):
                 try:
-                    r_service = requests.get(
-                        service_site, timeout=10, allow_redirects=False
+                    r_service = self.fetcher.get_shared(
+                        service_site, allow_redirects=False, probe=True
                     )
                     if "X-Robots-Tag" not in r_service.headers:
                         self.error_list.append(
@@ -533,6 +716,8 @@ class RwsCheck:
                                 f"The service site {service_site} does not have a "
                                 + "'noindex' or 'none' tag in its header"
                             )
+                except RunDeadlineExceeded:
+                    self.add_not_evaluated("find_robots_tag", service_site)
                 except Exception as inst:
                     self.error_list.append(
                         f"Unexpected error for service site: {service_site}; Received error: {inst}"
@@ -541,58 +726,60 @@ class RwsCheck:
     def find_ads_txt(self, check_sets):
         """Checks to see if service sites have an ads.txt subdomain.
 
-        Iterates through all service_sites in each RwsSet provided, and makes
-        a get request to site/ads.txt for each. Appends errors to the error
-        list for any that do not return an error 4xx or 5xx or if the site
-        does not cause a timeout error.
+        Iterates through the affected service_sites in each RwsSet provided,
+        see affected_sites, and makes a get request to site/ads.txt for each.
+        Appends errors to the error list for any that do not return an error
+        4xx or 5xx or if the site does not cause a timeout error.
 
         Args:
             check_sets: Dict[string, RwsSet]
         Returns:
             None
         """
+        from RwsFetcher import RunDeadlineExceeded
+        from RwsRetry import is_unreachable
 
-        exception_retries = "Max retries exceeded with url: /ads.txt"
-        exception_timeout = "Read timed out. (read timeout=10)"
         for curr_set in check_sets.values():
-            for service_site in curr_set.service_sites:
+            for service_site in filter(self.is_affected, curr_set.service_sites):
                 ads_site = service_site + "/ads.txt"
                 try:
-                    r = requests.get(ads_site, timeout=10)
+                    r = self.fetcher.get_shared(ads_site, probe=True)
                     if r.status_code == 200:
                         self.error_list.append(
                             f"The service site {service_site} has an ads.txt file, this violates "
                             + "the policies for service sites"
                         )
+                except RunDeadlineExceeded:
+                    self.add_not_evaluated("find_ads_txt", service_site)
                 except Exception as inst:
-                    if exception_retries not in str(inst):
-                        if exception_timeout not in str(inst):
-                            self.error_list.append(
-                                f"Unexpected error for service site: {service_site}\n"
-                                + f"Received error: {inst}"
-                            )
+                    # Unreachable service sites pass this check
+                    if not is_unreachable(inst):
+                        self.error_list.append(
+                            f"Unexpected error for service site: {service_site}\n"
+                            + f"Received error: {inst}"
+                        )
 
     def check_for_service_redirect(self, check_sets):
         """Checks to see if service sites redirect to another site
         or return a user/server error.
 
-        Makes a get request to all service sites in each RwsSet contained in
-        check_sets, and appends errors to the error list for any that do not
-        return an error 4xx or 5xx or if the site does not cause a timeout
-        error.
+        Makes a get request to the affected service sites in each RwsSet
+        contained in check_sets, see affected_sites, and appends errors to the
+        error list for any that do not return an error 4xx or 5xx or if the
+        site does not cause a timeout error.
 
         Args:
             check_sets: Dict[string, RwsSet]
         Returns:
             None
         """
+        from RwsFetcher import RunDeadlineExceeded
+        from RwsRetry import is_unreachable
 
-        exception_retries = "Max retries exceeded with url: /"
-        exception_timeout = "Read timed out. (read timeout=10)"
         for curr_set in check_sets.values():
-            for service_site in curr_set.service_sites:
+            for service_site in filter(self.is_affected, curr_set.service_sites):
                 try:
-                    r = requests.get(service_site, timeout=10)
+                    r = self.fetcher.get_shared(service_site, probe=True)
                     # We want the request status_code to be a 4xx or 5xx, raise
                     # an exception if it's outside that range
                     if r.status_code < 400 or r.status_code >= 600:
@@ -603,11 +790,13 @@ class RwsCheck:
                             self.error_list.append(
                                 f"The service site must not be an endpoint: {service_site}"
                             )
+                except RunDeadlineExceeded:
+                    self.add_not_evaluated("check_for_service_redirect", service_site)
                 except Exception as inst:
-                    if exception_retries not in str(inst):
-                        if exception_timeout not in str(inst):
-                            self.error_list.append(
-                                f"Unexpected error for "
-                                + f"service site: {service_site}\n"
-                                + f"Received error: {inst}"
-                            )
+                    # Unreachable service sites pass this check
+                    if not is_unreachable(inst):
+                        self.error_list.append(
+                            f"Unexpected error for "
+                            + f"service site: {service_site}\n"
+                            + f"Received error: {inst}"
+                        )
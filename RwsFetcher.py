@@ -0,0 +1,740 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import collections
+import math
+import requests
+import threading
+import time
+import urllib3
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from RwsRateLimiter import round_robin_by_host
+from RwsResolver import UnresolvableHost
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_POOL_SIZE = 8
+DEFAULT_POOL_HOSTS = 256
+DEFAULT_TIMEOUT = 10
+# Runs with a time budget adapt their timeouts to a multiple of the p95
+# latency of the last LATENCY_WINDOW responses, once at least
+# MIN_LATENCY_SAMPLES have been seen, which never goes below MIN_TIMEOUT or
+# above DEFAULT_TIMEOUT. The p95 is recomputed every P95_REFRESH_SAMPLES
+# responses.
+LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+P95_TIMEOUT_MULTIPLE = 4
+MIN_TIMEOUT = 2
+P95_REFRESH_SAMPLES = 25
+# Well-known files are a few kilobytes; bodies read by get_json are capped
+# well above that, and must be read within DEFAULT_MAX_READ_TIME seconds.
+DEFAULT_MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_MAX_READ_TIME = 10
+READ_CHUNK_SIZE = 16 * 1024
+# Statuses with which servers refuse HEAD requests they do not implement
+HEAD_REFUSED_STATUS_CODES = frozenset([405, 501])
+
+
+class RunDeadlineExceeded(Exception):
+    """Raised instead of making a request once the run's time budget is spent"""
+
+    def __init__(self, url):
+        super().__init__(
+            f"The run's time budget was exhausted before {url} was requested"
+        )
+        self.url = url
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """Raised when a response body is larger than the fetcher allows"""
+
+    def __init__(self, url, max_bytes):
+        super().__init__(f"The response from {url} is larger than {max_bytes} bytes")
+        self.url = url
+        self.max_bytes = max_bytes
+
+
+class ReadDeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when a response body takes longer to read than the fetcher
+    allows"""
+
+    def __init__(self, url, max_read_time):
+        super().__init__(
+            f"Reading the response from {url} took longer than "
+            + f"{max_read_time} seconds"
+        )
+        self.url = url
+        self.max_read_time = max_read_time
+
+
+def _read_chunks(raw):
+    # Unlike Response.iter_content, which waits for every chunk to fill up,
+    # read1 returns whatever has arrived, so that a slowly dripped body
+    # cannot hold off the read deadline.
+    try:
+        while chunk := raw.read1(READ_CHUNK_SIZE, decode_content=True):
+            yield chunk
+    except urllib3.exceptions.ProtocolError as inst:
+        raise requests.exceptions.ChunkedEncodingError(inst)
+    except urllib3.exceptions.DecodeError as inst:
+        raise requests.exceptions.ContentDecodingError(inst)
+    except urllib3.exceptions.ReadTimeoutError as inst:
+        raise requests.exceptions.ConnectionError(inst)
+    except urllib3.exceptions.SSLError as inst:
+        raise requests.exceptions.SSLError(inst)
+
+
+def read_capped(response, max_bytes, max_read_time):
+    """Reads the body of a streamed response within a size and time limit
+
+    Responses that declare a Content-Length above max_bytes are rejected
+    before any of the body is read. Otherwise the body is read in chunks,
+    and reading stops as soon as it grows past max_bytes or max_read_time
+    runs out. A body that starts as markup is not read any further, since it
+    cannot be JSON.
+
+    Args:
+        response: a requests.Response made with stream=True
+        max_bytes: the largest body allowed, in bytes
+        max_read_time: the seconds allowed to read the body
+    Returns:
+        The response, with its body read
+    Raises:
+        ResponseTooLarge, ReadDeadlineExceeded
+    """
+    deadline = time.monotonic() + max_read_time
+    try:
+        content_length = int(response.headers.get("Content-Length", 0))
+    except ValueError:
+        content_length = 0
+    if content_length > max_bytes:
+        response.close()
+        raise ResponseTooLarge(response.url, max_bytes)
+    body = bytearray()
+    start = b""
+    for chunk in _read_chunks(response.raw):
+        body += chunk
+        if len(body) > max_bytes:
+            response.close()
+            raise ResponseTooLarge(response.url, max_bytes)
+        if not start:
+            start = body.lstrip(b"\xef\xbb\xbf \t\r\n")[:1]
+            if start == b"<":
+                response.close()
+                break
+        if time.monotonic() > deadline:
+            response.close()
+            raise ReadDeadlineExceeded(response.url, max_read_time)
+    response._content = bytes(body)
+    return response
+
+
+def discard_body(response, **kwargs):
+    """A response hook that closes a streamed response without reading its
+    body"""
+    response.close()
+    response._content = b""
+    return response
+
+
+class PoolCountingAdapter(HTTPAdapter):
+    """An HTTPAdapter that counts the requests and connections of its pools
+
+    urllib3 keeps one connection pool per host and closes the least recently
+    used pool once there are more than pool_connections of them. The counts
+    of closed pools are kept so that connection reuse can be reported for the
+    whole run.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.closed_pool_requests = 0
+        self.closed_pool_connections = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pools.dispose_func = self._close_pool
+
+    def _close_pool(self, pool):
+        self.closed_pool_requests += pool.num_requests
+        self.closed_pool_connections += pool.num_connections
+        pool.close()
+
+    def connection_counts(self):
+        """Returns the number of requests made and connections opened"""
+        num_requests = self.closed_pool_requests
+        num_connections = self.closed_pool_connections
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+        return num_requests, num_connections
+
+
+class HostOverrideAdapter(PoolCountingAdapter):
+    """A PoolCountingAdapter that sends requests for some hosts elsewhere
+
+    Requests for an overridden host are sent to the origin it maps to, with
+    the original host in the Host header, the way a hosts file entry would
+    send them. Responses keep the url that was requested, so that redirects
+    are followed through the overrides as well. The host "*" overrides every
+    host that has no mapping of its own.
+
+    Attributes:
+      overrides: Dict[string, string] mapping hosts to origins such as
+      http://127.0.0.1:8080
+    """
+
+    def __init__(self, overrides, *args, **kwargs):
+        self.overrides = overrides
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        origin = self.overrides.get(parts.hostname, self.overrides.get("*"))
+        if origin is None:
+            return super().send(request, **kwargs)
+        overridden = request.copy()
+        overridden.url = origin.rstrip("/") + urlunsplit(
+            ("", "", parts.path or "/", parts.query, "")
+        )
+        overridden.headers["Host"] = parts.netloc
+        response = super().send(overridden, **kwargs)
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class RwsFetcher:
+    """Runs the network requests made by RwsCheck
+
+    All requests go through a single requests.Session, so that connections
+    are kept alive and reused whenever the same host is requested again.
+    Checks that look at the same page share a single response for it through
+    get_shared. Checks that only need the status and headers of a page probe
+    it, without downloading its body.
+
+    Attributes:
+      max_concurrency: the maximum number of requests that may be in flight
+      at once across the whole run
+      session: the pooled requests.Session shared by every check
+      http_cache: an optional RwsHttpCache that GET requests are answered
+      from when the server reports the page as unchanged
+      rate_limiter: an optional RwsRateLimiter that every request waits on
+      deadline: the time.monotonic() time after which no more requests are
+      made, or None if the run has no time budget
+      retry_policy: an optional RwsRetryPolicy deciding which failed
+      requests are attempted again
+      transport: the object requests are sent through; the session, unless
+      replaying a cassette
+      recorder: an optional CassetteRecorder that every request is recorded
+      to
+      host_overrides: an optional Dict[string, string] of hosts whose
+      requests are sent to another origin, see HostOverrideAdapter
+      resolver: an optional RwsResolver; requests to hosts it found not to
+      resolve fail without reaching the network
+      max_body_bytes: the largest response body get_json reads
+      max_read_time: the seconds get_json allows for reading a response body
+      head_probes: whether probe sends HEAD requests; if not, every probe is
+      a GET whose body is never read
+      request_log: an optional RwsRequestLog that the latency, status and
+      size of every request is recorded to
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        pool_size=DEFAULT_POOL_SIZE,
+        pool_hosts=DEFAULT_POOL_HOSTS,
+        http_cache=None,
+        rate_limiter=None,
+        time_budget=None,
+        retry_policy=None,
+        transport=None,
+        recorder=None,
+        host_overrides=None,
+        resolver=None,
+        max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+        max_read_time=DEFAULT_MAX_READ_TIME,
+        head_probes=True,
+        request_log=None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.http_cache = http_cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.deadline = None
+        if time_budget is not None:
+            self.deadline = time.monotonic() + time_budget
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._latencies_lock = threading.Lock()
+        self._p95 = None
+        self._new_latencies = 0
+        self.host_overrides = host_overrides
+        self.resolver = resolver
+        self.max_body_bytes = max_body_bytes
+        self.max_read_time = max_read_time
+        self.head_probes = head_probes
+        self._head_refused = set()
+        self._pool_kwargs = {
+            "pool_connections": pool_hosts,
+            "pool_maxsize": max(1, pool_size),
+        }
+        self._open_session()
+        self.transport = self.session if transport is None else transport
+        self.recorder = recorder
+        self.request_log = request_log
+
+    def _open_session(self):
+        if self.host_overrides:
+            self._adapter = HostOverrideAdapter(
+                self.host_overrides, **self._pool_kwargs
+            )
+        else:
+            self._adapter = PoolCountingAdapter(**self._pool_kwargs)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._responses = {}
+        self._responses_lock = threading.Lock()
+
+    def reset_after_fork(self, num_processes):
+        """Prepares a fetcher inherited by a forked worker process
+
+        The worker gets a session of its own, instead of the connections it
+        inherited from its parent, and an even share of max_concurrency, the
+        per address rate limit and the retry budget with the other
+        num_processes workers.
+
+        Args:
+            num_processes: the number of worker processes sharing the limits
+        """
+        self.max_concurrency = max(1, self.max_concurrency // num_processes)
+        uses_session = self.transport is self.session
+        self._open_session()
+        if uses_session:
+            self.transport = self.session
+        if self.rate_limiter is not None:
+            self.rate_limiter = self.rate_limiter.split(num_processes)
+        if self.retry_policy is not None:
+            self.retry_policy = self.retry_policy.split(num_processes)
+        if self.request_log is not None:
+            self.request_log.clear()
+
+    def run_stats(self):
+        """Returns the statistics of the fetcher's run so far, in a form that
+        merge_run_stats accepts"""
+        num_requests, num_connections = self._adapter.connection_counts()
+        stats = {"requests": num_requests, "connections": num_connections}
+        if self.http_cache is not None:
+            stats["cache"] = self.http_cache.stats()
+        if self.retry_policy is not None:
+            stats["retries_by_host"] = dict(self.retry_policy.retries_by_host)
+        if self.request_log is not None:
+            stats["request_log"] = self.request_log.entries()
+        return stats
+
+    def merge_run_stats(self, stats):
+        """Adds the statistics of another fetcher, such as a worker process',
+        to this fetcher's
+
+        Args:
+            stats: a Dict returned by run_stats
+        """
+        self._adapter.closed_pool_requests += stats["requests"]
+        self._adapter.closed_pool_connections += stats["connections"]
+        if self.http_cache is not None and "cache" in stats:
+            self.http_cache.hits += stats["cache"]["hits"]
+            self.http_cache.misses += stats["cache"]["misses"]
+        if self.retry_policy is not None:
+            retries_by_host = self.retry_policy.retries_by_host
+            for host, count in stats.get("retries_by_host", {}).items():
+                retries_by_host[host] = retries_by_host.get(host, 0) + count
+        if self.request_log is not None:
+            self.request_log.merge(stats.get("request_log", []))
+
+    def get(self, url, **kwargs):
+        """Makes a GET request for url through the pooled session
+
+        Requests that fail with a transient error are attempted again when
+        the fetcher has a retry_policy.
+
+        Args:
+            url: string
+            **kwargs: passed on to requests.Session.get; timeout defaults to
+            the value of self.timeout()
+        Returns:
+            requests.Response
+        Raises:
+            RunDeadlineExceeded if the run's time budget has been spent
+        """
+        return self._request("GET", url, kwargs)
+
+    def probe(self, url, allow_redirects=True):
+        """Makes a request for the status and headers of url, but not its body
+
+        Sends a HEAD request, unless head_probes is off or the host has
+        refused a HEAD request before. Otherwise, or if the HEAD request is
+        refused, sends a GET request and closes the response as soon as its
+        headers have arrived. The response's content is always empty.
+
+        Requests that fail with a transient error are attempted again when
+        the fetcher has a retry_policy, but responses with a transient status
+        code are not: the checks that probe only look for a redirect, and a
+        5xx or 429 is already their answer.
+
+        Args:
+            url: string
+            allow_redirects: boolean
+        Returns:
+            requests.Response
+        Raises:
+            RunDeadlineExceeded if the run's time budget has been spent
+        """
+        if self.head_probes and urlsplit(url).hostname not in self._head_refused:
+            response = self._request(
+                "HEAD",
+                url,
+                {"allow_redirects": allow_redirects},
+                retry_statuses=False,
+            )
+            if response.status_code not in HEAD_REFUSED_STATUS_CODES:
+                return response
+            with self._responses_lock:
+                self._head_refused.add(urlsplit(url).hostname)
+                self._head_refused.add(urlsplit(response.url).hostname)
+        kwargs = {
+            "allow_redirects": allow_redirects,
+            "stream": True,
+            "hooks": {"response": discard_body},
+        }
+        return self._request("GET", url, kwargs, cacheable=False, retry_statuses=False)
+
+    def _request(self, method, url, kwargs, cacheable=True, retry_statuses=True):
+        # Requests that fail with a transient error, or with a transient
+        # status code if retry_statuses, are attempted again when the fetcher
+        # has a retry_policy.
+        attempt = 1
+        while True:
+            response = error = None
+            try:
+                response = self._request_once(method, url, dict(kwargs), cacheable)
+            except RunDeadlineExceeded:
+                raise
+            except Exception as inst:
+                error = inst
+            delay = None
+            if self.retry_policy is not None:
+                delay = self.retry_policy.retry_delay(
+                    url, attempt, response, error, self._time_left(), retry_statuses
+                )
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, url, **kwargs):
+        """Makes a GET request for url and returns its body parsed as JSON
+
+        The body is streamed, and is never read past max_body_bytes or for
+        longer than max_read_time, so that a huge or endless response cannot
+        exhaust the run's memory or time.
+
+        Args:
+            url: string
+            **kwargs: passed on to self.get
+        Returns:
+            The parsed JSON body
+        Raises:
+            ResponseTooLarge, ReadDeadlineExceeded, or requests.JSONDecodeError
+            if the body is not JSON
+        """
+
+        def read_body(response, **_):
+            return read_capped(response, self.max_body_bytes, self.max_read_time)
+
+        kwargs["stream"] = True
+        kwargs["hooks"] = {"response": read_body}
+        return self.get(url, **kwargs).json()
+
+    def _request_once(self, method, url, kwargs, cacheable):
+        # The deadline is checked before anything that could block, and the
+        # rate limiter never waits past it
+        time_left = self._time_left()
+        if time_left is not None and time_left <= 0:
+            raise RunDeadlineExceeded(url)
+        if self.resolver is not None and not self._is_overridden(url):
+            try:
+                self.resolver.check(url)
+            except UnresolvableHost as inst:
+                # Recorded, so that a replayed run, which resolves no host,
+                # fails the request the same way
+                if self.recorder is not None:
+                    self.recorder.record(url, kwargs, 0, error=inst, method=method)
+                raise
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(
+            url, self.deadline
+        ):
+            raise RunDeadlineExceeded(url)
+        kwargs.setdefault("timeout", self.timeout(url))
+        start = time.monotonic()
+        try:
+            if method == "HEAD":
+                response = self.transport.head(url, **kwargs)
+            elif cacheable and self.http_cache is not None:
+                response = self.http_cache.get(self.transport, url, **kwargs)
+            else:
+                response = self.transport.get(url, **kwargs)
+        except Exception as inst:
+            latency = time.monotonic() - start
+            if self.recorder is not None:
+                self.recorder.record(url, kwargs, latency, error=inst, method=method)
+            if self.request_log is not None:
+                self.request_log.record(method, url, latency, error=inst)
+            raise
+        latency = time.monotonic() - start
+        self._add_latency(latency)
+        if self.recorder is not None:
+            self.recorder.record(url, kwargs, latency, response=response, method=method)
+        if self.request_log is not None:
+            self.request_log.record(method, url, latency, response=response)
+        return response
+
+    def _is_overridden(self, url):
+        if not self.host_overrides:
+            return False
+        return "*" in self.host_overrides or (
+            urlsplit(url).hostname in self.host_overrides
+        )
+
+    def resolve_hosts(self, urls):
+        """Resolves the hosts of urls ahead of the requests made to them
+
+        Does nothing when the fetcher has no resolver. Overridden hosts are
+        never resolved. In a run with a time budget, the lookups are not
+        waited on for longer than the time left.
+
+        Args:
+            urls: an iterable of urls
+        """
+        if self.resolver is None:
+            return
+        timeout = None
+        time_left = self._time_left()
+        if time_left is not None:
+            if time_left <= 0:
+                return
+            timeout = min(self.resolver.timeout, time_left)
+        self.resolver.resolve_all(
+            (urlsplit(url).hostname for url in urls if not self._is_overridden(url)),
+            timeout,
+        )
+
+    def wait_for_lookups(self, timeout):
+        """Waits for the lookups started by resolve_hosts to finish, before
+        the process is forked
+
+        Args:
+            timeout: the most seconds to wait
+        Returns:
+            True if no lookup is running any more, False otherwise
+        """
+        if self.resolver is None:
+            return True
+        return self.resolver.wait_for_lookups(timeout)
+
+    def _time_left(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def _add_latency(self, latency):
+        with self._latencies_lock:
+            self._latencies.append(latency)
+            self._new_latencies += 1
+
+    def _latency_p95(self):
+        # The p95 of the recent latencies, or None before there are enough
+        with self._latencies_lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            if self._p95 is None or self._new_latencies >= P95_REFRESH_SAMPLES:
+                latencies = sorted(self._latencies)
+                self._p95 = latencies[math.ceil(0.95 * len(latencies)) - 1]
+                self._new_latencies = 0
+            return self._p95
+
+    def timeout(self, url):
+        """Returns the (connect, read) timeout to use for the next request
+
+        In a run with a time budget, the timeout adapts to the latencies
+        observed so far in the run, and is cut short so that no request
+        outlives the run's deadline. Without one, every request gets
+        DEFAULT_TIMEOUT, so that a slow host is not failed for being slower
+        than the others.
+
+        Args:
+            url: the url about to be requested
+        Returns:
+            Tuple[float, float]
+        Raises:
+            RunDeadlineExceeded if the run's time budget has been spent
+        """
+        timeout = DEFAULT_TIMEOUT
+        time_left = self._time_left()
+        if time_left is not None:
+            if time_left <= 0:
+                raise RunDeadlineExceeded(url)
+            p95 = self._latency_p95()
+            if p95 is not None:
+                timeout = min(
+                    DEFAULT_TIMEOUT, max(MIN_TIMEOUT, P95_TIMEOUT_MULTIPLE * p95)
+                )
+            timeout = min(timeout, time_left)
+        return (timeout, timeout)
+
+    def get_shared(self, url, allow_redirects=True, probe=False):
+        """Returns the run's response for url, fetching it at most once
+
+        Responses are stored for the rest of the run, keyed by url, redirect
+        policy and whether they were probed, and concurrent callers asking
+        for the same key wait for a single request. A probe is answered by
+        the full response for the same key, if there already is one. If the
+        url's response has already been fetched without following redirects,
+        following redirects reuses it: a page that did not redirect is
+        returned as is, and a redirect is only followed from its next hop. An
+        exception raised by the request is stored and raised again for every
+        caller.
+
+        Args:
+            url: string
+            allow_redirects: boolean
+            probe: boolean, whether only the status and headers are needed
+        Returns:
+            requests.Response
+        """
+        key = (url, allow_redirects, probe)
+        with self._responses_lock:
+            future = self._responses.get(key)
+            if future is None and probe:
+                future = self._responses.get((url, allow_redirects, False))
+            is_owner = future is None
+            if is_owner:
+                future = self._responses[key] = Future()
+        if is_owner:
+            try:
+                future.set_result(self._fetch_shared(url, allow_redirects, probe))
+            except Exception as inst:
+                future.set_exception(inst)
+        return future.result()
+
+    def _fetch_shared(self, url, allow_redirects, probe):
+        fetch = self.probe if probe else self.get
+        if allow_redirects:
+            with self._responses_lock:
+                unfollowed = self._responses.get((url, False, probe))
+            if unfollowed is not None and unfollowed.done():
+                if unfollowed.exception() is None:
+                    response = unfollowed.result()
+                    if not response.is_redirect:
+                        return response
+                    # A response that requests did not send, such as one
+                    # rebuilt from a record of it, has no next request
+                    if response.next is not None:
+                        next_url = response.next.url
+                    else:
+                        next_url = urljoin(response.url, response.headers["location"])
+                    return fetch(next_url, allow_redirects=True)
+        return fetch(url, allow_redirects=allow_redirects)
+
+    def connection_stats(self):
+        """Returns how many connections the run opened and reused
+
+        Returns:
+            Dict[string, int] with the number of requests sent over the
+            network, connections opened and connections reused
+        """
+        num_requests, num_connections = self._adapter.connection_counts()
+        return {
+            "requests": num_requests,
+            "connections": num_connections,
+            "reused": max(0, num_requests - num_connections),
+        }
+
+    def fetch_all(self, fetch, urls):
+        """Calls fetch on every url concurrently
+
+        Runs fetch(url) for each distinct url on an asyncio event loop, with at
+        most max_concurrency calls in flight at any one time. The calls are
+        started in round-robin order across hosts, so that a host with many
+        urls cannot hold up every other host. Any exception
+        raised by fetch is caught and stored as the result for that url, so
+        that callers can report errors in their own order once every request
+        has finished.
+
+        Args:
+            fetch: a blocking function taking a single url
+            urls: an iterable of urls to pass to fetch
+        Returns:
+            Dict[string, object] mapping each url to its result or exception
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        return asyncio.run(self._fetch_all(fetch, urls))
+
+    async def _fetch_all(self, fetch, urls):
+        loop = asyncio.get_running_loop()
+        # The blocking calls run on the loop's default executor, which is
+        # sized so that it never becomes the limit on concurrency.
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(urls)))
+        )
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_one(url):
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(fetch, url)
+                except Exception as inst:
+                    return inst
+
+        scheduled = round_robin_by_host(urls)
+        results = dict(
+            zip(scheduled, await asyncio.gather(*(fetch_one(url) for url in scheduled)))
+        )
+        return {url: results[url] for url in urls}
+
+    @staticmethod
+    def result(results, url):
+        """Returns the result fetched for url, raising it if it was an error
+
+        Args:
+            results: Dict[string, object] as returned by fetch_all
+            url: string
+        Returns:
+            The value fetch returned for url
+        Raises:
+            Whatever exception fetch raised for url
+        """
+        result = results[url]
+        if isinstance(result, Exception):
+            raise result
+        return result
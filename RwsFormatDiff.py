@@ -0,0 +1,337 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import difflib
+import json
+import re
+
+# The most misformatted sets that format_diff diffs, the most lines it
+# shows of each hunk, and the longest line it shows, so that the error stays
+# short however much of the list is misformatted
+MAX_FORMAT_DIFF_SETS = 10
+MAX_FORMAT_DIFF_LINES = 50
+MAX_FORMAT_DIFF_LINE_LENGTH = 1000
+# The most lines of a misformatted span of a set that are matched line by
+# line; a longer span is shown as replaced as a whole
+MAX_FORMAT_DIFF_WINDOW = 1000
+# The lines of context around each hunk, as in difflib.unified_diff
+FORMAT_DIFF_CONTEXT = 3
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def format_diff(rws_json_string, rws_sites):
+    """Returns the diff of the rws_json_string and the formatted string
+    generated from rws_sites.
+
+    Each set is matched against its own formatted lines, so that the cost
+    of the diff grows with the misformatted sets rather than with the whole
+    file, and each hunk is headed with the primary of the set it starts in.
+    The diff is usually the one difflib.unified_diff makes of the whole
+    file, but not always: where a line is repeated, the copy shown as
+    removed or added is chosen within its set, and may not be the one that
+    matching the whole file would choose, which can also join or split its
+    hunks differently. Only the first MAX_FORMAT_DIFF_SETS misformatted sets
+    are diffed, and the number of the others follows the diff. If the sets
+    of rws_json_string do not start on lines of their own, the whole file is
+    matched at once instead.
+
+    Args:
+        rws_json_string: string
+        rws_sites: JSON Object
+    Returns:
+        String
+    """
+    # Add final newline by convention
+    formatted_file = json.dumps(rws_sites, indent=2, ensure_ascii=False) + "\n"
+    if rws_json_string == formatted_file:
+        return ""
+    pr_lines = _split_lines(rws_json_string)
+    expected_lines = _split_lines(formatted_file)
+    segments = _set_segments(rws_json_string, pr_lines, expected_lines, rws_sites)
+    if segments is None:
+        segments = [(0, len(pr_lines), 0, len(expected_lines), "")]
+    opcodes = []
+    misformatted_sets = 0
+    for pr_start, pr_end, expected_start, expected_end, _ in segments:
+        if pr_lines[pr_start:pr_end] == expected_lines[expected_start:expected_end]:
+            if misformatted_sets <= MAX_FORMAT_DIFF_SETS:
+                opcodes.append(
+                    ("equal", pr_start, pr_end, expected_start, expected_end)
+                )
+            continue
+        misformatted_sets += 1
+        if misformatted_sets <= MAX_FORMAT_DIFF_SETS:
+            opcodes += _segment_opcodes(
+                pr_lines, expected_lines, pr_start, pr_end, expected_start, expected_end
+            )
+    segment_starts = [segment[0] for segment in segments]
+    diff_lines = ["--- PR file\n", "+++ expected\n"]
+    for group in _group_opcodes(opcodes, FORMAT_DIFF_CONTEXT):
+        if len(diff_lines) > MAX_FORMAT_DIFF_SETS * MAX_FORMAT_DIFF_LINES:
+            diff_lines.append("...\n")
+            break
+        first_change = next(i1 for tag, i1, _, _, _ in group if tag != "equal")
+        heading = segments[bisect.bisect_right(segment_starts, first_change) - 1][4]
+        diff_lines += _format_hunk(group, pr_lines, expected_lines, heading)
+    joined_diff = "".join(diff_lines)
+    diff = f"Formatting for JSON is incorrect;\nerror was:\n```diff\n{joined_diff}\n```"
+    if misformatted_sets > MAX_FORMAT_DIFF_SETS:
+        diff += (
+            f"\n{misformatted_sets - MAX_FORMAT_DIFF_SETS} more sets are "
+            + "formatted incorrectly"
+        )
+    return diff
+
+
+def _split_lines(text):
+    # Splits text into lines on newlines only, keeping their ends
+    lines = [line + "\n" for line in text.split("\n")]
+    if lines[-1] == "\n":
+        lines.pop()
+    else:
+        lines[-1] = lines[-1][:-1]
+    return lines
+
+
+def _set_segments(rws_json_string, pr_lines, expected_lines, rws_sites):
+    # Splits both files into the lines before the first set, the lines from
+    # the start of each set to the start of the next, or the end of the last,
+    # and the lines after it, with the primary of each set, as tuples of the
+    # PR file's range of lines, the expected range and the primary. Returns
+    # None if the sets cannot be told apart by line in either file.
+    sets = rws_sites.get("sets") if isinstance(rws_sites, dict) else None
+    pr_set_lines = _pr_set_lines(rws_json_string)
+    expected_set_lines = _expected_set_lines(expected_lines)
+    if not sets or pr_set_lines is None or expected_set_lines is None:
+        return None
+    pr_starts, pr_last_end = pr_set_lines
+    expected_starts, expected_last_end = expected_set_lines
+    if not len(sets) == len(pr_starts) == len(expected_starts):
+        return None
+    pr_bounds = [0] + pr_starts + [pr_last_end + 1, len(pr_lines)]
+    expected_bounds = (
+        [0] + expected_starts + [expected_last_end + 1, len(expected_lines)]
+    )
+    headings = [""] + [str(rws.get("primary", "")) for rws in sets] + [""]
+    return [
+        (
+            pr_bounds[i],
+            pr_bounds[i + 1],
+            expected_bounds[i],
+            expected_bounds[i + 1],
+            headings[i],
+        )
+        for i in range(len(headings))
+    ]
+
+
+def _pr_set_lines(rws_json_string):
+    # Returns the lines on which the sets of the PR file start, and the line
+    # on which the last one ends, or None if a set does not start on a line
+    # of its own
+    text = rws_json_string
+    decoder = json.JSONDecoder()
+
+    def skip(pos):
+        return _JSON_WHITESPACE.match(text, pos).end()
+
+    spans = []
+    try:
+        pos = skip(0)
+        if text[pos] != "{":
+            return None
+        pos = skip(pos + 1)
+        while text[pos] != "}":
+            key, pos = decoder.raw_decode(text, pos)
+            pos = skip(skip(pos) + 1)
+            if key == "sets" and text[pos] == "[":
+                spans = []
+                pos = skip(pos + 1)
+                while text[pos] != "]":
+                    _, end = decoder.raw_decode(text, pos)
+                    spans.append((pos, end))
+                    pos = skip(end)
+                    if text[pos] == ",":
+                        pos = skip(pos + 1)
+                pos += 1
+            else:
+                _, pos = decoder.raw_decode(text, pos)
+            pos = skip(pos)
+            if text[pos] == ",":
+                pos = skip(pos + 1)
+    except (IndexError, ValueError):
+        return None
+
+    starts = []
+    line = last_end = counted = 0
+    for start, end in spans:
+        line += text.count("\n", counted, start)
+        line_start = text.rfind("\n", 0, start) + 1
+        if text[line_start:start].strip() or (starts and line <= last_end):
+            return None
+        starts.append(line)
+        line += text.count("\n", start, end)
+        counted = end
+        last_end = line
+    return (starts, last_end) if starts else None
+
+
+def _expected_set_lines(expected_lines):
+    # As _pr_set_lines, for the formatted file, where each set starts on a
+    # line of its own at the indentation of the elements of "sets"
+    try:
+        sets_line = expected_lines.index('  "sets": [\n')
+    except ValueError:
+        return None
+    starts = []
+    for line in range(sets_line + 1, len(expected_lines)):
+        if expected_lines[line].startswith("  ]"):
+            return (starts, line - 1) if starts else None
+        if expected_lines[line] == "    {\n":
+            starts.append(line)
+    return None
+
+
+def _segment_opcodes(
+    pr_lines, expected_lines, pr_start, pr_end, expected_start, expected_end
+):
+    # Returns the opcodes, as SequenceMatcher.get_opcodes does, that turn a
+    # segment of the PR file into the same segment of the expected file,
+    # with the line numbers of the whole files. Only the span between their
+    # common first and last lines is matched.
+    prefix = 0
+    while (
+        pr_start + prefix < pr_end
+        and expected_start + prefix < expected_end
+        and pr_lines[pr_start + prefix] == expected_lines[expected_start + prefix]
+    ):
+        prefix += 1
+    suffix = 0
+    while (
+        pr_start + prefix < pr_end - suffix
+        and expected_start + prefix < expected_end - suffix
+        and pr_lines[pr_end - suffix - 1] == expected_lines[expected_end - suffix - 1]
+    ):
+        suffix += 1
+    pr_span = (pr_start + prefix, pr_end - suffix)
+    expected_span = (expected_start + prefix, expected_end - suffix)
+    opcodes = [("equal", pr_start, pr_span[0], expected_start, expected_span[0])]
+    if max(pr_span[1] - pr_span[0], expected_span[1] - expected_span[0]) > (
+        MAX_FORMAT_DIFF_WINDOW
+    ):
+        opcodes.append(("replace",) + pr_span + expected_span)
+    else:
+        matcher = difflib.SequenceMatcher(
+            None,
+            pr_lines[pr_span[0] : pr_span[1]],
+            expected_lines[expected_span[0] : expected_span[1]],
+        )
+        opcodes += [
+            (
+                tag,
+                pr_span[0] + i1,
+                pr_span[0] + i2,
+                expected_span[0] + j1,
+                expected_span[0] + j2,
+            )
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        ]
+    opcodes.append(("equal", pr_span[1], pr_end, expected_span[1], expected_end))
+    return opcodes
+
+
+def _group_opcodes(opcodes, context):
+    # Groups opcodes into hunks with context lines around their changes, as
+    # SequenceMatcher.get_grouped_opcodes does
+    codes = []
+    for opcode in opcodes:
+        if opcode[1] == opcode[2] and opcode[3] == opcode[4]:
+            continue
+        if not codes or (opcode[0] == "equal") != (codes[-1][0] == "equal"):
+            codes.append(opcode)
+            continue
+        # Changes on both sides of a boundary between segments are one change,
+        # as they are when the whole file is matched at once
+        tag, i1, _, j1, _ = codes[-1]
+        if tag != "equal":
+            tag = "replace" if i1 < opcode[2] and j1 < opcode[4] else opcode[0]
+        codes[-1] = (tag, i1, opcode[2], j1, opcode[4])
+    if not codes:
+        return []
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # End the current group and start a new one whenever there is a
+        # large range with no changes
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    groups.append(group)
+    return [group for group in groups if any(tag != "equal" for tag, *_ in group)]
+
+
+def _format_hunk(group, pr_lines, expected_lines, heading):
+    # Returns the lines of a hunk of a unified diff, of at most
+    # MAX_FORMAT_DIFF_LINES lines after its header
+    pr_range = _format_range(group[0][1], group[-1][2])
+    expected_range = _format_range(group[0][3], group[-1][4])
+    heading = f" {heading}" if heading else ""
+    hunk = [f"@@ -{pr_range} +{expected_range} @@{heading}\n"]
+    limit = MAX_FORMAT_DIFF_LINES + 1
+    # Each side of a long change shows its first lines, so that both the
+    # PR file and the expected file are shown
+    side = MAX_FORMAT_DIFF_LINES // 2
+    for tag, i1, i2, j1, j2 in group:
+        if tag == "equal":
+            hunk += [" " + line for line in pr_lines[i1 : min(i2, i1 + limit)]]
+            if len(hunk) > limit:
+                return [_clip_line(line) for line in hunk[:limit]] + ["...\n"]
+            continue
+        hunk += ["-" + line for line in pr_lines[i1 : min(i2, i1 + side)]]
+        if i2 - i1 > side:
+            hunk.append("...\n")
+        hunk += ["+" + line for line in expected_lines[j1 : min(j2, j1 + side)]]
+        if j2 - j1 > side:
+            hunk.append("...\n")
+        if len(hunk) > limit:
+            if hunk[-1] != "...\n":
+                hunk.append("...\n")
+            return [_clip_line(line) for line in hunk]
+    return [_clip_line(line) for line in hunk]
+
+
+def _format_range(start, stop):
+    # Formats a range of lines as difflib.unified_diff does
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+
+def _clip_line(line):
+    # Shortens a line of a diff to MAX_FORMAT_DIFF_LINE_LENGTH characters
+    if len(line) <= MAX_FORMAT_DIFF_LINE_LENGTH:
+        return line
+    end = "\n" if line.endswith("\n") else ""
+    return line[:MAX_FORMAT_DIFF_LINE_LENGTH] + "..." + end
@@ -0,0 +1,177 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_TTL = 14 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def response_to_dict(response):
+    """Returns a JSON serializable dict holding a requests.Response"""
+    return {
+        "url": response.url,
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "headers": {k.lower(): v for k, v in response.headers.items()},
+        "body": base64.b64encode(response.content).decode("ascii"),
+    }
+
+
+def response_from_dict(entry):
+    """Returns the requests.Response held by a dict from response_to_dict"""
+    response = Response()
+    response.url = entry["url"]
+    response.status_code = entry["status_code"]
+    response.reason = entry["reason"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = base64.b64decode(entry["body"])
+    return response
+
+
+class RwsHttpCache:
+    """Stores responses on disk and revalidates them on later runs
+
+    Responses that carry an ETag or Last-Modified header are written to
+    cache_dir. The next request for the same url sends If-None-Match and
+    If-Modified-Since, and a 304 from the server is answered with the stored
+    response, so unchanged pages are never downloaded twice.
+
+    Attributes:
+      cache_dir: the directory the entries are stored in
+      ttl: number of seconds after which an entry is no longer revalidated,
+      and is dropped instead
+      max_bytes: the total size the entries are pruned down to
+      hits: the number of requests answered from the cache
+      misses: the number of requests that downloaded a response
+    """
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, session, url, **kwargs):
+        """Makes a GET request for url through session, using the cache
+
+        Args:
+            session: the requests.Session to make the request with
+            url: string
+            **kwargs: passed on to session.get
+        Returns:
+            requests.Response
+        """
+        path = self._entry_path(url, kwargs)
+        entry = self._load(path)
+        if entry is not None:
+            headers = dict(kwargs.get("headers") or {})
+            if "etag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["etag"]
+            if "last-modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+            kwargs["headers"] = headers
+        response = session.get(url, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self._count(hit=True)
+            entry["stored"] = time.time()
+            self._save(path, entry)
+            return response_from_dict(entry)
+        self._count(hit=False)
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            entry = response_to_dict(response)
+            entry["stored"] = time.time()
+            self._save(path, entry)
+        return response
+
+    def prune(self):
+        """Drops expired entries, then the least recently used entries until
+        the cache fits in max_bytes"""
+        entries = []
+        for dir_entry in os.scandir(self.cache_dir):
+            if not dir_entry.name.endswith(".json"):
+                continue
+            stat = dir_entry.stat()
+            if time.time() - stat.st_mtime > self.ttl:
+                self._remove(dir_entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self):
+        """Returns the number of cache hits and misses of the run"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry_path(self, url, kwargs):
+        key = json.dumps(
+            [
+                url,
+                kwargs.get("allow_redirects", True),
+                sorted((kwargs.get("headers") or {}).items()),
+            ]
+        )
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json"
+        )
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("stored", 0) > self.ttl:
+            self._remove(path)
+            return None
+        return entry
+
+    def _save(self, path, entry):
+        # Forked workers share the cache directory, and their threads can
+        # have the same ident, so the temporary file is named for both
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,224 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import concurrent.futures
+import functools
+import itertools
+import socket
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+DEFAULT_HOST_RATE = 5.0
+DEFAULT_HOST_BURST = 5
+DEFAULT_IP_RATE = 20.0
+DEFAULT_IP_BURST = 20
+
+
+class TokenBucket:
+    """A thread-safe token bucket
+
+    Attributes:
+      rate: the number of tokens added per second
+      burst: the largest number of tokens the bucket holds
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns how long to wait before using it
+
+        When the bucket is empty the token is taken from the future, so that
+        callers are served in the order they reserved.
+
+        Returns:
+            float number of seconds to wait
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+@functools.lru_cache(maxsize=None)
+def _lookup_host(host):
+    try:
+        return socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)[0][4][0]
+    except (OSError, UnicodeError):
+        return None
+
+
+def resolve_host(host, timeout=None):
+    """Returns the first address host resolves to, or None if it does not
+
+    Args:
+        host: string
+        timeout: the most seconds to wait for the lookup, which otherwise
+        finishes in the background, or None to wait for as long as it takes
+    Returns:
+        string or None, also if the lookup did not finish in time
+    """
+    if timeout is None:
+        return _lookup_host(host)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(_lookup_host, host)
+    executor.shutdown(wait=False)
+    try:
+        return future.result(timeout=max(0, timeout))
+    except concurrent.futures.TimeoutError:
+        return None
+
+
+def round_robin_by_host(urls):
+    """Orders urls so that consecutive urls are on different hosts
+
+    The urls of each host keep their relative order, and hosts take turns in
+    the order they first appear.
+
+    Args:
+        urls: list[string]
+    Returns:
+        list[string]
+    """
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(urlsplit(url).hostname, []).append(url)
+    return [
+        url
+        for turn in itertools.zip_longest(*by_host.values())
+        for url in turn
+        if url is not None
+    ]
+
+
+class RwsRateLimiter:
+    """Limits the rate of requests made to each host and address
+
+    Every request takes a token from the bucket of its host and from the
+    bucket of the address that host resolves to, so that sets sharing a
+    hosting provider or CDN cannot burst it all at once. A rate of None or 0
+    turns the corresponding limit off.
+
+    Hosts are resolved by resolve, a function such as resolve_host or
+    RwsResolver.address, that takes a host and the most seconds to wait for
+    the lookup. Hosts with an override are never resolved; the requests to
+    them share the address bucket of the origin they are sent to instead.
+
+    Attributes:
+      host_rate: requests per second allowed to each host
+      host_burst: requests allowed to each host in a single burst
+      ip_rate: requests per second allowed to each resolved address
+      ip_burst: requests allowed to each resolved address in a single burst
+      host_overrides: an optional Dict[string, string] of the origin that
+                      the requests to each host are sent to, as RwsFetcher
+                      takes it, with "*" for every host
+    """
+
+    def __init__(
+        self,
+        host_rate=DEFAULT_HOST_RATE,
+        host_burst=DEFAULT_HOST_BURST,
+        ip_rate=DEFAULT_IP_RATE,
+        ip_burst=DEFAULT_IP_BURST,
+        resolve=resolve_host,
+        sleep=time.sleep,
+        host_overrides=None,
+    ):
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.host_overrides = host_overrides or {}
+        self._resolve = resolve
+        self._sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def split(self, parts):
+        """Returns a limiter for one of parts processes sharing these limits
+
+        Hosts are not shared between the sets that each process checks, so
+        each process keeps the full per host limits. The per address limits
+        are divided evenly between the processes.
+
+        Args:
+            parts: the number of processes
+        Returns:
+            RwsRateLimiter
+        """
+        return RwsRateLimiter(
+            self.host_rate,
+            self.host_burst,
+            self.ip_rate / parts if self.ip_rate else self.ip_rate,
+            max(1, self.ip_burst // parts),
+            self._resolve,
+            self._sleep,
+            self.host_overrides,
+        )
+
+    def acquire(self, url, deadline=None):
+        """Blocks until a request to url is allowed
+
+        With a deadline, neither resolving the host nor waiting for the
+        request to be allowed blocks past it. A host not resolved by then is
+        only limited by its host bucket.
+
+        Args:
+            url: string
+            deadline: an optional time.monotonic() time by which the request
+            must be allowed
+        Returns:
+            True once the request is allowed, or False if it would not be
+            allowed before the deadline
+        """
+        host = urlsplit(url).hostname
+        wait = 0.0
+        if self.host_rate:
+            wait = self._reserve(("host", host), self.host_rate, self.host_burst)
+        if self.ip_rate:
+            override = self.host_overrides.get(host, self.host_overrides.get("*"))
+            if override is not None:
+                address = override
+            elif deadline is None:
+                address = self._resolve(host)
+            else:
+                address = self._resolve(host, deadline - time.monotonic())
+            if address is not None:
+                wait = max(
+                    wait, self._reserve(("ip", address), self.ip_rate, self.ip_burst)
+                )
+        if deadline is not None and time.monotonic() + wait > deadline:
+            return False
+        if wait > 0:
+            self._sleep(wait)
+        return True
+
+    def _reserve(self, key, rate, burst):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+        return bucket.reserve()
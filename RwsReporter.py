@@ -0,0 +1,194 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import json
+import threading
+import time
+
+
+class RwsReporter:
+    """Publishes the findings of a run to its sinks as they are found
+
+    A finding is an error found by a check, or the exception a check raised.
+    Each one is passed to every sink when it is published, as a record of
+    its text, the check that found it, if known, and the seconds since the
+    run started. When the run ends, close passes every sink a summary of it.
+
+    A sink is any object with a finding(record) and a close(summary) method,
+    such as a StdoutSink, an NdjsonSink or a CallbackSink.
+
+    Attributes:
+      sinks: the sinks the findings are published to
+      clock: the function returning the current time, in seconds
+      count: the number of findings published
+      first_finding: the seconds from the start of the run to the first
+                     finding, or None if there has been none
+    """
+
+    def __init__(self, sinks=(), clock=time.perf_counter):
+        self.sinks = list(sinks)
+        self.clock = clock
+        self.count = 0
+        self.first_finding = None
+        self._start = clock()
+        self._check = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def checking(self, check):
+        """Attributes the findings published in the body of a with statement
+        to the check named check"""
+        previous = self._check
+        self._check = check
+        try:
+            yield
+        finally:
+            self._check = previous
+
+    def publish(self, finding, check=None):
+        """Passes a finding to every sink
+
+        Args:
+            finding: the error, as a string, or the exception raised
+            check: the name of the check that found it, by default the one
+            of the enclosing checking statement
+        """
+        with self._lock:
+            seconds = self.clock() - self._start
+            record = {
+                "check": check or self._check,
+                "finding": str(finding),
+                "seconds": seconds,
+            }
+            self.count += 1
+            if self.first_finding is None:
+                self.first_finding = seconds
+            for sink in self.sinks:
+                sink.finding(record)
+
+    def finding_list(self):
+        """Returns an empty FindingList that publishes to this reporter"""
+        return FindingList(self)
+
+    def close(self):
+        """Passes the summary of the run to every sink, and returns it
+
+        Returns:
+            Dict[string, object] of the number of findings, whether the run
+            succeeded, which it did if there were none, the seconds to the
+            first finding and the seconds the run took
+        """
+        with self._lock:
+            summary = {
+                "findings": self.count,
+                "success": self.count == 0,
+                "time_to_first_finding": self.first_finding,
+                "seconds": self.clock() - self._start,
+            }
+            for sink in self.sinks:
+                sink.close(summary)
+        return summary
+
+    def report(self):
+        """Returns a one line summary of the findings"""
+        if self.first_finding is None:
+            return "Findings: 0"
+        return (
+            f"Findings: {self.count}, the first after "
+            + f"{self.first_finding * 1000:.1f} ms"
+        )
+
+
+class FindingList(list):
+    """A list that publishes the findings added to it
+
+    Findings are published when they are appended, extended or added with
+    +=, the ways the checks add to their error_list.
+    """
+
+    def __init__(self, reporter):
+        super().__init__()
+        self.reporter = reporter
+
+    def append(self, finding):
+        self.reporter.publish(finding)
+        super().append(finding)
+
+    def extend(self, findings):
+        for finding in findings:
+            self.append(finding)
+
+    def __iadd__(self, findings):
+        self.extend(findings)
+        return self
+
+
+class StdoutSink:
+    """Prints each finding as it is found, and "success" at the end of a run
+    without any, as the workflows that run check_sites expect
+
+    Attributes:
+      stream: the file printed to, or None for sys.stdout
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def finding(self, record):
+        print(record["finding"], file=self.stream, flush=True)
+
+    def close(self, summary):
+        if summary["success"]:
+            print("success", end="", file=self.stream, flush=True)
+
+
+class NdjsonSink:
+    """Writes each finding, and then the summary of the run, to a file as
+    one JSON object per line
+
+    Each line is flushed as it is written, so that the file can be followed
+    while the checks run. Findings have an "event" of "finding" and the
+    summary one of "summary".
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+
+    def finding(self, record):
+        self._write({"event": "finding"} | record)
+
+    def close(self, summary):
+        self._write({"event": "summary"} | summary)
+        self._file.close()
+
+    def _write(self, event):
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+
+class CallbackSink:
+    """Calls a function with each finding, and optionally another with the
+    summary of the run"""
+
+    def __init__(self, on_finding, on_close=None):
+        self.on_finding = on_finding
+        self.on_close = on_close
+
+    def finding(self, record):
+        self.on_finding(record)
+
+    def close(self, summary):
+        if self.on_close is not None:
+            self.on_close(summary)
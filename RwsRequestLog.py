@@ -0,0 +1,125 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+
+from urllib.parse import urlsplit
+
+
+class RwsRequestLog:
+    """Records the latency, status and size of every request of a run
+
+    Each request is an entry of its method, url, host, the seconds it took,
+    and either the status and body size of its response or the type of the
+    error it raised. The entries of a worker process' log are added to its
+    parent's with merge.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def record(self, method, url, seconds, response=None, error=None):
+        """Records a single request
+
+        Args:
+            method: the method of the request
+            url: the url that was requested
+            seconds: the number of seconds the request took
+            response: the requests.Response received, if any
+            error: the exception raised by the request, if any
+        """
+        entry = {
+            "method": method,
+            "url": url,
+            "host": urlsplit(url).hostname,
+            "seconds": seconds,
+            "status": None,
+            "bytes": None,
+        }
+        if error is not None:
+            entry["error"] = type(error).__name__
+        else:
+            entry["status"] = response.status_code
+            # The fetcher reads or discards every body before the response
+            # is returned, so this never reads one
+            content = response._content
+            if isinstance(content, bytes):
+                entry["bytes"] = len(content)
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        """Returns list[Dict[string, object]] of the entries, in the order
+        their requests finished"""
+        with self._lock:
+            return list(self._entries)
+
+    def merge(self, entries):
+        """Adds the entries of another log, such as a worker process'"""
+        with self._lock:
+            self._entries.extend(entries)
+
+    def clear(self):
+        """Drops every entry, such as those a forked worker inherited"""
+        with self._lock:
+            self._entries.clear()
+
+    def by_host(self):
+        """Groups the entries by host
+
+        Returns:
+            Dict[string, Dict[string, object]] mapping each host to the
+            number of its requests, their total and slowest seconds, their
+            total bytes, the count of each status or error, and the entries
+            themselves, in the order the hosts were first requested
+        """
+        hosts = {}
+        for entry in self.entries():
+            host = hosts.setdefault(
+                entry["host"],
+                {
+                    "requests": 0,
+                    "seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "bytes": 0,
+                    "statuses": {},
+                    "entries": [],
+                },
+            )
+            host["requests"] += 1
+            host["seconds"] += entry["seconds"]
+            host["max_seconds"] = max(host["max_seconds"], entry["seconds"])
+            host["bytes"] += entry["bytes"] or 0
+            status = str(entry.get("error", entry["status"]))
+            host["statuses"][status] = host["statuses"].get(status, 0) + 1
+            host["entries"].append(entry)
+        return hosts
+
+    def slowest_hosts(self, num_hosts):
+        """Returns the hosts whose requests took the most time in total
+
+        Args:
+            num_hosts: the most hosts to return
+        Returns:
+            list[Tuple[string, float, int]] of each host, the total seconds
+            of its requests and their number, the slowest first
+        """
+        hosts = self.by_host()
+        return sorted(
+            (
+                (host, stats["seconds"], stats["requests"])
+                for host, stats in hosts.items()
+            ),
+            key=lambda item: -item[1],
+        )[:num_hosts]
@@ -0,0 +1,191 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import concurrent.futures
+import socket
+import threading
+
+from requests.exceptions import ConnectionError
+from urllib.parse import urlsplit
+
+DEFAULT_RESOLVE_CONCURRENCY = 64
+DEFAULT_RESOLVE_TIMEOUT = 10
+# getaddrinfo errors that mean the host does not exist, and those that mean
+# its name servers failed to answer
+NXDOMAIN_ERRORS = frozenset(
+    getattr(socket, name)
+    for name in ["EAI_NONAME", "EAI_NODATA"]
+    if hasattr(socket, name)
+)
+SERVFAIL_ERRORS = frozenset([socket.EAI_AGAIN, socket.EAI_FAIL])
+
+
+class UnresolvableHost(ConnectionError):
+    """Raised instead of making a request to a host that did not resolve
+
+    Attributes:
+      host: the host that did not resolve
+      reason: NXDOMAIN, SERVFAIL or the resolver's error message
+    """
+
+    def __init__(self, host, reason):
+        super().__init__(f"{host} could not be resolved ({reason})")
+        self.host = host
+        self.reason = reason
+
+
+class RwsResolver:
+    """Resolves the hosts of a run up front and remembers the outcome
+
+    resolve_all looks up every host concurrently before any check runs.
+    Hosts that do not exist, or whose name servers fail, are then failed
+    immediately by check, instead of every check waiting on the resolver
+    again for the same dead host.
+
+    Attributes:
+      max_concurrency: the most lookups made at once by resolve_all
+      timeout: the seconds resolve_all waits for its lookups; hosts still
+      unresolved by then are left to be resolved when they are requested
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_RESOLVE_CONCURRENCY,
+        timeout=DEFAULT_RESOLVE_TIMEOUT,
+        getaddrinfo=socket.getaddrinfo,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._getaddrinfo = getaddrinfo
+        self._addresses = {}
+        self._failures = {}
+        self._lookups = []
+        self._lock = threading.Lock()
+
+    def resolve_all(self, hosts, timeout=None):
+        """Resolves every host that has not been resolved yet, concurrently
+
+        Args:
+            hosts: an iterable of host names
+            timeout: the most seconds to wait for the lookups, by default
+            self.timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+        with self._lock:
+            hosts = [
+                host
+                for host in dict.fromkeys(hosts)
+                if host and host not in self._addresses and host not in self._failures
+            ]
+        if not hosts:
+            return
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(hosts))
+        )
+        try:
+            futures = [executor.submit(self.address, host) for host in hosts]
+            concurrent.futures.wait(futures, timeout=timeout)
+        finally:
+            # Lookups that outlive the timeout finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._lookups = [f for f in self._lookups + futures if not f.done()]
+
+    def wait_for_lookups(self, timeout):
+        """Waits for the lookups that outlived resolve_all to finish
+
+        A process must not be forked while a lookup runs in the background,
+        since the child could inherit a lock that the lookup holds and that
+        nothing in the child would ever release.
+
+        Args:
+            timeout: the most seconds to wait
+        Returns:
+            True if no lookup is running any more, False otherwise
+        """
+        with self._lock:
+            lookups = list(self._lookups)
+        _, not_done = concurrent.futures.wait(lookups, timeout=timeout)
+        with self._lock:
+            self._lookups = [f for f in self._lookups if not f.done()]
+        return not not_done
+
+    def address(self, host, timeout=None):
+        """Returns the first address host resolves to, or None if it does not
+
+        The outcome is cached for the rest of the run. A lookup that outlives
+        timeout finishes in the background, as those of resolve_all do.
+
+        Args:
+            host: string
+            timeout: the most seconds to wait for the lookup, or None to wait
+            for as long as it takes
+        Returns:
+            string or None, also if the lookup did not finish in time
+        """
+        with self._lock:
+            if host in self._addresses:
+                return self._addresses[host]
+            if host in self._failures:
+                return None
+        if timeout is not None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            future = executor.submit(self.address, host)
+            executor.shutdown(wait=False)
+            with self._lock:
+                self._lookups.append(future)
+            try:
+                return future.result(timeout=max(0, timeout))
+            except concurrent.futures.TimeoutError:
+                return None
+        address, reason = None, None
+        try:
+            address = self._getaddrinfo(host, None, proto=socket.IPPROTO_TCP)[0][4][0]
+        except socket.gaierror as inst:
+            if inst.errno in NXDOMAIN_ERRORS:
+                reason = "NXDOMAIN"
+            elif inst.errno in SERVFAIL_ERRORS:
+                reason = "SERVFAIL"
+            else:
+                reason = str(inst)
+        except (OSError, UnicodeError) as inst:
+            reason = str(inst)
+        with self._lock:
+            if reason is None:
+                self._addresses[host] = address
+            else:
+                self._failures[host] = reason
+        return address
+
+    def check(self, url):
+        """Raises UnresolvableHost if the host of url is known not to resolve
+
+        Hosts that have not been resolved yet are not looked up.
+
+        Args:
+            url: string
+        Raises:
+            UnresolvableHost
+        """
+        host = urlsplit(url).hostname
+        with self._lock:
+            reason = self._failures.get(host)
+        if reason is not None:
+            raise UnresolvableHost(host, reason)
+
+    def unresolvable_hosts(self):
+        """Returns Dict[string, string] of the hosts that did not resolve,
+        and why"""
+        with self._lock:
+            return dict(self._failures)
@@ -0,0 +1,184 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import hashlib
+import json
+import os
+import threading
+
+RESULT_CACHE_VERSION = 1
+DEFAULT_MAX_ENTRIES = 10000
+# The RwsCheck functions whose findings for a set depend only on the set,
+# the PSL and the ICANN domains, in the order run_nonbreaking_checks runs them
+CACHEABLE_CHECKS = [
+    "has_all_rationales",
+    "find_non_https_urls",
+    "find_invalid_eTLD_Plus1",
+    "find_invalid_alias_eSLDs",
+]
+# The sources of the checks, including those of the suffix index they look
+# domains up in; a change to any of them changes every cache key
+CHECKER_SOURCES = ["RwsCheck.py", "RwsSet.py", "RwsSuffixIndex.py", "RwsSnapshot.py"]
+
+
+def file_digest(path):
+    """Returns the sha256 hex digest of the contents of a file"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def checker_version():
+    """Returns a digest identifying the version of the checks"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return hashlib.sha256(
+        "".join(
+            file_digest(os.path.join(directory, source)) for source in CHECKER_SOURCES
+        ).encode()
+    ).hexdigest()
+
+
+class RwsResultCache:
+    """Stores the findings of the offline checks for each set on disk
+
+    Each set's findings are stored under a key made from its canonical JSON,
+    the digests of the input files the checks read, such as
+    effective_tld_names.dat and ICANN_domains, and the version of the
+    checks. A set that has not changed since an earlier run gets its
+    findings from the cache instead of being checked again. Entries are
+    evicted least recently used first.
+
+    Attributes:
+      cache_dir: the directory the entries are stored in
+      max_entries: the number of entries the cache is pruned down to
+      hits: the number of sets whose findings came from the cache
+      misses: the number of sets that were checked
+    """
+
+    def __init__(self, cache_dir, input_files, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._context = json.dumps(
+            [RESULT_CACHE_VERSION, checker_version()]
+            + [file_digest(path) for path in input_files]
+        )
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def run_checks(self, rws_checker, check_sets):
+        """Runs the CACHEABLE_CHECKS on check_sets, using the cache
+
+        Sets are checked one at a time, by a copy of rws_checker that only
+        holds the set, so that the findings of each can be stored apart.
+        Findings are returned in the order the checks would have found them
+        running on all of check_sets at once. Sets for which a check raised
+        an exception are not stored.
+
+        Args:
+            rws_checker: RwsCheck object
+            check_sets: Dict[string, RwsSet]
+        Returns:
+            Dict[string, Tuple[list[string], list[Exception]]] mapping each
+            check to the errors it found and the exceptions it raised
+        """
+        raw_sets = {}
+        for rwset in rws_checker.rws_sites["sets"]:
+            raw_sets.setdefault(rwset.get("primary"), []).append(rwset)
+        results = {check: ([], []) for check in CACHEABLE_CHECKS}
+        for primary, rws_set in check_sets.items():
+            path = self._entry_path(raw_sets.get(primary, []))
+            entry = self._load(path)
+            exceptions = {}
+            if entry is None:
+                self._count(hit=False)
+                entry, exceptions = self._check_set(
+                    rws_checker, primary, rws_set, raw_sets.get(primary, [])
+                )
+                if not exceptions:
+                    self._save(path, entry)
+            else:
+                self._count(hit=True)
+            for check in CACHEABLE_CHECKS:
+                results[check][0].extend(entry[check])
+                if check in exceptions:
+                    results[check][1].append(exceptions[check])
+        return results
+
+    def _check_set(self, rws_checker, primary, rws_set, raw_sets):
+        set_checker = copy.copy(rws_checker)
+        set_checker.rws_sites = {"sets": raw_sets}
+        entry = {}
+        exceptions = {}
+        for check in CACHEABLE_CHECKS:
+            set_checker.error_list = []
+            try:
+                getattr(set_checker, check)({primary: rws_set})
+            except Exception as inst:
+                exceptions[check] = inst
+            entry[check] = set_checker.error_list
+        return entry, exceptions
+
+    def prune(self):
+        """Drops the least recently used entries until at most max_entries
+        are left"""
+        entries = sorted(
+            (dir_entry.stat().st_mtime, dir_entry.path)
+            for dir_entry in os.scandir(self.cache_dir)
+            if dir_entry.name.endswith(".json")
+        )
+        for _, path in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Returns the number of cache hits and misses of the run"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry_path(self, raw_sets):
+        canonical = json.dumps(
+            raw_sets, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        key = hashlib.sha256((self._context + canonical).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(isinstance(entry.get(check), list) for check in CACHEABLE_CHECKS):
+            return None
+        # Reading an entry makes it the most recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _save(self, path, entry):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,181 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import random
+import threading
+
+from requests.exceptions import ConnectionError, SSLError, Timeout
+from RwsFetcher import ReadDeadlineExceeded, ResponseTooLarge
+from RwsResolver import UnresolvableHost
+from urllib.parse import urlsplit
+from urllib3.exceptions import NameResolutionError
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8
+DEFAULT_RETRY_BUDGET = 200
+TRANSIENT_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+
+def is_unreachable(inst):
+    """Returns whether an exception means that a site could not be reached
+
+    A site is unreachable when no connection could be made to it, including
+    TLS and DNS failures, or when it did not answer in time.
+
+    Args:
+        inst: the exception raised by a request
+    Returns:
+        boolean
+    """
+    return isinstance(inst, (ConnectionError, Timeout))
+
+
+def is_transient(inst):
+    """Returns whether an exception is worth retrying
+
+    Timeouts and dropped connections are transient. TLS and DNS failures are
+    not, and neither are hosts that did not resolve before the run, since
+    trying again will fail the same way. Bodies that were too large or too
+    slow to read are not either, so that a hostile body costs a single
+    read of at most max_read_time.
+
+    Args:
+        inst: the exception raised by a request
+    Returns:
+        boolean
+    """
+    if isinstance(inst, (ReadDeadlineExceeded, ResponseTooLarge)):
+        return False
+    if isinstance(inst, Timeout):
+        return True
+    if not isinstance(inst, ConnectionError) or isinstance(
+        inst, (SSLError, UnresolvableHost)
+    ):
+        return False
+    reason = getattr(inst.args[0], "reason", None) if inst.args else None
+    return not isinstance(reason, NameResolutionError)
+
+
+class RwsRetryPolicy:
+    """Decides which requests are retried, and how long to wait before each
+
+    Requests that fail with a transient error, or a transient status code
+    where the caller asks for it, are retried up to max_attempts times,
+    waiting an exponentially growing, fully jittered delay in between.
+    Retries are drawn from a budget shared by the whole run, so that an
+    outage cannot multiply the run time.
+
+    Attributes:
+      max_attempts: the most times a single request is attempted
+      base_delay: the largest delay before the first retry, in seconds
+      max_delay: the largest delay before any retry, in seconds
+      retry_budget: the number of retries left for the rest of the run
+      retries_by_host: Dict[string, int] of the retries made for each host
+    """
+
+    def __init__(
+        self,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        base_delay=DEFAULT_BASE_DELAY,
+        max_delay=DEFAULT_MAX_DELAY,
+        retry_budget=DEFAULT_RETRY_BUDGET,
+        random=random.random,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.retries_by_host = {}
+        self._random = random
+        self._lock = threading.Lock()
+
+    def retry_delay(
+        self,
+        url,
+        attempt,
+        response=None,
+        error=None,
+        time_left=None,
+        retry_statuses=True,
+    ):
+        """Returns how long to wait before retrying a request, or None
+
+        Args:
+            url: the url that was requested
+            attempt: the number of attempts made so far, starting at 1
+            response: the requests.Response received, if any
+            error: the exception raised by the request, if any
+            time_left: the number of seconds left in the run, if it has a
+            time budget
+            retry_statuses: whether a response with a transient status code
+            is retried, or kept as it is
+        Returns:
+            float number of seconds to wait, or None if the request should not
+            be retried
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None:
+            if not is_transient(error):
+                return None
+            delay = self._backoff(attempt)
+        elif retry_statuses and response.status_code in TRANSIENT_STATUS_CODES:
+            delay = self._retry_after(response)
+            if delay is None:
+                delay = self._backoff(attempt)
+        else:
+            return None
+        if time_left is not None and delay >= time_left:
+            return None
+        with self._lock:
+            if self.retry_budget <= 0:
+                return None
+            self.retry_budget -= 1
+            host = urlsplit(url).hostname
+            self.retries_by_host[host] = self.retries_by_host.get(host, 0) + 1
+        return delay
+
+    def split(self, parts):
+        """Returns a policy for one of parts processes sharing this budget
+
+        The retries left are divided evenly between the processes, so that
+        together they retry no more than a single process would. The new
+        policy starts with no retries by host, so that those of the process
+        can be merged into its parent's.
+
+        Args:
+            parts: the number of processes
+        Returns:
+            RwsRetryPolicy
+        """
+        with self._lock:
+            retry_budget = self.retry_budget // parts
+        return RwsRetryPolicy(
+            self.max_attempts,
+            self.base_delay,
+            self.max_delay,
+            retry_budget,
+            self._random,
+        )
+
+    def _backoff(self, attempt):
+        return self._random() * min(
+            self.max_delay, self.base_delay * 2 ** (attempt - 1)
+        )
+
+    def _retry_after(self, response):
+        try:
+            return min(self.max_delay, max(0, float(response.headers["Retry-After"])))
+        except (KeyError, ValueError):
+            return None
@@ -0,0 +1,145 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import functools
+import json
+import os
+
+from jsonschema import exceptions, validators
+
+
+class RwsSchemaValidator:
+    """Validates lists against a schema, one set at a time
+
+    The schema is checked, and its validators built, once. The sets of a
+    list are validated against the schema of the items of "sets" one by
+    one, so that sets that have not changed can be skipped, and the rest
+    of the list against the schema without them. The errors are the ones
+    jsonschema finds when it validates the whole list, with the same paths,
+    in the same order.
+
+    Attributes:
+      validator: the jsonschema validator of the whole schema
+    """
+
+    def __init__(self, schema):
+        """Checks and compiles schema
+
+        Args:
+            schema: the JSON schema of the list
+        Raises:
+            jsonschema.exceptions.SchemaError if the schema is invalid
+        """
+        validator_class = validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        self.validator = validator_class(schema)
+        self._schema = schema
+        self._items = None
+        sets_schema = schema.get("properties", {}).get("sets")
+        if isinstance(sets_schema, dict) and isinstance(sets_schema.get("items"), dict):
+            list_schema = dict(schema)
+            list_schema["properties"] = dict(schema["properties"])
+            list_schema["properties"]["sets"] = dict(sets_schema)
+            del list_schema["properties"]["sets"]["items"]
+            self._list = self.validator.evolve(schema=list_schema)
+            # uniqueItems compares every pair of sets; it only runs when the
+            # sets are not all distinct, to report the error
+            distinct_list_schema = dict(list_schema)
+            distinct_list_schema["properties"] = dict(list_schema["properties"])
+            distinct_list_schema["properties"]["sets"] = dict(
+                list_schema["properties"]["sets"]
+            )
+            distinct_list_schema["properties"]["sets"].pop("uniqueItems", None)
+            self._distinct_list = self.validator.evolve(schema=distinct_list_schema)
+            self._items = self.validator.evolve(schema=sets_schema["items"])
+
+    def iter_errors(self, rws_sites, unchanged_sets=()):
+        """Yields the errors of a list
+
+        Args:
+            rws_sites: the list, as JSON
+            unchanged_sets: the sets of a list that has already been
+            validated; the sets of rws_sites equal to one of them are not
+            validated again
+        Yields:
+            jsonschema.exceptions.ValidationError
+        """
+        sets = rws_sites.get("sets") if isinstance(rws_sites, dict) else None
+        if self._items is None or not isinstance(sets, list):
+            yield from self.validator.iter_errors(rws_sites)
+            return
+        keys = [set_key(rws) for rws in sets]
+        if len(set(keys)) < len(keys):
+            list_validator = self._list
+        else:
+            list_validator = self._distinct_list
+        for error in list_validator.iter_errors(rws_sites):
+            self._restore_schema(error)
+            yield error
+        unchanged_keys = {set_key(rws) for rws in unchanged_sets}
+        for index, (rws, key) in enumerate(zip(sets, keys)):
+            if key in unchanged_keys:
+                continue
+            for error in self._items.iter_errors(rws):
+                # As if found by validating the whole list
+                error.relative_path.extendleft([index, "sets"])
+                error.relative_schema_path.extendleft(["items", "sets", "properties"])
+                yield error
+
+    def _restore_schema(self, error):
+        # Replaces the schema of an error found without the schema of the
+        # sets with the part of the whole schema it was found in
+        subschema = self._schema
+        for key in list(error.absolute_schema_path)[:-1]:
+            subschema = subschema[key]
+        error.schema = subschema
+        for suberror in error.context:
+            self._restore_schema(suberror)
+
+    def validate(self, rws_sites, unchanged_sets=()):
+        """Raises the error that jsonschema.validate raises for a list, if any
+
+        Args:
+            rws_sites: the list, as JSON
+            unchanged_sets: see iter_errors
+        Raises:
+            jsonschema.exceptions.ValidationError
+        """
+        error = exceptions.best_match(self.iter_errors(rws_sites, unchanged_sets))
+        if error is not None:
+            raise error
+
+
+def set_key(rws):
+    """Returns a string that equal sets, as JSON, have in common"""
+    return json.dumps(rws, sort_keys=True)
+
+
+def load_validator(schema_file):
+    """Returns the RwsSchemaValidator of a schema file
+
+    The validator is built once, and rebuilt if the file changes.
+
+    Args:
+        schema_file: the path of the schema
+    Returns:
+        RwsSchemaValidator
+    """
+    stat = os.stat(schema_file)
+    return _load_validator(os.path.abspath(schema_file), stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_validator(schema_file, mtime_ns, size):
+    with open(schema_file) as f:
+        return RwsSchemaValidator(json.load(f))
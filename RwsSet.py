@@ -11,6 +11,9 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import sys
+
+
 class RwsSet:
     """Stores the data of a Related Website Set
 
@@ -39,7 +42,7 @@ class RwsSet:
         }
 
     def __eq__(self, obj):
-        if isinstance(obj, RwsSet) and self.primary == obj.primary:
+        if isinstance(obj, (RwsSet, FrozenRwsSet)) and self.primary == obj.primary:
             if self.ccTLDs == obj.ccTLDs:
                 if self.associated_sites == obj.associated_sites:
                     if self.service_sites == obj.service_sites:
@@ -54,9 +57,114 @@ class RwsSet:
         ):
             return True
         if with_ccTLDs:
-            return domain in (
-                variant
-                for variant_list in self.ccTLDs.values()
-                for variant in variant_list
+            return any(domain in aliases for aliases in self.ccTLDs.values())
+        return False
+
+
+def _intern(site):
+    return sys.intern(site) if type(site) is str else site
+
+
+# Shared by every FrozenRwsSet without ccTLDs
+_NO_ALIASES = frozenset()
+
+
+class FrozenRwsSet:
+    """An immutable, hashable RwsSet, compact enough for very large lists
+
+    Holds the same data as an RwsSet, and equals the RwsSet of the same
+    set, but keeps its sites in a single tuple of interned strings, has no
+    __dict__, and precomputes the frozensets that includes looks sites up
+    in. Its hash is computed once, so that sets whose hashes differ compare
+    unequal without comparing their sites. The sites read as lists, as from
+    an RwsSet; they are copies, and changing them does not change the set.
+
+    Attributes:
+      primary: A string of the primary domain for a related website set
+      associated_sites: a list of the associated sites of the set
+      service_sites: a list of the service sites of the set
+      ccTLDs: a dict mapping members of the set to their ccTLD variants
+    """
+
+    __slots__ = ("_sites", "_service_start", "_ccTLDs", "_members", "_aliases", "_hash")
+
+    def __init__(self, ccTLDs, primary, associated_sites=(), service_sites=()):
+        primary = "" if primary is None else _intern(primary)
+        associated_sites = tuple(map(_intern, associated_sites or ()))
+        # The primary, then the associated sites, then the service sites
+        self._sites = (primary,) + associated_sites
+        if service_sites:
+            self._sites += tuple(map(_intern, service_sites))
+        self._service_start = 1 + len(associated_sites)
+        self._members = frozenset(self._sites)
+        if ccTLDs:
+            self._ccTLDs = tuple(
+                (_intern(aliased_site), tuple(map(_intern, aliases)))
+                for aliased_site, aliases in ccTLDs.items()
             )
+            self._aliases = frozenset(
+                alias for _, aliases in self._ccTLDs for alias in aliases
+            )
+            # ccTLDs compare as a dict, regardless of the order of their keys
+            self._hash = hash(
+                (self._sites, self._service_start, frozenset(self._ccTLDs))
+            )
+        else:
+            self._ccTLDs = ()
+            self._aliases = _NO_ALIASES
+            self._hash = hash((self._sites, self._service_start))
+
+    @classmethod
+    def from_set(cls, rws):
+        """Returns the FrozenRwsSet of an RwsSet"""
+        return cls(rws.ccTLDs, rws.primary, rws.associated_sites, rws.service_sites)
+
+    @property
+    def primary(self):
+        return self._sites[0]
+
+    @property
+    def associated_sites(self):
+        return list(self._sites[1 : self._service_start])
+
+    @property
+    def service_sites(self):
+        return list(self._sites[self._service_start :])
+
+    @property
+    def ccTLDs(self):
+        return {aliased_site: list(aliases) for aliased_site, aliases in self._ccTLDs}
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, obj):
+        if isinstance(obj, FrozenRwsSet):
+            return (
+                self._hash == obj._hash
+                and self._service_start == obj._service_start
+                and self._sites == obj._sites
+                and (
+                    self._ccTLDs == obj._ccTLDs
+                    or dict(self._ccTLDs) == dict(obj._ccTLDs)
+                )
+            )
+        if isinstance(obj, RwsSet):
+            return obj == self
         return False
+
+    def __repr__(self):
+        return (
+            f"FrozenRwsSet(ccTLDs={self.ccTLDs!r}, primary={self.primary!r}, "
+            + f"associated_sites={self.associated_sites!r}, "
+            + f"service_sites={self.service_sites!r})"
+        )
+
+    def __reduce__(self):
+        return (
+            FrozenRwsSet,
+            (self.ccTLDs, self.primary, self.associated_sites, self.service_sites),
+        )
+
+    def includes(self, domain, with_ccTLDs=True):
+        return domain in self._members or (with_ccTLDs and domain in self._aliases)
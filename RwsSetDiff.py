@@ -0,0 +1,175 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from RwsSiteIndex import ALIAS, ASSOCIATED, PRIMARY, SERVICE
+
+# The fields of a member that can change while it keeps its role
+RATIONALE = "rationale"
+ALIASES = "aliases"
+
+
+class RwsSetDiff:
+    """The changes made to the members of one set between two lists
+
+    A member that moves to another role is removed from its old role and
+    added to its new one.
+
+    Attributes:
+      primary: the primary of the set
+      added: Dict[string, list[string]] the sites added in each role, in the
+      order they are listed in the new set
+      removed: Dict[string, list[string]] the sites removed from each role,
+      in the order they were listed in the old set
+      changed: Dict[string, list[string]] the fields of each site, such as
+      its rationale or its ccTLD aliases, that changed while it kept its role
+    """
+
+    def __init__(self, primary, added=None, removed=None, changed=None):
+        self.primary = primary
+        self.added = {} if added is None else added
+        self.removed = {} if removed is None else removed
+        self.changed = {} if changed is None else changed
+
+    def __eq__(self, obj):
+        return isinstance(obj, RwsSetDiff) and (
+            self.primary,
+            self.added,
+            self.removed,
+            self.changed,
+        ) == (obj.primary, obj.added, obj.removed, obj.changed)
+
+    def __repr__(self):
+        return (
+            f"RwsSetDiff({self.primary!r}, added={self.added!r}, "
+            + f"removed={self.removed!r}, changed={self.changed!r})"
+        )
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def affected_sites(self):
+        """Returns the sites that the network checks must check again
+
+        These are the sites added to the set in any role, including sites
+        that moved to another role and new ccTLD aliases. A removed site,
+        or a change to a rationale, needs no request.
+
+        Returns:
+            list[string] in the order they were added
+        """
+        affected = []
+        for sites in self.added.values():
+            for site in sites:
+                if site not in affected:
+                    affected.append(site)
+        return affected
+
+
+def _member_roles(rws):
+    # The sites of each role of a set, with its ccTLD aliases as one role
+    if rws is None:
+        return {}
+    return {
+        PRIMARY: [rws.primary],
+        ASSOCIATED: rws.associated_sites,
+        SERVICE: rws.service_sites,
+        ALIAS: [alias for aliases in rws.ccTLDs.values() for alias in aliases],
+    }
+
+
+def diff_set(primary, old_rws, new_rws, old_rationales=None, new_rationales=None):
+    """Finds the members added to, removed from and changed in a set
+
+    Args:
+        primary: the primary of the set
+        old_rws: the RwsSet in the old list, or None if the set is new
+        new_rws: the RwsSet in the new list, or None if it was removed
+        old_rationales: the rationaleBySite of the set in the old list
+        new_rationales: the rationaleBySite of the set in the new list
+    Returns:
+        RwsSetDiff
+    """
+    old_roles = _member_roles(old_rws)
+    new_roles = _member_roles(new_rws)
+    diff = RwsSetDiff(primary)
+    for role in [PRIMARY, ASSOCIATED, SERVICE, ALIAS]:
+        old_sites = set(old_roles.get(role, []))
+        new_sites = set(new_roles.get(role, []))
+        added = [site for site in new_roles.get(role, []) if site not in old_sites]
+        removed = [site for site in old_roles.get(role, []) if site not in new_sites]
+        if added:
+            diff.added[role] = added
+        if removed:
+            diff.removed[role] = removed
+    if old_rws is None or new_rws is None:
+        return diff
+
+    added_sites = {site for sites in diff.added.values() for site in sites}
+    old_ccTLDs = old_rws.ccTLDs
+    old_rationales = old_rationales or {}
+    new_rationales = new_rationales or {}
+    for site in new_roles[ASSOCIATED] + new_roles[SERVICE] + [primary]:
+        if site in added_sites:
+            continue
+        fields = []
+        if old_rationales.get(site) != new_rationales.get(site):
+            fields.append(RATIONALE)
+        if old_ccTLDs.get(site, []) != new_rws.ccTLDs.get(site, []):
+            fields.append(ALIASES)
+        if fields:
+            diff.changed[site] = fields
+    return diff
+
+
+def _rationales(rws_sites):
+    # Maps the primary of each set of a list to its rationaleBySite
+    if rws_sites is None:
+        return {}
+    return {
+        rwset.get("primary"): rwset.get("rationaleBySite")
+        for rwset in rws_sites.get("sets", [])
+    }
+
+
+def find_member_diffs(old_sets, new_sets, old_sites=None, new_sites=None):
+    """Finds the member level changes between two dictionaries of sets
+
+    Args:
+        old_sets: Dict[string, RwsSet]
+        new_sets: Dict[string, RwsSet]
+        old_sites: the old list, as JSON, to compare rationales with
+        new_sites: the new list, as JSON, to compare rationales with
+    Returns:
+        Dict[string, RwsSetDiff] mapping the primary of each set of new_sets
+        that was added or changed to its changes, in the order of new_sets
+    """
+    old_rationales = _rationales(old_sites)
+    new_rationales = _rationales(new_sites)
+    diffs = {}
+    for primary, rws in new_sets.items():
+        old_rws = old_sets.get(primary)
+        if rws == old_rws and old_rationales.get(primary) == new_rationales.get(
+            primary
+        ):
+            continue
+        diff = diff_set(
+            primary,
+            old_rws,
+            rws,
+            old_rationales.get(primary),
+            new_rationales.get(primary),
+        )
+        if diff or rws != old_rws:
+            diffs[primary] = diff
+    return diffs
@@ -0,0 +1,104 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The roles a site can have in a set. An aliased site is a member that has
+# ccTLD aliases; it also has the role it is listed under.
+PRIMARY = "primary"
+ASSOCIATED = "associated"
+SERVICE = "service"
+ALIAS = "alias"
+ALIASED = "aliased"
+# The roles that RwsSet.includes counts as members, without and with ccTLDs
+MEMBER_ROLES = frozenset([PRIMARY, ASSOCIATED, SERVICE])
+MEMBER_ROLES_WITH_CCTLDS = MEMBER_ROLES | {ALIAS}
+
+
+class RwsSiteIndex:
+    """Maps every site of a list of sets to the sets it appears in
+
+    Built once from the sets returned by RwsCheck.load_sets, it answers
+    which sets a site belongs to, and in which role, with a single lookup,
+    instead of a scan over every set.
+    """
+
+    def __init__(self, check_sets):
+        """Indexes the sites of check_sets
+
+        Args:
+            check_sets: Dict[string, RwsSet]
+        """
+        # The first set each site appears in, and any further ones apart, so
+        # that the common case of a site in a single set is a single tuple
+        self._sites = {}
+        self._more_sites = {}
+        for primary, rws in check_sets.items():
+            self._add(primary, primary, PRIMARY)
+            for site in rws.associated_sites:
+                self._add(site, primary, ASSOCIATED)
+            for site in rws.service_sites:
+                self._add(site, primary, SERVICE)
+            for aliased_site, aliases in rws.ccTLDs.items():
+                self._add(aliased_site, primary, ALIASED)
+                for alias in aliases:
+                    self._add(alias, primary, ALIAS)
+
+    def roles(self, site):
+        """Returns the sets a site appears in, and its role in each
+
+        Args:
+            site: string
+        Returns:
+            list[Tuple[string, string]] of the primary of each set and the
+            site's role in it, in the order the sets were indexed
+        """
+        if site not in self._sites:
+            return []
+        return [self._sites[site]] + self._more_sites.get(site, [])
+
+    def primaries(self, site, with_ccTLDs=True):
+        """Returns the primaries of the sets that include a site
+
+        A set includes a site as RwsSet.includes does: as its primary, an
+        associated or service site, or, with_ccTLDs, a ccTLD alias.
+
+        Args:
+            site: string
+            with_ccTLDs: whether ccTLD aliases count as members
+        Returns:
+            list[string] in the order the sets were indexed
+        """
+        member_roles = MEMBER_ROLES_WITH_CCTLDS if with_ccTLDs else MEMBER_ROLES
+        primaries = []
+        for primary, role in self.roles(site):
+            if role in member_roles and primary not in primaries:
+                primaries.append(primary)
+        return primaries
+
+    def includes(self, site, with_ccTLDs=True):
+        """Returns whether any of the indexed sets includes a site, see
+        primaries"""
+        member_roles = MEMBER_ROLES_WITH_CCTLDS if with_ccTLDs else MEMBER_ROLES
+        return any(role in member_roles for _, role in self.roles(site))
+
+    def __contains__(self, site):
+        return site in self._sites
+
+    def __len__(self):
+        return len(self._sites)
+
+    def _add(self, site, primary, role):
+        if site in self._sites:
+            self._more_sites.setdefault(site, []).append((primary, role))
+        else:
+            self._sites[site] = (primary, role)
@@ -0,0 +1,201 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compiles effective_tld_names.dat and ICANN_domains into a binary snapshot
+
+check_sites.py loads the snapshot instead of parsing both files on every
+run, and rebuilds it whenever either file, or the code that compiles them,
+changes. It can also be built ahead of time:
+
+  python3 RwsSnapshot.py
+"""
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
+
+from RwsResultCache import file_digest
+from RwsSuffixIndex import DEFAULT_MEMO_SIZE, RwsSuffixIndex, parse_rules
+
+SNAPSHOT_VERSION = 2
+DEFAULT_SNAPSHOT_PATH = ".rws_snapshot"
+PSL_PATH = "effective_tld_names.dat"
+ICANN_PATH = "ICANN_domains"
+# The sources of the code that compiles and reads snapshots; a snapshot
+# written by other versions of them is rebuilt
+CODE_SOURCES = ["RwsSnapshot.py", "RwsSuffixIndex.py"]
+# The magic number, snapshot version, marshal format, sha256 digest of the
+# CODE_SOURCES and sha256 checksum of the payload that follows
+SNAPSHOT_MAGIC = b"RWSSNAP\0"
+SNAPSHOT_HEADER = struct.Struct("<8sII32s32s")
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot is truncated, corrupt or of another version"""
+
+
+def code_digest():
+    """Returns the sha256 digest of the CODE_SOURCES"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return hashlib.sha256(
+        "".join(
+            file_digest(os.path.join(directory, source)) for source in CODE_SOURCES
+        ).encode()
+    ).digest()
+
+
+def read_icanns(path):
+    """Returns the set of the ICANN domains listed in a file, one per line"""
+    icanns = set()
+    with open(path) as f:
+        for line in f:
+            icanns.add(line.strip())
+    return icanns
+
+
+def compile_sources(psl_path=PSL_PATH, icann_path=ICANN_PATH):
+    """Parses the public suffix list and the ICANN domains
+
+    Args:
+        psl_path: the path of effective_tld_names.dat
+        icann_path: the path of ICANN_domains
+    Returns:
+        Tuple[Tuple, set] the trie of the suffix rules, as returned by
+        parse_rules, and the ICANN domains
+    """
+    with open(psl_path, "rb") as f:
+        root = parse_rules(f)
+    return root, read_icanns(icann_path)
+
+
+def write_snapshot(path, source_digests, root, icanns):
+    """Writes a snapshot of the compiled sources to path, atomically
+
+    Args:
+        path: the path of the snapshot
+        source_digests: the digests of the files the snapshot was compiled
+        from
+        root: the trie of the suffix rules
+        icanns: the set of ICANN domains
+    """
+    payload = marshal.dumps((list(source_digests), root, icanns))
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        marshal.version,
+        code_digest(),
+        hashlib.sha256(payload).digest(),
+    )
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Reads a snapshot written by write_snapshot
+
+    The snapshot is memory-mapped, and its checksum verified before it is
+    unmarshalled.
+
+    Args:
+        path: the path of the snapshot
+    Returns:
+        Tuple[list[string], Tuple, set] the digests of the files the
+        snapshot was compiled from, the trie of the suffix rules and the
+        ICANN domains
+    Raises:
+        OSError if the snapshot cannot be read
+        SnapshotError if it is truncated, corrupt, of another version or
+        written by other versions of the CODE_SOURCES
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            raise SnapshotError(f"{path} is truncated")
+        snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with snapshot:
+        magic, version, marshal_version, code, checksum = SNAPSHOT_HEADER.unpack_from(
+            snapshot
+        )
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path} is not a snapshot")
+        if (version, marshal_version) != (SNAPSHOT_VERSION, marshal.version):
+            raise SnapshotError(
+                f"{path} is a version {version} snapshot, "
+                + f"expected version {SNAPSHOT_VERSION}"
+            )
+        if code != code_digest():
+            raise SnapshotError(f"{path} was written by another version of the code")
+        with memoryview(snapshot)[SNAPSHOT_HEADER.size :] as payload:
+            if hashlib.sha256(payload).digest() != checksum:
+                raise SnapshotError(f"{path} does not match its checksum")
+            try:
+                source_digests, root, icanns = marshal.loads(payload)
+            except (EOFError, ValueError, TypeError) as inst:
+                raise SnapshotError(f"{path} could not be read: {inst}")
+    return source_digests, root, icanns
+
+
+def load_snapshot(
+    path=DEFAULT_SNAPSHOT_PATH,
+    psl_path=PSL_PATH,
+    icann_path=ICANN_PATH,
+    memo_size=DEFAULT_MEMO_SIZE,
+):
+    """Returns the suffix index and ICANN domains, from the snapshot if it
+    is up to date
+
+    A snapshot that is missing, unreadable, or compiled from other versions
+    of the source files or by another version of the code is rebuilt. If the
+    rebuilt snapshot cannot be written, the sources are still used.
+
+    Args:
+        path: the path of the snapshot
+        psl_path: the path of effective_tld_names.dat
+        icann_path: the path of ICANN_domains
+        memo_size: the memo_size of the RwsSuffixIndex
+    Returns:
+        Tuple[RwsSuffixIndex, set] the etlds and icanns that RwsCheck takes
+    """
+    source_digests = [file_digest(psl_path), file_digest(icann_path)]
+    try:
+        snapshot_digests, root, icanns = read_snapshot(path)
+    except (OSError, SnapshotError):
+        snapshot_digests = None
+    if snapshot_digests != source_digests:
+        root, icanns = compile_sources(psl_path, icann_path)
+        try:
+            write_snapshot(path, source_digests, root, icanns)
+        except OSError as inst:
+            print(f"Could not write the snapshot {path}: {inst}", file=sys.stderr)
+    return RwsSuffixIndex.from_trie(root, memo_size), icanns
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SNAPSHOT_PATH
+    start = time.perf_counter()
+    root, icanns = compile_sources()
+    write_snapshot(path, [file_digest(PSL_PATH), file_digest(ICANN_PATH)], root, icanns)
+    print(
+        f"Wrote {path} ({os.path.getsize(path)} bytes) in "
+        + f"{time.perf_counter() - start:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
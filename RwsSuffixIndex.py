@@ -0,0 +1,166 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import functools
+
+DEFAULT_MEMO_SIZE = 1 << 16
+# The kinds of rule that can end at a node of the trie
+EXACT_RULE = 1
+WILDCARD_RULE = 2
+EXCEPTION_RULE = 4
+
+
+def parse_rules(source):
+    """Reads the rules of a public suffix list into a reversed-label trie
+
+    Each node of the trie is a tuple of the kinds of rule that end at it and
+    a dict of its children, keyed by the next label to the left. As
+    publicsuffixlist does, rules are lowercased, and the punycode form of
+    every internationalized rule is added next to it.
+
+    Args:
+        source: an iterable of the lines of effective_tld_names.dat, as bytes
+        or strings
+    Returns:
+        Tuple[int, Dict] the root of the trie
+    """
+    root = (0, {})
+
+    def add(rule):
+        kind = EXACT_RULE
+        if rule.startswith("!"):
+            kind, rule = EXCEPTION_RULE, rule[1:]
+        elif rule.startswith("*."):
+            kind, rule = WILDCARD_RULE, rule[2:]
+        parent, node = None, root
+        for label in reversed(rule.split(".")):
+            parent = node
+            node = parent[1].setdefault(label, (0, {}))
+        parent[1][label] = (node[0] | kind, node[1])
+
+    for line in source:
+        if isinstance(line, (bytes, bytearray)):
+            line = line.decode("utf8", "surrogateescape")
+        rule = line.lower().split(" ")[0].rstrip()
+        if rule == "" or rule.startswith("//"):
+            continue
+        add(rule)
+        prefix = "!" if rule.startswith("!") else ""
+        add(prefix + rule.lstrip("!").encode("idna").decode("ascii"))
+    return root
+
+
+class RwsSuffixIndex:
+    """Answers registrable domain queries from a compiled public suffix list
+
+    A drop-in replacement for the privatesuffix method of a
+    publicsuffixlist.PublicSuffixList, which RwsCheck calls for every site
+    it checks. The rules are compiled once into a trie walked from the top
+    level domain down, so that a query looks up each of its labels once,
+    and the answers are memoized, since the same sites are checked by
+    several of the checks.
+
+    Attributes:
+      memo_size: the most answers kept by the memo
+    """
+
+    def __init__(self, source, memo_size=DEFAULT_MEMO_SIZE):
+        """Compiles the rules read from source
+
+        Args:
+            source: an iterable of the lines of effective_tld_names.dat, such
+            as the file opened in binary mode
+            memo_size: the most answers kept by the memo
+        """
+        self._set_trie(parse_rules(source), memo_size)
+
+    @classmethod
+    def from_trie(cls, root, memo_size=DEFAULT_MEMO_SIZE):
+        """Returns an RwsSuffixIndex for a trie returned by parse_rules"""
+        index = cls.__new__(cls)
+        index._set_trie(root, memo_size)
+        return index
+
+    def privatesuffix(self, domain, accept_unknown=True):
+        """Returns the registrable domain, or eTLD+1, of a domain
+
+        Matches publicsuffixlist.PublicSuffixList.privatesuffix for string
+        domains: the domain is lowercased and a trailing dot dropped.
+
+        Args:
+            domain: string
+            accept_unknown: whether a top level domain that is not on the
+            list counts as a public suffix
+        Returns:
+            string, or None if domain is not a valid domain name or has no
+            label left of its public suffix
+        """
+        return self._memo(domain, accept_unknown)
+
+    def privatesuffixes(self, domains, accept_unknown=True):
+        """Returns the registrable domain of each of domains
+
+        Args:
+            domains: an iterable of strings
+            accept_unknown: as for privatesuffix
+        Returns:
+            Dict[string, string] mapping each distinct domain to its
+            registrable domain, or to None
+        """
+        return {
+            domain: self._memo(domain, accept_unknown)
+            for domain in dict.fromkeys(domains)
+        }
+
+    def memo_info(self):
+        """Returns the hits, misses and size of the memo"""
+        return self._memo.cache_info()
+
+    def _set_trie(self, root, memo_size):
+        self.memo_size = memo_size
+        self._root = root
+        self._memo = functools.lru_cache(maxsize=memo_size)(self._privatesuffix)
+
+    def _privatesuffix(self, domain, accept_unknown):
+        if domain.endswith("."):
+            domain = domain[:-1]
+        labels = domain.lower().split(".")
+        if "" in labels:
+            return None
+        # The deepest node with a rule decides, and of the rules ending at
+        # the same node an exception beats a wildcard, which beats an exact
+        # rule, as in publicsuffixlist
+        public_length = 0
+        depth = 0
+        children = self._root[1]
+        for label in reversed(labels):
+            node = children.get(label)
+            if node is None:
+                break
+            depth += 1
+            kinds, children = node
+            if not kinds:
+                continue
+            if kinds & EXCEPTION_RULE:
+                public_length = depth - 1
+            elif kinds & WILDCARD_RULE:
+                public_length = depth + 1 if depth < len(labels) else depth
+            else:
+                public_length = depth
+        if not public_length:
+            if not accept_unknown:
+                return None
+            public_length = 1
+        if len(labels) <= public_length:
+            return None
+        return ".".join(labels[-(public_length + 1) :])
@@ -0,0 +1,70 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import contextlib
+import functools
+import threading
+import time
+
+
+class RwsTimer:
+    """Records how long each phase of a run takes
+
+    A phase that is entered more than once accumulates its time. Phases may
+    nest, such as a resource loaded on demand by the first check that needs
+    it, in which case the outer phase's time includes the inner one's.
+
+    Attributes:
+      clock: the function returning the current time, in seconds
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times the body of a with statement as the phase name"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock() - start)
+
+    def timed(self, name, function):
+        """Returns a function that calls function, timed as the phase name"""
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return timed_function
+
+    def add(self, name, seconds):
+        """Adds seconds to the time of the phase name"""
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def phases(self):
+        """Returns Dict[string, float] of the seconds taken by each phase, in
+        the order the phases were first timed"""
+        with self._lock:
+            return dict(self._phases)
+
+    def report(self):
+        """Returns a one line summary of the phases, in milliseconds"""
+        return "Phases: " + ", ".join(
+            f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases().items()
+        )
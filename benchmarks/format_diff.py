@@ -0,0 +1,115 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares find_format_diff with a diff of the whole file
+
+Formats a synthetic list in ways that --strict_formatting rejects, and
+times find_format_diff against difflib.unified_diff over every line of the
+file, as find_format_diff used to run, and prints a JSON report of the time
+taken and the length of the error of each:
+
+  python3 benchmarks/format_diff.py --sets 40000
+"""
+
+import difflib
+import getopt
+import json
+import sys
+import time
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from check_sites import find_format_diff
+
+
+def whole_file_diff(rws_json_string, rws_sites):
+    """find_format_diff as it was before it matched set by set"""
+    formatted_file = json.dumps(rws_sites, indent=2, ensure_ascii=False) + "\n"
+    if rws_json_string == formatted_file:
+        return ""
+    diff = difflib.unified_diff(
+        rws_json_string.splitlines(keepends=True),
+        formatted_file.splitlines(keepends=True),
+        fromfile="PR file",
+        tofile="expected",
+    )
+    joined_diff = "".join(diff)
+    return f"Formatting for JSON is incorrect;\nerror was:\n```diff\n{joined_diff}\n```"
+
+
+def misformat(rws_sites):
+    """Returns the ways of misformatting the list that are benchmarked
+
+    Args:
+        rws_sites: the list, as JSON
+    Returns:
+        Dict[string, string] of each misformatted file by name
+    """
+    formatted_file = json.dumps(rws_sites, indent=2) + "\n"
+    lines = formatted_file.splitlines(keepends=True)
+    return {
+        # A trailing space on one line of the last set
+        "one_line": "".join(lines[:-4] + [lines[-4].rstrip("\n") + " \n"] + lines[-3:]),
+        "reindented": json.dumps(rws_sites, indent=4) + "\n",
+        "minified": json.dumps(rws_sites, separators=(",", ":")),
+    }
+
+
+def run_benchmark(num_sets, seed, whole_file):
+    """Times find_format_diff, and optionally the whole file diff, on each
+    misformatted file
+
+    Args:
+        num_sets: the number of sets of the list
+        seed: the seed of the synthetic list
+        whole_file: whether to also time the whole file diff, which can take
+        minutes on large lists
+    Returns:
+        Dict[string, object] of the timings and lengths of the errors
+    """
+    rws_sites = generate_sets(num_sets, seed)
+    report = {"sets": num_sets}
+    diffs = [("find_format_diff", find_format_diff)]
+    if whole_file:
+        diffs.append(("whole_file_diff", whole_file_diff))
+    for name, rws_json_string in misformat(rws_sites).items():
+        report[name] = {"bytes": len(rws_json_string)}
+        for diff_name, diff in diffs:
+            start = time.perf_counter()
+            error = diff(rws_json_string, rws_sites)
+            report[name][diff_name] = {
+                "seconds": round(time.perf_counter() - start, 3),
+                "error_bytes": len(error),
+            }
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    num_sets = 10000
+    seed = 0
+    whole_file = True
+    opts, _ = getopt.getopt(args, "", ["sets=", "seed=", "no_whole_file"])
+    for opt, arg in opts:
+        if opt == "--sets":
+            num_sets = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+        if opt == "--no_whole_file":
+            whole_file = False
+
+    print(json.dumps(run_benchmark(num_sets, seed, whole_file), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Load tests the network checks of RwsCheck against a WellKnownServer
+
+Starts a WellKnownServer for a synthetic list, runs every network check
+against it through host overrides, and prints a JSON report of the
+throughput and latency percentiles of each check:
+
+  python3 benchmarks/network_load.py --sets 20000 --latency 0.05 \\
+      --reset_rate 0.01
+"""
+
+import getopt
+import json
+import math
+import sys
+import threading
+import time
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from benchmarks.well_known_server import FaultProfile, WellKnownServer
+from RwsCheck import RwsCheck
+from RwsFetcher import DEFAULT_MAX_CONCURRENCY, RwsFetcher
+from RwsRetry import RwsRetryPolicy
+
+NETWORK_CHECKS = [
+    "find_invalid_well_known",
+    "find_robots_tag",
+    "find_ads_txt",
+    "check_for_service_redirect",
+]
+
+
+class LatencyRecorder:
+    """Keeps the latency and outcome of every request made by an RwsFetcher
+
+    Takes the place of a CassetteRecorder, without keeping any responses.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, url, kwargs, latency, response=None, error=None, method="GET"):
+        with self._lock:
+            self.latencies.append(latency)
+            if error is not None:
+                self.errors += 1
+
+    def take(self):
+        """Returns and forgets the latencies and errors recorded so far"""
+        with self._lock:
+            latencies, errors = self.latencies, self.errors
+            self.latencies, self.errors = [], 0
+        return latencies, errors
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of a sorted list of values"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def run_load_test(rws_sites, server, max_concurrency, max_attempts):
+    """Runs every network check on rws_sites against server
+
+    Args:
+        rws_sites: Dict in the format of related_website_sets.JSON
+        server: a running WellKnownServer serving rws_sites
+        max_concurrency: the max_concurrency of the fetcher
+        max_attempts: the max_attempts of the fetcher's retry policy
+    Returns:
+        Dict[string, Dict] of the statistics of each check
+    """
+    recorder = LatencyRecorder()
+    fetcher = RwsFetcher(
+        max_concurrency,
+        retry_policy=RwsRetryPolicy(max_attempts),
+        recorder=recorder,
+        host_overrides={"*": server.origin},
+    )
+    rws_checker = RwsCheck(rws_sites, None, set(), fetcher=fetcher)
+    check_sets = rws_checker.load_sets()
+    report = {}
+    for check in NETWORK_CHECKS:
+        start = time.monotonic()
+        getattr(rws_checker, check)(check_sets)
+        elapsed = time.monotonic() - start
+        latencies, errors = recorder.take()
+        latencies.sort()
+        report[check] = {
+            "seconds": round(elapsed, 3),
+            "requests": len(latencies),
+            "errors": errors,
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": percentile(latencies, 1.0),
+        }
+    report["findings"] = len(rws_checker.error_list)
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    num_sets = 1000
+    seed = 0
+    max_concurrency = DEFAULT_MAX_CONCURRENCY
+    max_attempts = 1
+    faults = FaultProfile()
+    opts, _ = getopt.getopt(
+        args,
+        "",
+        [
+            "sets=",
+            "seed=",
+            "max_concurrency=",
+            "max_attempts=",
+            "latency=",
+            "jitter=",
+            "timeout_rate=",
+            "reset_rate=",
+            "slow_drip_rate=",
+            "drip_interval=",
+            "hang=",
+        ],
+    )
+    for opt, arg in opts:
+        if opt == "--sets":
+            num_sets = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+        if opt == "--max_concurrency":
+            max_concurrency = int(arg)
+        if opt == "--max_attempts":
+            max_attempts = int(arg)
+        if opt == "--latency":
+            faults.latency = float(arg)
+        if opt == "--jitter":
+            faults.jitter = float(arg)
+        if opt == "--timeout_rate":
+            faults.timeout_rate = float(arg)
+        if opt == "--reset_rate":
+            faults.reset_rate = float(arg)
+        if opt == "--slow_drip_rate":
+            faults.slow_drip_rate = float(arg)
+        if opt == "--drip_interval":
+            faults.drip_interval = float(arg)
+        if opt == "--hang":
+            faults.hang = float(arg)
+
+    rws_sites = generate_sets(num_sets, seed)
+    server = WellKnownServer(rws_sites, faults, seed=seed)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        report = run_load_test(rws_sites, server, max_concurrency, max_attempts)
+    finally:
+        server.shutdown()
+        server.server_close()
+    report["sets"] = num_sets
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks the offline steps of check_sites on synthetic lists
+
+Generates a synthetic list of each size, see generate_sets, and times each
+step of a run that needs no network on it: validating the schema, loading
+the sets, the offline checks, finding the sets a PR changes, and the
+strict formatting check. Each run of a step gets a suffix index and ICANN
+domains loaded afresh, so that its lookups are not answered by the memo of
+an earlier run. Each step runs once more under tracemalloc, for the peak
+memory it allocates. The report is written as JSON, and can be
+compared with the report of another commit:
+
+  python3 benchmarks/offline_checks.py --sets 1000,10000,100000 \\
+    --output /tmp/after.json --baseline /tmp/before.json
+
+The checks are loaded as check_sites loads them at the commit benchmarked,
+so that the benchmark can also be run on commits from before the snapshot
+or the compiled schema validator.
+"""
+
+import copy
+import gc
+import getopt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from check_sites import find_diff_sets, find_format_diff
+from RwsCheck import RwsCheck
+
+try:
+    from RwsSchema import load_validator
+except ImportError:
+    # Before the compiled validator, the schema is compiled on each validation
+    load_validator = None
+try:
+    from RwsSnapshot import load_snapshot
+except ImportError:
+    # Before the snapshot, the sources are parsed on each run
+    load_snapshot = None
+try:
+    from RwsSuffixIndex import RwsSuffixIndex as SuffixList
+except ImportError:
+    from publicsuffixlist import PublicSuffixList as SuffixList
+
+SCHEMA_PATH = "SCHEMA.json"
+PSL_PATH = "effective_tld_names.dat"
+ICANN_PATH = "ICANN_domains"
+# The RwsCheck functions benchmarked, each called on every set of the list
+OFFLINE_CHECKS = [
+    "check_exclusivity",
+    "has_all_rationales",
+    "find_non_https_urls",
+    "find_invalid_eTLD_Plus1",
+    "find_invalid_alias_eSLDs",
+]
+
+
+def load_resources():
+    """Returns the etlds and icanns of the checks, freshly loaded as
+    check_sites loads them"""
+    if load_snapshot is not None:
+        return load_snapshot()
+    with open(PSL_PATH, "rb") as f:
+        etlds = SuffixList(f)
+    with open(ICANN_PATH) as f:
+        icanns = {line.strip() for line in f}
+    return etlds, icanns
+
+
+def change_sets(rws_sites, num_changed):
+    """Returns a copy of a list as a PR might change it
+
+    A member is added to each of num_changed sets, spread over the list, the
+    last set is removed and a new set is added.
+
+    Args:
+        rws_sites: Dict in the format of related_website_sets.JSON
+        num_changed: the number of sets to add a member to
+    Returns:
+        Dict in the format of related_website_sets.JSON
+    """
+    changed_sites = copy.deepcopy(rws_sites)
+    sets = changed_sites["sets"]
+    step = max(1, len(sets) // max(1, num_changed))
+    for rws in sets[::step][:num_changed]:
+        site = rws["primary"] + "-added.com"
+        rws.setdefault("associatedSites", []).append(site)
+        rws["rationaleBySite"][site] = "Synthetic member " + site
+    sets.pop()
+    sets.append(
+        {
+            "contact": "owner@new-rws.com",
+            "primary": "https://new-rws.com",
+            "associatedSites": ["https://new-rws-associated0.com"],
+            "rationaleBySite": {
+                "https://new-rws-associated0.com": "Synthetic new member"
+            },
+        }
+    )
+    return changed_sites
+
+
+def describe(rws_sites, rws_json_string):
+    """Returns the size and mix of members of a list"""
+    sets = rws_sites["sets"]
+    return {
+        "sets": len(sets),
+        "bytes": len(rws_json_string.encode()),
+        "associated_sites": sum(len(rws.get("associatedSites", [])) for rws in sets),
+        "service_sites": sum(len(rws.get("serviceSites", [])) for rws in sets),
+        "ccTLD_aliases": sum(
+            len(aliases) for rws in sets for aliases in rws.get("ccTLDs", {}).values()
+        ),
+        "sets_with_aliases": sum(1 for rws in sets if rws.get("ccTLDs")),
+    }
+
+
+def offline_steps(rws_sites, rws_json_string, etlds, icanns, num_changed):
+    """Returns the steps that are benchmarked on a list
+
+    Args:
+        rws_sites: Dict in the format of related_website_sets.JSON
+        rws_json_string: the list as its file
+        etlds: the suffix index the sets are loaded with
+        icanns: the ICANN domains the sets are loaded with
+        num_changed: the number of sets find_diff_sets finds changed
+    Returns:
+        Dict[string, function] of each step, called with the etlds and
+        icanns of the run, by name, in the order check_sites runs them
+    """
+    check_sets = RwsCheck(rws_sites, etlds, icanns).load_sets()
+    new_sets = RwsCheck(change_sets(rws_sites, num_changed), etlds, icanns).load_sets()
+
+    def run_check(check, *args):
+        # A checker of its own, so that each run starts with no errors
+        def run(etlds, icanns):
+            getattr(RwsCheck(rws_sites, etlds, icanns), check)(*args)
+
+        return run
+
+    steps = {
+        "validate_schema": run_check("validate_schema", SCHEMA_PATH),
+        "load_sets": run_check("load_sets"),
+    }
+    for check in OFFLINE_CHECKS:
+        steps[check] = run_check(check, check_sets)
+    steps["find_diff_sets"] = lambda *_: find_diff_sets(check_sets, new_sets)
+    steps["find_format_diff"] = lambda *_: find_format_diff(rws_json_string, rws_sites)
+    return steps
+
+
+def measure(step, repeat):
+    """Returns the fewest seconds a step took in repeat runs, and the peak
+    bytes it allocated in one more run, traced by tracemalloc
+
+    The etlds and icanns of each run are loaded before it is timed."""
+    best = None
+    for _ in range(repeat):
+        etlds, icanns = load_resources()
+        gc.collect()
+        start = time.perf_counter()
+        step(etlds, icanns)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    etlds, icanns = load_resources()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        step(etlds, icanns)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 4), "peak_bytes": peak}
+
+
+def run_benchmark(num_sets, seed, repeat, num_changed, write_dir=None):
+    """Generates a list of num_sets sets and measures every step on it
+
+    Args:
+        num_sets: the number of sets of the list
+        seed: the seed of the synthetic list
+        repeat: the number of timed runs of each step
+        num_changed: the number of sets find_diff_sets finds changed
+        write_dir: an optional directory to write the list to, as
+        related_website_sets_{num_sets}.JSON, to run check_sites on
+    Returns:
+        Dict[string, object] of the list's size and mix, and the seconds and
+        peak bytes of each step
+    """
+    rws_sites = generate_sets(num_sets, seed)
+    rws_json_string = json.dumps(rws_sites, indent=2, ensure_ascii=False) + "\n"
+    if write_dir is not None:
+        path = os.path.join(write_dir, f"related_website_sets_{num_sets}.JSON")
+        with open(path, "w") as f:
+            f.write(rws_json_string)
+    etlds, icanns = load_resources()
+    report = describe(rws_sites, rws_json_string)
+    report["steps"] = {
+        name: measure(step, repeat)
+        for name, step in offline_steps(
+            rws_sites, rws_json_string, etlds, icanns, num_changed
+        ).items()
+    }
+    return report
+
+
+def current_commit():
+    """Returns the commit being benchmarked, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Returns a line comparing each step of report with baseline
+
+    Args:
+        report: a report written by this benchmark
+        baseline: the report of another commit
+    Returns:
+        list[string] of the seconds and peak bytes of each step measured in
+        both, and their ratios, for each size of list in both
+    """
+    baseline_lists = {entry["sets"]: entry for entry in baseline["lists"]}
+    lines = []
+    for entry in report["lists"]:
+        baseline_entry = baseline_lists.get(entry["sets"])
+        if baseline_entry is None:
+            continue
+        for name, step in entry["steps"].items():
+            baseline_step = baseline_entry["steps"].get(name)
+            if baseline_step is None:
+                continue
+            seconds_ratio = step["seconds"] / max(baseline_step["seconds"], 1e-4)
+            bytes_ratio = step["peak_bytes"] / max(baseline_step["peak_bytes"], 1)
+            lines.append(
+                f"{entry['sets']} sets, {name}: "
+                + f"{baseline_step['seconds']} s -> {step['seconds']} s "
+                + f"({seconds_ratio:.2f}x), "
+                + f"{baseline_step['peak_bytes']} -> {step['peak_bytes']} bytes "
+                + f"({bytes_ratio:.2f}x)"
+            )
+    return lines
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [1000, 10000, 100000]
+    seed = 0
+    repeat = 1
+    num_changed = 10
+    output = None
+    baseline_path = None
+    write_dir = None
+    opts, _ = getopt.getopt(
+        args,
+        "",
+        ["sets=", "seed=", "repeat=", "changed=", "output=", "baseline=", "write_dir="],
+    )
+    for opt, arg in opts:
+        if opt == "--sets":
+            sizes = [int(size) for size in arg.split(",")]
+        if opt == "--seed":
+            seed = int(arg)
+        if opt == "--repeat":
+            repeat = int(arg)
+        if opt == "--changed":
+            num_changed = int(arg)
+        if opt == "--output":
+            output = arg
+        if opt == "--baseline":
+            baseline_path = arg
+        if opt == "--write_dir":
+            write_dir = arg
+
+    # Loaded, and the schema compiled, once, as they are once per run
+    start = time.perf_counter()
+    load_resources()
+    if load_validator is not None:
+        load_validator(SCHEMA_PATH)
+    report = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "seed": seed,
+        "repeat": repeat,
+        "setup_seconds": round(time.perf_counter() - start, 4),
+        "lists": [
+            run_benchmark(size, seed, repeat, num_changed, write_dir) for size in sizes
+        ],
+    }
+    report_json = json.dumps(report, indent=2)
+    if output is None:
+        print(report_json)
+    else:
+        with open(output, "w") as f:
+            f.write(report_json + "\n")
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
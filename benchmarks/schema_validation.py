@@ -0,0 +1,108 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares RwsSchemaValidator with jsonschema.validate
+
+Times validating synthetic lists of each size as validate_schema used to,
+by reading SCHEMA.json and calling jsonschema.validate, and with an
+RwsSchemaValidator: the first call, which compiles the schema, a later
+call, and a call under --with_diff that skips the sets of the old list,
+and prints a JSON report:
+
+  python3 benchmarks/schema_validation.py --sets 1000,10000
+"""
+
+import getopt
+import json
+import sys
+import time
+
+from jsonschema import validate
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from RwsSchema import RwsSchemaValidator, load_validator
+
+SCHEMA_PATH = "SCHEMA.json"
+
+
+def timed(function):
+    """Returns the seconds function took to run"""
+    start = time.perf_counter()
+    function()
+    return round(time.perf_counter() - start, 4)
+
+
+def run_benchmark(num_sets, num_changed, seed):
+    """Times each way of validating a synthetic list
+
+    Args:
+        num_sets: the number of sets of the list
+        num_changed: the number of sets that differ from the old list under
+        --with_diff
+        seed: the seed of the synthetic list
+    Returns:
+        Dict[string, object] of the timings
+    """
+    rws_sites = generate_sets(num_sets, seed)
+    old_sites = json.loads(json.dumps(rws_sites))
+    for rws in old_sites["sets"][:num_changed]:
+        rws["contact"] = "old-" + rws["contact"]
+
+    def validate_whole_list():
+        with open(SCHEMA_PATH) as f:
+            schema = json.loads(f.read())
+        validate(rws_sites, schema=schema)
+
+    def validate_with_new_validator():
+        with open(SCHEMA_PATH) as f:
+            schema = json.loads(f.read())
+        RwsSchemaValidator(schema).validate(rws_sites)
+
+    report = {"sets": num_sets, "changed": num_changed}
+    report["jsonschema_validate"] = timed(validate_whole_list)
+    report["first_validation"] = timed(validate_with_new_validator)
+    load_validator(SCHEMA_PATH)
+    report["later_validation"] = timed(
+        lambda: load_validator(SCHEMA_PATH).validate(rws_sites)
+    )
+    report["with_diff_validation"] = timed(
+        lambda: load_validator(SCHEMA_PATH).validate(rws_sites, old_sites["sets"])
+    )
+    report["speedup"] = round(
+        report["jsonschema_validate"] / report["later_validation"], 1
+    )
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [1000, 10000]
+    num_changed = 10
+    seed = 0
+    opts, _ = getopt.getopt(args, "", ["sets=", "changed=", "seed="])
+    for opt, arg in opts:
+        if opt == "--sets":
+            sizes = [int(size) for size in arg.split(",")]
+        if opt == "--changed":
+            num_changed = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+
+    print(
+        json.dumps([run_benchmark(size, num_changed, seed) for size in sizes], indent=2)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares find_diff_sets with a scan of every set for removed primaries
+
+Removes sets from a synthetic list, some of whose primaries stay on the
+list as members of other sets, and times finding the removed sets with an
+RwsSiteIndex against scanning every set with RwsSet.includes, as
+find_diff_sets used to. Prints a JSON report:
+
+  python3 benchmarks/site_index.py --sets 100000 --removed 200
+"""
+
+import getopt
+import json
+import sys
+import time
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from check_sites import find_diff_sets
+from RwsCheck import RwsCheck
+from RwsSiteIndex import RwsSiteIndex
+
+
+def scan_diff_sets(old_sets, new_sets):
+    """find_diff_sets as it was before RwsSiteIndex, for comparison"""
+    diff_sets = {
+        primary: rws
+        for primary, rws in new_sets.items()
+        if rws != old_sets.get(primary)
+    }
+    subtracted_sets = {
+        primary: old_sets[primary]
+        for primary in set(old_sets) - set(new_sets)
+        if not any(rws.includes(primary) for rws in new_sets.values())
+    }
+    return diff_sets, subtracted_sets
+
+
+def run_benchmark(num_sets, num_removed, seed):
+    """Times both ways of diffing a list against a copy with sets removed
+
+    Every other removed set's primary is moved into the next set as an
+    associated site, so that half of the removed primaries are found.
+
+    Args:
+        num_sets: the number of sets of the list
+        num_removed: the number of sets removed from the copy
+        seed: the seed of the synthetic list
+    Returns:
+        Dict[string, object] of the timings
+    """
+    old_sites = generate_sets(num_sets, seed)
+    new_sites = json.loads(json.dumps(old_sites))
+    step = max(1, num_sets // max(1, num_removed))
+    removed = set(range(0, num_sets, step)[:num_removed])
+    for i in sorted(removed)[::2]:
+        moved_to = new_sites["sets"][(i + 1) % num_sets]
+        moved_to.setdefault("associatedSites", []).append(f"https://rws{i}.com")
+    new_sites["sets"] = [
+        rws for i, rws in enumerate(new_sites["sets"]) if i not in removed
+    ]
+    old_sets = RwsCheck(old_sites, None, set()).load_sets()
+    new_sets = RwsCheck(new_sites, None, set()).load_sets()
+
+    start = time.perf_counter()
+    index = RwsSiteIndex(new_sets)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = find_diff_sets(old_sets, new_sets)
+    indexed_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scanned = scan_diff_sets(old_sets, new_sets)
+    scanned_seconds = time.perf_counter() - start
+    return {
+        "sets": num_sets,
+        "removed": len(removed),
+        "subtracted": len(indexed[1]),
+        "indexed_sites": len(index),
+        "index_build_seconds": round(build_seconds, 4),
+        "find_diff_sets_seconds": round(indexed_seconds, 4),
+        "scan_seconds": round(scanned_seconds, 4),
+        "speedup": round(scanned_seconds / indexed_seconds, 1),
+        "results_match": indexed == scanned,
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    num_sets = 10000
+    num_removed = 100
+    seed = 0
+    opts, _ = getopt.getopt(args, "", ["sets=", "removed=", "seed="])
+    for opt, arg in opts:
+        if opt == "--sets":
+            num_sets = int(arg)
+        if opt == "--removed":
+            num_removed = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+
+    print(json.dumps(run_benchmark(num_sets, num_removed, seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
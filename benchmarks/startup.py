@@ -0,0 +1,105 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures the startup cost of loading the suffix list and ICANN domains
+
+Compares parsing effective_tld_names.dat and ICANN_domains as text with
+loading them from an up to date snapshot, and with rebuilding a stale one,
+and prints a JSON report of the fastest of several runs of each:
+
+  python3 benchmarks/startup.py --runs 20
+"""
+
+import getopt
+import json
+import os
+import sys
+import tempfile
+import time
+
+from publicsuffixlist import PublicSuffixList
+
+sys.path.append(".")
+from RwsSnapshot import ICANN_PATH, PSL_PATH, load_snapshot, read_icanns
+from RwsSuffixIndex import RwsSuffixIndex
+
+
+def best_time(function, runs, setup=None):
+    """Returns the fewest seconds function took in runs calls
+
+    Args:
+        function: the function to time, called without arguments
+        runs: the number of calls
+        setup: a function called before each call, and not timed
+    Returns:
+        float
+    """
+    best = None
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(runs):
+    """Times each way of loading the suffix list and ICANN domains
+
+    Args:
+        runs: the number of runs of each
+    Returns:
+        Dict[string, float] the fastest run of each, in seconds
+    """
+
+    def parse(build):
+        with open(PSL_PATH, "rb") as f:
+            build(f)
+        read_icanns(ICANN_PATH)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "snapshot")
+
+        def remove_snapshot():
+            if os.path.exists(path):
+                os.remove(path)
+
+        report = {
+            "parse_publicsuffixlist": best_time(lambda: parse(PublicSuffixList), runs),
+            "parse_suffix_index": best_time(lambda: parse(RwsSuffixIndex), runs),
+            "rebuild_snapshot": best_time(
+                lambda: load_snapshot(path), runs, remove_snapshot
+            ),
+            "load_snapshot": best_time(lambda: load_snapshot(path), runs),
+        }
+        report["snapshot_bytes"] = os.path.getsize(path)
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    runs = 10
+    opts, _ = getopt.getopt(args, "", ["runs="])
+    for opt, arg in opts:
+        if opt == "--runs":
+            runs = int(arg)
+
+    report = run_benchmark(runs)
+    report["speedup"] = round(report["parse_suffix_index"] / report["load_snapshot"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
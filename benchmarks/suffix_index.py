@@ -0,0 +1,112 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares RwsSuffixIndex with publicsuffixlist on a synthetic list
+
+Times building each from effective_tld_names.dat, answering is_eTLD_Plus1
+for every site of a synthetic list, and running find_invalid_eTLD_Plus1 on
+it, then prints a JSON report. The second pass over the sites shows the
+effect of the memo:
+
+  python3 benchmarks/suffix_index.py --sets 100000
+"""
+
+import getopt
+import json
+import sys
+import time
+
+from publicsuffixlist import PublicSuffixList
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from RwsCheck import RwsCheck
+from RwsSuffixIndex import RwsSuffixIndex
+
+
+def list_sites(rws_sites):
+    """Returns every site of a list as the bare domains is_eTLD_Plus1 sees"""
+    sites = []
+    for rws in rws_sites["sets"]:
+        sites.append(rws["primary"])
+        sites.extend(rws.get("associatedSites", []))
+        sites.extend(rws.get("serviceSites", []))
+        for aliased_site, aliases in rws.get("ccTLDs", {}).items():
+            sites.append(aliased_site)
+            sites.extend(aliases)
+    return [site.removeprefix("https://") for site in sites]
+
+
+def time_call(function, *args):
+    """Returns the result of calling function and the seconds it took"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(rws_sites):
+    """Times both suffix lists on rws_sites
+
+    Args:
+        rws_sites: Dict in the format of related_website_sets.JSON
+    Returns:
+        Dict[string, Dict] of the timings of each suffix list
+    """
+    sites = list_sites(rws_sites)
+    report = {"sites": len(sites)}
+    answers = {}
+    for name, build in [
+        ("publicsuffixlist", PublicSuffixList),
+        # A memo that holds every site, as it does for the real list
+        ("RwsSuffixIndex", lambda f: RwsSuffixIndex(f, memo_size=len(sites))),
+    ]:
+        with open("effective_tld_names.dat", "rb") as f:
+            etlds, build_seconds = time_call(build, f)
+
+        def query_all():
+            return [etlds.privatesuffix(site, accept_unknown=False) for site in sites]
+
+        answers[name], first_seconds = time_call(query_all)
+        _, second_seconds = time_call(query_all)
+        rws_checker = RwsCheck(rws_sites, etlds, set())
+        check_sets = rws_checker.load_sets()
+        _, check_seconds = time_call(rws_checker.find_invalid_eTLD_Plus1, check_sets)
+        report[name] = {
+            "build_seconds": round(build_seconds, 4),
+            "first_pass_seconds": round(first_seconds, 4),
+            "second_pass_seconds": round(second_seconds, 4),
+            "find_invalid_eTLD_Plus1_seconds": round(check_seconds, 4),
+            "findings": len(rws_checker.error_list),
+        }
+    report["answers_match"] = answers["publicsuffixlist"] == answers["RwsSuffixIndex"]
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    num_sets = 10000
+    seed = 0
+    opts, _ = getopt.getopt(args, "", ["sets=", "seed="])
+    for opt, arg in opts:
+        if opt == "--sets":
+            num_sets = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+
+    report = run_benchmark(generate_sets(num_sets, seed))
+    report["sets"] = num_sets
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
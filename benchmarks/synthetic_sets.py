@@ -0,0 +1,65 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import random
+
+# ccTLDs that sets use for their aliases, all of which are in ICANN_domains
+ALIAS_TLDS = ["de", "fr", "co.uk", "com.br", "jp", "es", "it", "com.mx"]
+
+
+def generate_sets(count, seed=0):
+    """Generates a valid Related Website Sets list of the given size
+
+    The sets mimic the shape of the real list: most have a few associated
+    sites, some have service sites, and a few alias their members under
+    other ccTLDs. Every site is unique across the list, and the output of a
+    given count and seed is always the same.
+
+    Args:
+        count: the number of sets to generate
+        seed: the seed of the random mix of sites
+    Returns:
+        Dict in the format of related_website_sets.JSON
+    """
+    rand = random.Random(seed)
+    sets = []
+    for i in range(count):
+        primary = f"https://rws{i}.com"
+        associated_sites = [
+            f"https://rws{i}-associated{j}.com"
+            for j in range(rand.choice([0, 1, 1, 2, 3]))
+        ]
+        service_sites = [
+            f"https://rws{i}-service{j}.com" for j in range(rand.choice([0, 0, 1, 2]))
+        ]
+        if not associated_sites and not service_sites:
+            associated_sites.append(f"https://rws{i}-associated0.com")
+        rws = {"contact": f"owner@rws{i}.com", "primary": primary}
+        if associated_sites:
+            rws["associatedSites"] = associated_sites
+        if service_sites:
+            rws["serviceSites"] = service_sites
+        rws["rationaleBySite"] = {
+            site: f"Synthetic member {site}"
+            for site in associated_sites + service_sites
+        }
+        if rand.random() < 0.1:
+            aliased_site = rand.choice([primary] + associated_sites)
+            rws["ccTLDs"] = {
+                aliased_site: [
+                    aliased_site[: -len(".com")] + "." + tld
+                    for tld in rand.sample(ALIAS_TLDS, rand.randint(1, 3))
+                ]
+            }
+        sets.append(rws)
+    return {"sets": sets}
@@ -0,0 +1,302 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A local stand-in for the sites of a Related Website Sets list
+
+Serves the well-known files, home pages, ads.txt files and redirects that
+the network checks of check_sites.py expect from every site of a list, with
+configurable faults, so that the checks can be load tested at any scale:
+
+  python3 benchmarks/well_known_server.py --sets 20000 \\
+      --write_sets /tmp/sets.json --port 8080 --latency 0.05
+  python3 check_sites.py -i /tmp/sets.json \\
+      --host_overrides "*=http://127.0.0.1:8080" --ip_rate 0
+
+Every site is sent to the server, whose origin the per address rate limit
+counts as a single address, so that limit is turned off to keep it from
+throttling the whole run.
+"""
+
+import getopt
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.append(".")
+from benchmarks.synthetic_sets import generate_sets
+from RwsCheck import WELL_KNOWN
+
+
+class FaultProfile:
+    """The faults injected into the responses of a WellKnownServer
+
+    Each request is delayed by latency plus a random share of jitter. The
+    rates are the fractions of requests that fail in each way, drawn
+    independently of the site requested.
+
+    Attributes:
+      latency: seconds every response is delayed by
+      jitter: the most seconds added to latency at random
+      timeout_rate: fraction of requests left unanswered for hang seconds,
+      then closed
+      reset_rate: fraction of connections reset instead of answered
+      slow_drip_rate: fraction of responses whose body is sent drip_bytes at
+      a time, drip_interval seconds apart
+      drip_bytes: the size of each piece of a slow drip body
+      drip_interval: seconds between the pieces of a slow drip body
+      hang: seconds that unanswered requests are held open for
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        timeout_rate=0.0,
+        reset_rate=0.0,
+        slow_drip_rate=0.0,
+        drip_bytes=16,
+        drip_interval=0.5,
+        hang=30.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout_rate = timeout_rate
+        self.reset_rate = reset_rate
+        self.slow_drip_rate = slow_drip_rate
+        self.drip_bytes = drip_bytes
+        self.drip_interval = drip_interval
+        self.hang = hang
+
+
+def index_sites(rws_sites):
+    """Maps the host of every site in a list to what it serves
+
+    Args:
+        rws_sites: Dict in the format of related_website_sets.JSON
+    Returns:
+        Dict[string, Tuple[string, Dict]] mapping hosts to their role in
+        their set, and the contents of their well-known file
+    """
+    sites = {}
+    for rws in rws_sites["sets"]:
+        primary = rws["primary"]
+        member_well_known = {"primary": primary}
+        sites[urlsplit(primary).hostname] = ("primary", rws)
+        for site in rws.get("associatedSites", []):
+            sites[urlsplit(site).hostname] = ("associated", member_well_known)
+        for site in rws.get("serviceSites", []):
+            sites[urlsplit(site).hostname] = ("service", member_well_known)
+        for aliases in rws.get("ccTLDs", {}).values():
+            for site in aliases:
+                sites[urlsplit(site).hostname] = ("alias", member_well_known)
+    return sites
+
+
+class WellKnownServer(ThreadingHTTPServer):
+    """Serves every site of a list from a single local address
+
+    Sites are told apart by the Host header of each request. Every site
+    serves its well-known file and a home page. Service sites instead
+    redirect their home page to their primary with an X-Robots-Tag of
+    noindex, and have no ads.txt file, so that a list served without faults
+    passes every network check.
+
+    Attributes:
+      sites: the index of the sites served, as returned by index_sites
+      faults: the FaultProfile applied to every request
+      stopping: an Event that is set when the server shuts down
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, rws_sites, faults=None, address=("127.0.0.1", 0), seed=0):
+        self.sites = index_sites(rws_sites)
+        self.faults = FaultProfile() if faults is None else faults
+        self.stopping = threading.Event()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        super().__init__(address, WellKnownHandler)
+
+    @property
+    def origin(self):
+        """The origin to map the list's hosts to with --host_overrides"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self):
+        """Returns the next number of the server's random sequence"""
+        with self._random_lock:
+            return self._random.random()
+
+    def respond(self, host, path):
+        """Returns the status, headers and body of the response to a request
+
+        Args:
+            host: the host the request was made to
+            path: the path requested
+        Returns:
+            Tuple[int, Dict[string, string], bytes]
+        """
+        site = self.sites.get(host)
+        if site is None:
+            return 404, {}, b""
+        role, well_known = site
+        if path == WELL_KNOWN:
+            body = json.dumps(well_known).encode()
+            return 200, {"Content-Type": "application/json"}, body
+        if path == "/" and role == "service":
+            location = well_known["primary"] + "/"
+            return 301, {"Location": location, "X-Robots-Tag": "noindex"}, b""
+        if path == "/":
+            return 200, {"Content-Type": "text/html"}, b"<!doctype html>"
+        return 404, {}, b""
+
+    def shutdown(self):
+        self.stopping.set()
+        super().shutdown()
+
+
+class WellKnownHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        server = self.server
+        faults = server.faults
+        delay = faults.latency + faults.jitter * server.draw()
+        if delay > 0 and server.stopping.wait(delay):
+            return
+        fault = server.draw()
+        if fault < faults.reset_rate:
+            self.reset()
+            return
+        fault -= faults.reset_rate
+        if fault < faults.timeout_rate:
+            server.stopping.wait(faults.hang)
+            self.close_connection = True
+            return
+        fault -= faults.timeout_rate
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        status, headers, body = server.respond(host, urlsplit(self.path).path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not send_body:
+            return
+        if fault < faults.slow_drip_rate:
+            for start in range(0, len(body), faults.drip_bytes):
+                self.wfile.write(body[start : start + faults.drip_bytes])
+                self.wfile.flush()
+                if server.stopping.wait(faults.drip_interval):
+                    return
+        else:
+            self.wfile.write(body)
+
+    def reset(self):
+        """Aborts the connection, so that the client sees a reset"""
+        self.connection.setsockopt(
+            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+        )
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    args = sys.argv[1:]
+    input_filepath = None
+    num_sets = 1000
+    sets_filepath = None
+    port = 8080
+    seed = 0
+    faults = FaultProfile()
+    opts, _ = getopt.getopt(
+        args,
+        "i:",
+        [
+            "sets=",
+            "write_sets=",
+            "port=",
+            "seed=",
+            "latency=",
+            "jitter=",
+            "timeout_rate=",
+            "reset_rate=",
+            "slow_drip_rate=",
+            "drip_interval=",
+            "hang=",
+        ],
+    )
+    for opt, arg in opts:
+        if opt == "-i":
+            input_filepath = arg
+        if opt == "--sets":
+            num_sets = int(arg)
+        if opt == "--write_sets":
+            sets_filepath = arg
+        if opt == "--port":
+            port = int(arg)
+        if opt == "--seed":
+            seed = int(arg)
+        if opt == "--latency":
+            faults.latency = float(arg)
+        if opt == "--jitter":
+            faults.jitter = float(arg)
+        if opt == "--timeout_rate":
+            faults.timeout_rate = float(arg)
+        if opt == "--reset_rate":
+            faults.reset_rate = float(arg)
+        if opt == "--slow_drip_rate":
+            faults.slow_drip_rate = float(arg)
+        if opt == "--drip_interval":
+            faults.drip_interval = float(arg)
+        if opt == "--hang":
+            faults.hang = float(arg)
+
+    if input_filepath is not None:
+        with open(input_filepath) as f:
+            rws_sites = json.load(f)
+    else:
+        rws_sites = generate_sets(num_sets, seed)
+    if sets_filepath is not None:
+        with open(sets_filepath, "w") as f:
+            json.dump(rws_sites, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    server = WellKnownServer(rws_sites, faults, ("127.0.0.1", port), seed)
+    print(
+        f"Serving {len(rws_sites['sets'])} sets; run check_sites.py with "
+        + f'--host_overrides "*={server.origin}" --ip_rate 0',
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,20 +11,46 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import difflib
+import concurrent.futures
+import contextlib
+import functools
 import getopt
 import json
+import math
+import multiprocessing
 import os
 import pathlib
 import sys
+import time
 
-from publicsuffixlist import PublicSuffixList
+from concurrent.futures.process import BrokenProcessPool
 from RwsCheck import RwsCheck
+from RwsFormatDiff import format_diff
+from RwsRateLimiter import (
+    DEFAULT_HOST_BURST,
+    DEFAULT_HOST_RATE,
+    DEFAULT_IP_BURST,
+    DEFAULT_IP_RATE,
+    RwsRateLimiter,
+)
+from RwsReporter import NdjsonSink, RwsReporter, StdoutSink
+from RwsRequestLog import RwsRequestLog
+from RwsResultCache import RwsResultCache
+from RwsSetDiff import find_member_diffs
+from RwsSiteIndex import RwsSiteIndex
+from RwsSnapshot import load_snapshot
+from RwsTimer import RwsTimer
+
+# The most hosts that the timings report lists as the slowest
+TIMINGS_SLOWEST_HOSTS = 10
+# The most seconds run_sharded_checks waits for background DNS lookups to
+# finish before it forks its workers
+FORK_LOOKUP_TIMEOUT = 10
 
 
 def find_format_diff(rws_json_string, rws_sites):
     """Returns the diff of the rws_json_string and the formatted string
-    generated from rws_sites.
+    generated from rws_sites, see RwsFormatDiff.format_diff
 
     Args:
         rws_json_string: string
@@ -32,18 +58,7 @@ def find_format_diff(rws_json_string, rws_sites):
     Returns:
         String
     """
-    # Add final newline by convention
-    formatted_file = json.dumps(rws_sites, indent=2, ensure_ascii=False) + "\n"
-    if rws_json_string == formatted_file:
-        return ""
-    diff = difflib.unified_diff(
-        rws_json_string.splitlines(keepends=True),
-        formatted_file.splitlines(keepends=True),
-        fromfile="PR file",
-        tofile="expected",
-    )
-    joined_diff = "".join(diff)
-    return f"Formatting for JSON is incorrect;\nerror was:\n```diff\n{joined_diff}\n```"
+    return format_diff(rws_json_string, rws_sites)
 
 
 def find_diff_sets(old_sets, new_sets):
@@ -65,71 +80,477 @@ def find_diff_sets(old_sets, new_sets):
         for primary, rws in new_sets.items()
         if rws != old_sets.get(primary)
     }
+    new_sites = RwsSiteIndex(new_sets)
     subtracted_sets = {
         primary: old_sets[primary]
         for primary in set(old_sets) - set(new_sets)
-        if not any(rws.includes(primary) for rws in new_sets.values())
+        if not new_sites.includes(primary)
     }
     return diff_sets, subtracted_sets
 
 
-def run_nonbreaking_checks(rws_checker, rws_json_string, strict_formatting, check_sets):
+# The RWSCheck functions run by run_nonbreaking_checks on the sets being
+# checked, in order. They may append to the rws_checker's error_list.
+NONBREAKING_CHECKS = [
+    "has_all_rationales",
+    "find_non_https_urls",
+    "find_invalid_eTLD_Plus1",
+    "find_invalid_well_known",
+    "find_invalid_alias_eSLDs",
+    "find_robots_tag",
+    "find_ads_txt",
+    "check_for_service_redirect",
+]
+# The checker and sets that forked workers check their shards of; workers
+# inherit them, and the PSL and ICANN domains they hold, from their parent
+_worker_state = None
+
+
+def run_nonbreaking_checks(
+    rws_checker,
+    rws_json_string,
+    strict_formatting,
+    check_sets,
+    workers=1,
+    result_cache=None,
+    timer=None,
+):
     """Runs all checks from check_sites and RWSCheck whose exceptions should
     not cause the program to immediately exit.
 
     Returns a list of `error_texts` that result from running `find_format_diff`
     as well as a number of RWSCheck functions. The RWSCheck function calls may
-    also result in changes to `rws_checker.error_list`.
+    also result in changes to `rws_checker.error_list`. With more than one
+    worker, and where processes can be forked, the RWSCheck functions run on
+    shards of check_sets in worker processes, see run_sharded_checks. With a
+    result_cache, the findings of the offline checks for sets that have not
+    changed since an earlier run come from the cache. Checks that could not
+    be run in workers are run in this process instead. If rws_checker has a
+    reporter, every error is published to it as soon as it is found, or, for
+    checks run in workers or found in the cache, as soon as its check's
+    results are merged. With a timer, each check is timed as a phase named
+    after it.
 
     Args:
         rws_checker: RWSCheck object
         rws_json_string: string
         strict_formatting: boolean
         check_sets: Dict[string, RwsSet]
+        workers: the number of worker processes to run the checks in
+        result_cache: an optional RwsResultCache
+        timer: an optional RwsTimer
     Returns:
         [String]
     """
-    error_texts = []
-    if strict_formatting and (
-        format_diff := find_format_diff(rws_json_string, rws_checker.rws_sites)
-    ):
-        error_texts.append(format_diff)
-
-    try:
-        rws_checker.check_exclusivity(rws_checker.load_sets())
-    except Exception as inst:
-        error_texts.append(inst)
-
-    # These are RWSCheck functions that may append to the
-    # rws_checker's error_list.
-    check_list = [
-        rws_checker.has_all_rationales,
-        rws_checker.find_non_https_urls,
-        rws_checker.find_invalid_eTLD_Plus1,
-        rws_checker.find_invalid_well_known,
-        rws_checker.find_invalid_alias_eSLDs,
-        rws_checker.find_robots_tag,
-        rws_checker.find_ads_txt,
-        rws_checker.check_for_service_redirect,
-    ]
+    if rws_checker.reporter is None:
+        error_texts = []
+    else:
+        error_texts = rws_checker.reporter.finding_list()
+    with checking(rws_checker, "find_format_diff", timer):
+        if strict_formatting and (
+            format_diff := find_format_diff(rws_json_string, rws_checker.rws_sites)
+        ):
+            error_texts.append(format_diff)
 
-    for check in check_list:
+    with checking(rws_checker, "check_exclusivity", timer):
         try:
-            check(check_sets)
+            rws_checker.check_exclusivity(rws_checker.load_sets())
         except Exception as inst:
             error_texts.append(inst)
 
+    # Findings of checks that have already run, with their exceptions
+    results = {}
+    if result_cache is not None:
+        results.update(result_cache.run_checks(rws_checker, check_sets))
+    can_fork = "fork" in multiprocessing.get_all_start_methods()
+    if workers > 1 and len(check_sets) > 1 and can_fork:
+        remaining_checks = [c for c in NONBREAKING_CHECKS if c not in results]
+        results.update(
+            run_sharded_checks(
+                rws_checker, check_sets, workers, remaining_checks, timer
+            )
+        )
+
+    for check in NONBREAKING_CHECKS:
+        with checking(rws_checker, check, timer):
+            if check in results:
+                errors, exceptions = results[check]
+                rws_checker.error_list.extend(errors)
+                error_texts.extend(exceptions)
+                continue
+            try:
+                getattr(rws_checker, check)(check_sets)
+            except Exception as inst:
+                error_texts.append(inst)
+
     return error_texts
 
 
+@contextlib.contextmanager
+def checking(rws_checker, check, timer=None):
+    """Attributes the errors published by rws_checker's reporter, if it has
+    one, in the body of a with statement to the check named check, and times
+    the body as the phase check of timer, if given"""
+    with contextlib.ExitStack() as stack:
+        if rws_checker.reporter is not None:
+            stack.enter_context(rws_checker.reporter.checking(check))
+        if timer is not None:
+            stack.enter_context(timer.phase(check))
+        yield
+
+
+def run_sharded_checks(rws_checker, check_sets, workers, checks, timer=None):
+    """Runs checks on shards of check_sets in worker processes
+
+    check_sets is split into contiguous shards, one per worker. The
+    checker's suffix index, ICANN domains and fetcher are loaded, if they
+    have not been yet, and the workers are then forked, so that they share
+    them with their parent instead of each loading them again. Each worker
+    runs every check on its shard, and the errors of each check are merged
+    in shard order, so that they are in the same order as when the check
+    runs in a single process. With a timer, the time each check took on
+    every shard is added to the phase named after it.
+
+    The workers are not forked while DNS lookups of the fetcher's resolver
+    are still running after FORK_LOOKUP_TIMEOUT seconds, and if a worker
+    dies, the results of every shard are dropped. Either way, no check is
+    in the results, so that the caller runs them all in its own process.
+
+    Args:
+        rws_checker: RWSCheck object
+        check_sets: Dict[string, RwsSet]
+        workers: the number of worker processes
+        checks: list[string] of the names of the RWSCheck functions to run
+        timer: an optional RwsTimer
+    Returns:
+        Dict[string, Tuple[list[string], list[string]]] mapping each check to
+        the errors it found and the exceptions it raised
+    """
+    global _worker_state
+    primaries = list(check_sets)
+    shard_size = math.ceil(len(primaries) / workers)
+    shards = [
+        primaries[start : start + shard_size]
+        for start in range(0, len(primaries), shard_size)
+    ]
+    for resource in ["etlds", "icanns", "fetcher"]:
+        getattr(rws_checker, resource)
+    if not rws_checker.fetcher.wait_for_lookups(FORK_LOOKUP_TIMEOUT):
+        print(
+            "DNS lookups are still running; running the checks in a single "
+            + "process",
+            file=sys.stderr,
+        )
+        return {}
+    _worker_state = (rws_checker, check_sets, checks)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(shards),
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(len(shards),),
+        ) as executor:
+            shard_results = list(executor.map(_run_shard, shards))
+    except BrokenProcessPool as inst:
+        print(
+            f"A worker process died ({inst}); running the checks in a single "
+            + "process",
+            file=sys.stderr,
+        )
+        return {}
+    finally:
+        _worker_state = None
+    results = {check: ([], []) for check in checks}
+    for shard_result, stats in shard_results:
+        for check, (errors, error_text, seconds) in zip(checks, shard_result):
+            results[check][0].extend(errors)
+            if error_text is not None:
+                results[check][1].append(error_text)
+            if timer is not None:
+                timer.add(check, seconds)
+        rws_checker.fetcher.merge_run_stats(stats)
+    return results
+
+
+def _init_worker(num_workers):
+    rws_checker = _worker_state[0]
+    rws_checker.fetcher.reset_after_fork(num_workers)
+
+
+def _run_shard(primaries):
+    # Returns the errors, exception text and seconds of each check on the
+    # shard, and the worker's fetcher statistics
+    rws_checker, check_sets, checks = _worker_state
+    shard = {primary: check_sets[primary] for primary in primaries}
+    results = []
+    for check in checks:
+        rws_checker.error_list = []
+        error_text = None
+        start = time.perf_counter()
+        try:
+            getattr(rws_checker, check)(shard)
+        except Exception as inst:
+            error_text = str(inst)
+        seconds = time.perf_counter() - start
+        results.append((rws_checker.error_list, error_text, seconds))
+    return results, rws_checker.fetcher.run_stats()
+
+
+def built_fetcher(rws_checker):
+    """Returns the fetcher of rws_checker, or None if no check has needed it
+    yet, without building it"""
+    fetcher = rws_checker._fetcher
+    return None if callable(fetcher) else fetcher
+
+
+def report_run_stats(rws_checker):
+    """Prints statistics about the run to stderr
+
+    The statistics are kept off stdout so that the workflows, which compare
+    stdout with "success", are unaffected by them. A run whose checks made
+    no request, and so never built the fetcher, has none to print.
+
+    Args:
+        rws_checker: RWSCheck object
+    """
+    fetcher = built_fetcher(rws_checker)
+    if fetcher is None:
+        return
+    stats = fetcher.connection_stats()
+    print(
+        f"Made {stats['requests']} requests over {stats['connections']} "
+        + f"connections ({stats['reused']} reused)",
+        file=sys.stderr,
+    )
+    http_cache = fetcher.http_cache
+    if http_cache is not None:
+        cache_stats = http_cache.stats()
+        print(
+            f"HTTP cache: {cache_stats['hits']} hits, "
+            + f"{cache_stats['misses']} misses",
+            file=sys.stderr,
+        )
+    resolver = fetcher.resolver
+    if resolver is not None and resolver.unresolvable_hosts():
+        print(
+            f"{len(resolver.unresolvable_hosts())} hosts could not be resolved",
+            file=sys.stderr,
+        )
+    retry_policy = fetcher.retry_policy
+    if retry_policy is not None and retry_policy.retries_by_host:
+        retries = ", ".join(
+            f"{host} ({count})"
+            for host, count in sorted(
+                retry_policy.retries_by_host.items(), key=lambda item: -item[1]
+            )
+        )
+        print(f"Retried requests to: {retries}", file=sys.stderr)
+
+
+def report_member_diffs(member_diffs, check_sets):
+    """Prints the members that a diff adds, removes and changes to stderr
+
+    Args:
+        member_diffs: Dict[string, RwsSetDiff] as returned by
+        find_member_diffs
+        check_sets: Dict[string, RwsSet] of the sets being checked
+    """
+    for primary, diff in member_diffs.items():
+        changes = [
+            f"{verb} {role} {', '.join(sites)}"
+            for verb, changed in [("added", diff.added), ("removed", diff.removed)]
+            for role, sites in changed.items()
+        ]
+        changed_sites = {}
+        for site, fields in diff.changed.items():
+            for field in fields:
+                changed_sites.setdefault(field, []).append(site)
+        changes += [
+            f"changed the {field} of {', '.join(sites)}"
+            for field, sites in changed_sites.items()
+        ]
+        print(f"{primary}: {'; '.join(changes) or 'reordered'}", file=sys.stderr)
+    num_members = sum(
+        1
+        + len(rws.associated_sites)
+        + len(rws.service_sites)
+        + sum(len(aliases) for aliases in rws.ccTLDs.values())
+        for rws in check_sets.values()
+    )
+    num_affected = sum(
+        len(member_diffs[primary].affected_sites()) for primary in check_sets
+    )
+    print(
+        f"Rechecking {num_affected} of the {num_members} sites of "
+        + f"{len(check_sets)} changed sets",
+        file=sys.stderr,
+    )
+
+
+def parse_host_overrides(arg):
+    """Parses a comma separated list of host=origin mappings
+
+    Args:
+        arg: string such as "*=http://127.0.0.1:8080"
+    Returns:
+        Dict[string, string]
+    """
+    host_overrides = {}
+    for mapping in arg.split(","):
+        host, _, origin = mapping.partition("=")
+        if not host or not origin:
+            raise ValueError(f"Invalid host override: {mapping}")
+        host_overrides[host.strip()] = origin.strip()
+    return host_overrides
+
+
+def write_timings(path, timer, request_log):
+    """Writes the timings report of a run, and prints its slowest hosts to
+    stderr
+
+    The report is a JSON object of the seconds each phase of the run took,
+    which include each check, the requests made to each host, as grouped by
+    RwsRequestLog.by_host, and the TIMINGS_SLOWEST_HOSTS hosts whose
+    requests took the most time.
+
+    Args:
+        path: the path of the report
+        timer: the RwsTimer of the run
+        request_log: the RwsRequestLog of the run's requests
+    """
+    slowest_hosts = request_log.slowest_hosts(TIMINGS_SLOWEST_HOSTS)
+    report = {
+        "phases": timer.phases(),
+        "hosts": request_log.by_host(),
+        "slowest_hosts": [
+            {"host": host, "seconds": seconds, "requests": num_requests}
+            for host, seconds, num_requests in slowest_hosts
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    if slowest_hosts:
+        print(
+            "Slowest hosts: "
+            + ", ".join(
+                f"{host} {seconds * 1000:.1f} ms ({num_requests} requests)"
+                for host, seconds, num_requests in slowest_hosts
+            ),
+            file=sys.stderr,
+        )
+
+
+def build_fetcher(options, request_log=None):
+    """Builds the RwsFetcher of the network checks from command line options
+
+    The network modules, which import requests, are imported here rather than
+    at the top of check_sites.py, so that a run that stops before its first
+    request never imports them.
+
+    Args:
+        options: Dict[string, object] of the network options given on the
+        command line, keyed by their names; the rest take their defaults
+        request_log: an optional RwsRequestLog to record every request to
+    Returns:
+        RwsFetcher
+    """
+    from RwsCassette import CassettePlayer, CassetteRecorder
+    from RwsFetcher import (
+        DEFAULT_MAX_BODY_BYTES,
+        DEFAULT_MAX_CONCURRENCY,
+        DEFAULT_MAX_READ_TIME,
+        DEFAULT_POOL_SIZE,
+        RwsFetcher,
+    )
+    from RwsHttpCache import DEFAULT_TTL, RwsHttpCache
+    from RwsResolver import RwsResolver
+    from RwsRetry import DEFAULT_MAX_ATTEMPTS, DEFAULT_RETRY_BUDGET, RwsRetryPolicy
+
+    http_cache = None
+    if "cache_dir" in options:
+        http_cache = RwsHttpCache(
+            options["cache_dir"], options.get("cache_ttl", DEFAULT_TTL)
+        )
+    recorder = CassetteRecorder() if "record" in options else None
+    transport = None
+    resolver = RwsResolver()
+    rate_limiter = RwsRateLimiter(
+        options.get("host_rate", DEFAULT_HOST_RATE),
+        options.get("host_burst", DEFAULT_HOST_BURST),
+        options.get("ip_rate", DEFAULT_IP_RATE),
+        options.get("ip_burst", DEFAULT_IP_BURST),
+        resolve=resolver.address,
+        host_overrides=options.get("host_overrides"),
+    )
+    if "replay" in options:
+        transport = CassettePlayer.load(
+            options["replay"], options.get("replay_latency_scale", 1.0)
+        )
+        # Replayed runs never reach the network, and must not resolve hosts
+        resolver = rate_limiter = None
+    return RwsFetcher(
+        options.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+        options.get("pool_size", DEFAULT_POOL_SIZE),
+        http_cache=http_cache,
+        rate_limiter=rate_limiter,
+        time_budget=options.get("time_budget"),
+        retry_policy=RwsRetryPolicy(
+            options.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            retry_budget=options.get("retry_budget", DEFAULT_RETRY_BUDGET),
+        ),
+        transport=transport,
+        recorder=recorder,
+        host_overrides=options.get("host_overrides"),
+        resolver=resolver,
+        max_body_bytes=options.get("max_body_bytes", DEFAULT_MAX_BODY_BYTES),
+        max_read_time=options.get("max_read_time", DEFAULT_MAX_READ_TIME),
+        head_probes=options.get("head_probes", True),
+        request_log=request_log,
+    )
+
+
 def main():
     args = sys.argv[1:]
     input_filepath = "related_website_sets.JSON"
     cli_primaries = []
     with_diff = False
     strict_formatting = False
+    # The options of the network checks, see build_fetcher
+    network_options = {}
+    workers = 1
+    result_cache_dir = None
+    findings_file = None
+    timings_file = None
     opts, _ = getopt.getopt(
-        args, "i:p:", ["with_diff", "strict_formatting", "primaries="]
+        args,
+        "i:p:",
+        [
+            "with_diff",
+            "strict_formatting",
+            "primaries=",
+            "max_concurrency=",
+            "pool_size=",
+            "cache_dir=",
+            "cache_ttl=",
+            "host_rate=",
+            "host_burst=",
+            "ip_rate=",
+            "ip_burst=",
+            "time_budget=",
+            "max_attempts=",
+            "retry_budget=",
+            "record=",
+            "replay=",
+            "replay_latency_scale=",
+            "host_overrides=",
+            "max_body_bytes=",
+            "max_read_time=",
+            "no_head_probes",
+            "workers=",
+            "result_cache_dir=",
+            "findings_file=",
+            "timings=",
+        ],
     )
     for opt, arg in opts:
         if opt == "-i":
@@ -140,39 +561,113 @@ def main():
             strict_formatting = True
         if opt == "--primaries" or opt == "-p":
             cli_primaries.extend(arg.split(","))
+        if opt == "--max_concurrency":
+            network_options["max_concurrency"] = int(arg)
+        if opt == "--pool_size":
+            network_options["pool_size"] = int(arg)
+        if opt == "--cache_dir":
+            network_options["cache_dir"] = arg
+        if opt == "--cache_ttl":
+            network_options["cache_ttl"] = float(arg)
+        # A rate of 0 turns the corresponding limit off
+        if opt == "--host_rate":
+            network_options["host_rate"] = float(arg)
+        if opt == "--host_burst":
+            network_options["host_burst"] = int(arg)
+        if opt == "--ip_rate":
+            network_options["ip_rate"] = float(arg)
+        if opt == "--ip_burst":
+            network_options["ip_burst"] = int(arg)
+        if opt == "--time_budget":
+            network_options["time_budget"] = float(arg)
+        if opt == "--max_attempts":
+            network_options["max_attempts"] = int(arg)
+        if opt == "--retry_budget":
+            network_options["retry_budget"] = int(arg)
+        if opt == "--record":
+            network_options["record"] = arg
+        if opt == "--replay":
+            network_options["replay"] = arg
+        if opt == "--replay_latency_scale":
+            network_options["replay_latency_scale"] = float(arg)
+        if opt == "--host_overrides":
+            network_options["host_overrides"] = parse_host_overrides(arg)
+        if opt == "--max_body_bytes":
+            network_options["max_body_bytes"] = int(arg)
+        if opt == "--max_read_time":
+            network_options["max_read_time"] = float(arg)
+        # Probe pages with GET requests that stop after the headers instead
+        if opt == "--no_head_probes":
+            network_options["head_probes"] = False
+        if opt == "--workers":
+            workers = int(arg)
+        if opt == "--result_cache_dir":
+            result_cache_dir = arg
+        # Also write each finding to a file, as one JSON object per line
+        if opt == "--findings_file":
+            findings_file = arg
+        # Write the time taken by each phase, check and request to a file
+        if opt == "--timings":
+            timings_file = arg
+
+    timer = RwsTimer()
+    # Every finding is printed as soon as it is found
+    sinks = [StdoutSink()]
+    if findings_file is not None:
+        sinks.append(NdjsonSink(findings_file))
+    reporter = RwsReporter(sinks)
+    request_log = RwsRequestLog() if timings_file is not None else None
+
+    def finish():
+        # Prints "success" if there were no findings, and the summaries
+        reporter.close()
+        print(reporter.report(), file=sys.stderr)
+        print(timer.report(), file=sys.stderr)
+        if timings_file is not None:
+            write_timings(timings_file, timer, request_log)
 
-    rws_json_string = pathlib.Path(input_filepath).read_text()
+    with timer.phase("read_input"):
+        rws_json_string = pathlib.Path(input_filepath).read_text()
     try:
-        rws_sites = json.loads(rws_json_string)
+        with timer.phase("parse_json"):
+            rws_sites = json.loads(rws_json_string)
     except Exception as inst:
         # If the file cannot be loaded, we will not run any other checks
-        print(f"There was an error when parsing the JSON;\nerror was:  {inst}")
+        reporter.publish(
+            f"There was an error when parsing the JSON;\nerror was:  {inst}"
+        )
+        finish()
         return
 
-    # Load the etlds from the public suffix list
-    with open("effective_tld_names.dat", "rb") as f:
-        etlds = PublicSuffixList(f)
-    # Get all the ICANN domains
-    icanns = set()
-    with open("ICANN_domains") as f:
-        for line in f:
-            l = line.strip()
-            icanns.add(l)
+    # Load the etlds from the public suffix list, and all the ICANN domains,
+    # from their snapshot, which is rebuilt if either file has changed. Both
+    # are loaded when the first check that needs them runs.
+    snapshot = functools.cache(timer.timed("load_snapshot", load_snapshot))
 
-    rws_checker = RwsCheck(rws_sites, etlds, icanns)
+    def etlds():
+        return snapshot()[0]
 
-    try:
-        rws_checker.validate_schema("SCHEMA.json")
-    except Exception as inst:
-        # If the schema is invalid, we will not run any other checks
-        print(inst)
-        return
+    def icanns():
+        return snapshot()[1]
+
+    if "record" in network_options and workers > 1:
+        # The requests of worker processes would be missing from the cassette
+        print("--record runs the checks in a single process", file=sys.stderr)
+        workers = 1
+    # The fetcher, and the network modules, are loaded by the first request
+    rws_checker = RwsCheck(
+        rws_sites,
+        etlds,
+        icanns,
+        fetcher=timer.timed(
+            "build_fetcher", lambda: build_fetcher(network_options, request_log)
+        ),
+        reporter=reporter,
+    )
 
-    error_texts = []
-    check_sets = {}
-    subtracted_sets = {}
     # If called with with_diff, we must determine the sets that are different
-    # to properly construct our check_sets
+    # to properly construct our check_sets, and only those need validating
+    old_sites = None
     if with_diff:
         with open("related_website_sets.JSON") as f:
             try:
@@ -180,42 +675,96 @@ def main():
             except Exception as inst:
                 # If the file cannot be loaded, we will not run any other
                 # checks
-                print(
+                reporter.publish(
                     "There was an error when loading "
                     + "related_website_sets.JSON"
                     + "\nerror was: "
-                    + inst
+                    + str(inst)
                 )
+                finish()
                 return
+
+    try:
+        with timer.phase("validate_schema"):
+            schema_errors = rws_checker.find_schema_errors(
+                "SCHEMA.json", old_sites["sets"] if with_diff else ()
+            )
+    except Exception as inst:
+        schema_errors = [inst]
+    if schema_errors:
+        # If the schema is invalid, we will not run any other checks
+        for error in schema_errors:
+            reporter.publish(error, "validate_schema")
+        finish()
+        return
+
+    check_sets = {}
+    subtracted_sets = {}
+    if with_diff:
         old_checker = RwsCheck(old_sites, etlds, icanns)
-        check_sets, subtracted_sets = find_diff_sets(
-            old_checker.load_sets(), rws_checker.load_sets()
-        )
+        with timer.phase("load_sets"):
+            old_sets = old_checker.load_sets()
+            new_sets = rws_checker.load_sets()
+            check_sets, subtracted_sets = find_diff_sets(old_sets, new_sets)
+            member_diffs = find_member_diffs(old_sets, new_sets, old_sites, rws_sites)
+        # The network checks only check the members that the PR added to each
+        # set, and the primary's well-known file
+        rws_checker.affected_sites = {
+            site
+            for primary in check_sets
+            for site in member_diffs[primary].affected_sites()
+        }
+        report_member_diffs(member_diffs, check_sets)
     else:
-        check_sets = rws_checker.load_sets()
+        with timer.phase("load_sets"):
+            check_sets = rws_checker.load_sets()
         if cli_primaries:
             absent_primaries = [p for p in cli_primaries if p not in check_sets]
             for p in absent_primaries:
-                error_texts.append(
+                reporter.publish(
                     "There was an error loading the set:\n"
                     + f'could not find set with primary site "{p}"'
                 )
             check_sets = {p: check_sets[p] for p in cli_primaries if p in check_sets}
 
-    # Run check on subtracted sets
-    rws_checker.find_invalid_removal(subtracted_sets)
-    # Run remaining technical checks
-    error_texts += run_nonbreaking_checks(
-        rws_checker, rws_json_string, strict_formatting, check_sets
-    )
+    # Resolve every host up front, so that dead hosts fail fast in each check
+    with timer.phase("resolve_hosts"):
+        rws_checker.resolve_hosts(check_sets | subtracted_sets)
+    with timer.phase("checks"):
+        # Run check on subtracted sets
+        with checking(rws_checker, "find_invalid_removal", timer):
+            rws_checker.find_invalid_removal(subtracted_sets)
+        result_cache = None
+        if result_cache_dir is not None:
+            result_cache = RwsResultCache(
+                result_cache_dir, ["effective_tld_names.dat", "ICANN_domains"]
+            )
+        # Run remaining technical checks; their errors have been published
+        run_nonbreaking_checks(
+            rws_checker,
+            rws_json_string,
+            strict_formatting,
+            check_sets,
+            workers,
+            result_cache,
+            timer,
+        )
+    report_run_stats(rws_checker)
     # This message allows us to check the succes of our action
-    if rws_checker.error_list or error_texts:
-        for checker_error in rws_checker.error_list:
-            print(checker_error)
-        for error_text in error_texts:
-            print(error_text)
-    else:
-        print("success", end="")
+    finish()
+    fetcher = built_fetcher(rws_checker)
+    if fetcher is not None and fetcher.http_cache is not None:
+        fetcher.http_cache.prune()
+    if result_cache is not None:
+        cache_stats = result_cache.stats()
+        print(
+            f"Result cache: {cache_stats['hits']} hits, "
+            + f"{cache_stats['misses']} misses",
+            file=sys.stderr,
+        )
+        result_cache.prune()
+    if "record" in network_options:
+        rws_checker.fetcher.recorder.save(network_options["record"])
 
 
 if __name__ == "__main__":
@@ -11,20 +11,69 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import http.server
+import io
 import json
+import os
 import re
+import requests
+import socket
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from jsonschema import ValidationError
+from jsonschema import Draft202012Validator, ValidationError
 from publicsuffixlist import PublicSuffixList
 from unittest import mock
 from requests import structures
 
 sys.path.append(".")
-from check_sites import find_diff_sets, find_format_diff, run_nonbreaking_checks
+from benchmarks.synthetic_sets import generate_sets
+from benchmarks.well_known_server import FaultProfile, WellKnownServer
+from check_sites import (
+    build_fetcher,
+    find_diff_sets,
+    find_format_diff,
+    NONBREAKING_CHECKS,
+    parse_host_overrides,
+    report_run_stats,
+    run_nonbreaking_checks,
+    run_sharded_checks,
+    write_timings,
+)
+from RwsCassette import CassetteMiss, CassettePlayer, CassetteRecorder
 from RwsCheck import RwsCheck, WELL_KNOWN
-from RwsSet import RwsSet
+from RwsFormatDiff import MAX_FORMAT_DIFF_LINE_LENGTH, MAX_FORMAT_DIFF_SETS
+from RwsFetcher import (
+    DEFAULT_TIMEOUT,
+    MIN_TIMEOUT,
+    ReadDeadlineExceeded,
+    ResponseTooLarge,
+    RunDeadlineExceeded,
+    RwsFetcher,
+)
+from RwsHttpCache import RwsHttpCache
+from RwsRateLimiter import RwsRateLimiter, TokenBucket, round_robin_by_host
+from RwsResolver import RwsResolver, UnresolvableHost
+from RwsReporter import CallbackSink, NdjsonSink, RwsReporter, StdoutSink
+from RwsRequestLog import RwsRequestLog
+from RwsResultCache import CACHEABLE_CHECKS, RwsResultCache, file_digest
+from RwsSchema import load_validator
+from RwsSiteIndex import RwsSiteIndex
+from RwsSnapshot import (
+    SnapshotError,
+    compile_sources,
+    load_snapshot,
+    read_snapshot,
+    write_snapshot,
+)
+from RwsSuffixIndex import RwsSuffixIndex
+from RwsTimer import RwsTimer
+from RwsRetry import RwsRetryPolicy, is_transient, is_unreachable
+from RwsSet import FrozenRwsSet, RwsSet
+from RwsSetDiff import RwsSetDiff, diff_set, find_member_diffs
 
 
 with open("effective_tld_names.dat", "rb") as f:
@@ -60,6 +109,112 @@ error was:
             find_format_diff(valid_format_string, json.loads(valid_format_string)), ""
         )
 
+    def misformat_primaries(self, rws_sites, count):
+        # Adds a trailing space to the primary line of the first count sets
+        lines = (json.dumps(rws_sites, indent=2) + "\n").splitlines(keepends=True)
+        primaries = [rws["primary"] for rws in rws_sites["sets"][:count]]
+        return "".join(
+            (
+                line.replace(",\n", ", \n")
+                if any(f'"primary": "{primary}"' in line for primary in primaries)
+                else line
+            )
+            for line in lines
+        )
+
+    def test_hunks_are_headed_with_primary(self):
+        rws_sites = {
+            "sets": [
+                {"primary": "https://primary.com", "contact": "a@primary.com"},
+                {"primary": "https://primary2.com", "contact": "a@primary2.com"},
+            ]
+        }
+        rws_json_string = (json.dumps(rws_sites, indent=2) + "\n").replace(
+            '"a@primary2.com"', '"a@primary2.com" '
+        )
+        self.assertEqual(
+            find_format_diff(rws_json_string, rws_sites),
+            """Formatting for JSON is incorrect;
+error was:
+```diff
+--- PR file
++++ expected
+@@ -6,7 +6,7 @@ https://primary2.com
+     },
+     {
+       "primary": "https://primary2.com",
+-      "contact": "a@primary2.com" 
++      "contact": "a@primary2.com"
+     }
+   ]
+ }
+
+```""",
+        )
+
+    def test_repeated_line_is_matched_within_its_set(self):
+        # Matching the whole file would remove the first copy of the
+        # contact, and show a hunk of 10 lines
+        rws_sites = {
+            "sets": [
+                {"contact": "a@primary.com", "primary": "https://primary.com"},
+                {"contact": "a@primary2.com", "primary": "https://primary2.com"},
+            ]
+        }
+        rws_json_string = (
+            (json.dumps(rws_sites, indent=2) + "\n")
+            .replace('"https://primary.com"\n', '"https://primary.com" \n')
+            .replace(
+                '      "contact": "a@primary2.com",\n',
+                '      "contact": "a@primary2.com",\n' * 2,
+            )
+        )
+        self.assertEqual(
+            find_format_diff(rws_json_string, json.loads(rws_json_string)),
+            """Formatting for JSON is incorrect;
+error was:
+```diff
+--- PR file
++++ expected
+@@ -2,11 +2,10 @@ https://primary.com
+   "sets": [
+     {
+       "contact": "a@primary.com",
+-      "primary": "https://primary.com" 
++      "primary": "https://primary.com"
+     },
+     {
+       "contact": "a@primary2.com",
+-      "contact": "a@primary2.com",
+       "primary": "https://primary2.com"
+     }
+   ]
+
+```""",
+        )
+
+    def test_misformatted_sets_are_capped(self):
+        rws_sites = generate_sets(MAX_FORMAT_DIFF_SETS + 5, seed=0)
+        format_diff = find_format_diff(
+            self.misformat_primaries(rws_sites, MAX_FORMAT_DIFF_SETS + 5), rws_sites
+        )
+        self.assertEqual(
+            re.findall(r"^@@ .* @@ (\S+)$", format_diff, re.M),
+            [rws["primary"] for rws in rws_sites["sets"][:MAX_FORMAT_DIFF_SETS]],
+        )
+        self.assertTrue(format_diff.endswith("\n5 more sets are formatted incorrectly"))
+
+    def test_minified_list_is_bounded(self):
+        rws_sites = generate_sets(2000, seed=0)
+        minified = json.dumps(rws_sites, separators=(",", ":")) + "\n"
+        format_diff = find_format_diff(minified, rws_sites)
+        self.assertIn("@@ -1 +1,", format_diff)
+        self.assertLess(len(format_diff), len(minified) // 100)
+        self.assertLessEqual(
+            max(len(line) for line in format_diff.splitlines()),
+            MAX_FORMAT_DIFF_LINE_LENGTH + len("..."),
+        )
+
 
 class TestValidateSchema(unittest.TestCase):
     """A test suite for the validate_schema function of RwsCheck"""
@@ -345,6 +500,47 @@ class TestValidateSchema(unittest.TestCase):
         ):
             rws_check.validate_schema("SCHEMA.json")
 
+    def test_every_set_error_is_found(self):
+        json_dict = generate_sets(3, seed=0)
+        del json_dict["sets"][0]["contact"]
+        json_dict["sets"][2]["foo"] = True
+        rws_check = RwsCheck(rws_sites=json_dict, etlds=None, icanns=set())
+        errors = rws_check.find_schema_errors("SCHEMA.json")
+        self.assertEqual(
+            [(list(error.path), error.validator) for error in errors],
+            [(["sets", 0], "required"), (["sets", 2], "additionalProperties")],
+        )
+        with self.assertRaisesRegex(ValidationError, "'foo' was unexpected"):
+            rws_check.validate_schema("SCHEMA.json")
+
+    def test_matches_jsonschema(self):
+        json_dict = generate_sets(3, seed=0)
+        json_dict["sets"].append(json_dict["sets"][0])
+        json_dict["sets"][1]["ccTLDs"] = {"https://rws1.com": "https://rws1.ca"}
+        json_dict["foo"] = True
+        with open("SCHEMA.json") as f:
+            schema = json.load(f)
+        rws_check = RwsCheck(rws_sites=json_dict, etlds=None, icanns=set())
+        self.assertEqual(
+            [str(error) for error in rws_check.find_schema_errors("SCHEMA.json")],
+            [
+                str(error)
+                for error in Draft202012Validator(schema).iter_errors(json_dict)
+            ],
+        )
+
+    def test_unchanged_sets_are_not_validated(self):
+        old_sites = generate_sets(3, seed=0)
+        del old_sites["sets"][1]["contact"]
+        json_dict = json.loads(json.dumps(old_sites))
+        json_dict["sets"][2]["foo"] = True
+        rws_check = RwsCheck(rws_sites=json_dict, etlds=None, icanns=set())
+        errors = rws_check.find_schema_errors("SCHEMA.json", old_sites["sets"])
+        self.assertEqual([list(error.path) for error in errors], [["sets", 2]])
+
+    def test_validator_is_cached(self):
+        self.assertIs(load_validator("SCHEMA.json"), load_validator("SCHEMA.json"))
+
 
 class TestRwsSetEqual(unittest.TestCase):
     def test_equal_case(self):
@@ -1103,6 +1299,7 @@ def mock_get(*args, **kwargs):
             self.headers = structures.CaseInsensitiveDict(headers)
             self.status_code = status_code
             self.url = args[0]
+            self.is_redirect = False
 
     if args[0] == "https://service1.com":
         return MockedGetResponse({}, 200)
@@ -1173,13 +1370,32 @@ def mock_open_and_load_json(*args, **kwargs):
     return {"primary": None}
 
 
+# requests.Session sends every method through Session.request, so patching it
+# with this method lets mock_get stand in for the network
+def mock_request(method, url, **kwargs):
+    return mock_get(url, **kwargs)
+
+
+# Builds a requests.Response as requests would return it, with the next
+# request of a redirect to its Location
+def make_response(url, status_code=200, headers=None, body=b""):
+    response = requests.models.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = body
+    if "Location" in response.headers:
+        response._next = requests.Request("GET", response.headers["Location"]).prepare()
+    return response
+
+
 # Our test case class
 
 
 class MockTestsClass(unittest.TestCase):
-    # We patch requests.get with our mocked method. We'll pass
+    # We patch requests.Session.request with our mocked method. We'll pass
     # in the relevant urls, and get our responses for robots checks
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_robots(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1202,7 +1418,7 @@ class MockTestsClass(unittest.TestCase):
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_robots_wrong_tag(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1225,7 +1441,7 @@ class MockTestsClass(unittest.TestCase):
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_robots_expected_tag(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1241,7 +1457,7 @@ class MockTestsClass(unittest.TestCase):
         rws_check.find_robots_tag(loaded_sets)
         self.assertEqual(rws_check.error_list, [])
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_robots_none_tag(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1257,7 +1473,7 @@ class MockTestsClass(unittest.TestCase):
         rws_check.find_robots_tag(loaded_sets)
         self.assertEqual(rws_check.error_list, [])
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_robots_redirects(self, mock_get):
         json_dict = {
             "sets": [
@@ -1273,7 +1489,7 @@ class MockTestsClass(unittest.TestCase):
         self.assertEqual(rws_check.error_list, [])
 
     # We run a similar set of mock tests for ads.txt
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_ads(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1296,7 +1512,7 @@ class MockTestsClass(unittest.TestCase):
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_ads(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1313,7 +1529,7 @@ class MockTestsClass(unittest.TestCase):
         self.assertEqual(rws_check.error_list, [])
 
     # We run a similar set of mock tests for redirect check
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_non_redirect(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1332,7 +1548,7 @@ class MockTestsClass(unittest.TestCase):
             ["The service site " + "must not be an endpoint: https://service1.com"],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_proper_redirect(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1348,7 +1564,7 @@ class MockTestsClass(unittest.TestCase):
         rws_check.check_for_service_redirect(loaded_sets)
         self.assertEqual(rws_check.error_list, [])
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_404_redirect(self, mock_get):
         # Assert requests.get calls
         json_dict = {
@@ -1365,7 +1581,7 @@ class MockTestsClass(unittest.TestCase):
         self.assertEqual(rws_check.error_list, [])
 
     # Now we test check_invalid_removal by checking for an error 404
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_find_invalid_removal(self, mock_get):
         subtracted_sets = {
             "https://primary1.com": RwsSet(primary="https://primary1.com", ccTLDs={})
@@ -1382,7 +1598,7 @@ class MockTestsClass(unittest.TestCase):
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     def test_find_valid_removal(self, mock_get):
         subtracted_sets = {
             "https://primary2.com": RwsSet(primary="https://primary2.com", ccTLDs={})
@@ -1594,6 +1810,2040 @@ class MockTestsClass(unittest.TestCase):
         )
 
 
+class TestConcurrentWellKnown(unittest.TestCase):
+    """A test suite for the concurrent fetching of well-known pages"""
+
+    json_dict = {
+        "sets": [
+            {
+                "primary": "https://primary2.com",
+                "associatedSites": ["https://associated1.com"],
+            },
+            {
+                "primary": "https://primary3.com",
+                "associatedSites": ["https://associated2.com"],
+            },
+        ]
+    }
+
+    def test_fetches_run_concurrently(self):
+        # Every fetch waits for all the others, so this can only pass if all
+        # four well-known pages are fetched at the same time.
+        barrier = threading.Barrier(4, timeout=5)
+
+        def waiting_open_and_load_json(url):
+            barrier.wait()
+            return mock_open_and_load_json(url)
+
+        rws_check = RwsCheck(rws_sites=self.json_dict, etlds=None, icanns=set())
+        with mock.patch.object(
+            rws_check, "open_and_load_json", side_effect=waiting_open_and_load_json
+        ):
+            rws_check.find_invalid_well_known(rws_check.load_sets())
+        self.assertEqual(
+            rws_check.error_list,
+            [
+                "The /.well-known/related-website-set.json"
+                + " set's primary (https://wrong-primary.com) did not equal the PR "
+                + "set's primary (https://primary2.com)",
+                "The listed associated site "
+                + "did not have https://primary3.com listed as its primary: "
+                + "https://associated2.com",
+            ],
+        )
+
+    def test_error_order_is_deterministic(self):
+        # The first urls requested are the slowest to respond, but errors
+        # must still be reported in list order.
+        delays = iter([0.2, 0.15, 0.1, 0.05])
+
+        def slow_open_and_load_json(url):
+            time.sleep(next(delays))
+            raise ValueError(f"no page at {url}")
+
+        rws_check = RwsCheck(
+            rws_sites=self.json_dict,
+            etlds=None,
+            icanns=set(),
+            fetcher=RwsFetcher(max_concurrency=4),
+        )
+        with mock.patch.object(
+            rws_check, "open_and_load_json", side_effect=slow_open_and_load_json
+        ):
+            rws_check.find_invalid_well_known(rws_check.load_sets())
+        self.assertEqual(
+            rws_check.error_list,
+            [
+                f"Experienced an error when trying to access {site}{WELL_KNOWN}; "
+                + f"error was: no page at {site}{WELL_KNOWN}"
+                for site in [
+                    "https://primary2.com",
+                    "https://associated1.com",
+                    "https://primary3.com",
+                    "https://associated2.com",
+                ]
+            ],
+        )
+
+    def test_concurrency_limit(self):
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def counting_fetch(url):
+            with lock:
+                in_flight.append(url)
+                peak.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(url)
+            return url
+
+        fetcher = RwsFetcher(max_concurrency=2)
+        urls = [f"https://site{i}.com" for i in range(10)]
+        self.assertEqual(
+            fetcher.fetch_all(counting_fetch, urls), {url: url for url in urls}
+        )
+        self.assertLessEqual(max(peak), 2)
+
+
+class TestPooledSession(unittest.TestCase):
+    """A test suite for the pooled session shared by the network checks"""
+
+    def test_checks_share_session(self):
+        json_dict = {
+            "sets": [
+                {
+                    "primary": "https://primary.com",
+                    "serviceSites": ["https://service1.com"],
+                }
+            ]
+        }
+        rws_check = RwsCheck(rws_sites=json_dict, etlds=None, icanns=set())
+        loaded_sets = rws_check.load_sets()
+        with mock.patch.object(
+            rws_check.fetcher.session, "request", side_effect=mock_request
+        ) as session_request:
+            rws_check.find_robots_tag(loaded_sets)
+            rws_check.find_ads_txt(loaded_sets)
+            rws_check.check_for_service_redirect(loaded_sets)
+        # The service site did not redirect, so the redirect check reuses the
+        # response fetched by the robots check.
+        self.assertEqual(
+            [call.args[1] for call in session_request.call_args_list],
+            ["https://service1.com", "https://service1.com/ads.txt"],
+        )
+        self.assertEqual(
+            rws_check.error_list,
+            [
+                "The service site https://service1.com does not have an "
+                + "X-Robots-Tag in its header",
+                "The service site https://service1.com has an ads.txt file, this "
+                + "violates the policies for service sites",
+                "The service site must not be an endpoint: https://service1.com",
+            ],
+        )
+
+    def test_connections_are_reused(self):
+        class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        ).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        fetcher = RwsFetcher()
+        for _ in range(3):
+            fetcher.get(f"http://127.0.0.1:{server.server_port}{WELL_KNOWN}")
+        self.assertEqual(
+            fetcher.connection_stats(),
+            {"requests": 3, "connections": 1, "reused": 2},
+        )
+
+    def test_build_fetcher(self):
+        fetcher = build_fetcher(
+            {"max_concurrency": 3, "max_attempts": 5, "head_probes": False}
+        )
+        self.assertEqual(fetcher.max_concurrency, 3)
+        self.assertEqual(fetcher.retry_policy.max_attempts, 5)
+        self.assertFalse(fetcher.head_probes)
+        self.assertIsNone(fetcher.http_cache)
+        self.assertIsNotNone(fetcher.resolver)
+
+
+class TestSharedResponses(unittest.TestCase):
+    """A test suite for the responses shared between checks by RwsFetcher"""
+
+    def test_concurrent_callers_share_one_request(self):
+        fetcher = RwsFetcher()
+        with mock.patch.object(
+            fetcher, "get", side_effect=lambda url, **kwargs: make_response(url)
+        ) as get:
+            results = fetcher.fetch_all(
+                fetcher.get_shared, ["https://service1.com"] * 5
+            )
+            fetcher.get_shared("https://service1.com")
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(results["https://service1.com"].status_code, 200)
+
+    def test_redirect_is_followed_from_next_hop(self):
+        fetcher = RwsFetcher()
+        responses = {
+            ("https://service.com", False): make_response(
+                "https://service.com", 301, {"Location": "https://www.service.com/"}
+            ),
+            ("https://www.service.com/", True): make_response(
+                "https://www.example.com/"
+            ),
+        }
+        with mock.patch.object(
+            fetcher,
+            "get",
+            side_effect=lambda url, allow_redirects: responses[(url, allow_redirects)],
+        ) as get:
+            unfollowed = fetcher.get_shared("https://service.com", False)
+            followed = fetcher.get_shared("https://service.com", True)
+        self.assertEqual(unfollowed.status_code, 301)
+        self.assertEqual(followed.url, "https://www.example.com/")
+        self.assertEqual(get.call_count, 2)
+
+    def test_errors_are_shared(self):
+        fetcher = RwsFetcher()
+        with mock.patch.object(
+            fetcher, "get", side_effect=requests.ConnectionError("refused")
+        ) as get:
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    fetcher.get_shared("https://service.com")
+        self.assertEqual(get.call_count, 1)
+
+
+class TestHttpCache(unittest.TestCase):
+    """A test suite for the on-disk RwsHttpCache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_workers_write_separate_temporary_files(self):
+        cache = RwsHttpCache(self.cache_dir.name)
+        path = os.path.join(self.cache_dir.name, "entry.json")
+        tmp_paths = []
+        with mock.patch("os.replace", lambda src, dst: tmp_paths.append(src)):
+            for pid in [101, 102]:
+                with mock.patch("os.getpid", return_value=pid):
+                    cache._save(path, {"stored": 0})
+        self.assertEqual(len(set(tmp_paths)), 2)
+
+    def test_not_modified_is_a_hit(self):
+        url = "https://primary.com" + WELL_KNOWN
+        body = b'{"primary": "https://primary.com"}'
+        session = mock.Mock()
+        session.get.side_effect = [
+            make_response(url, 200, {"ETag": '"v1"'}, body),
+            make_response(url, 304),
+        ]
+        cache = RwsHttpCache(self.cache_dir.name)
+        self.assertEqual(cache.get(session, url).json(), json.loads(body))
+        self.assertEqual(cache.get(session, url).json(), json.loads(body))
+        self.assertEqual(
+            session.get.call_args_list[1].kwargs["headers"],
+            {"If-None-Match": '"v1"'},
+        )
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_changed_page_is_replaced(self):
+        url = "https://primary.com" + WELL_KNOWN
+        session = mock.Mock()
+        session.get.side_effect = [
+            make_response(url, 200, {"Last-Modified": "Mon"}, b'{"v": 1}'),
+            make_response(url, 200, {"Last-Modified": "Tue"}, b'{"v": 2}'),
+            make_response(url, 304),
+        ]
+        cache = RwsHttpCache(self.cache_dir.name)
+        cache.get(session, url)
+        self.assertEqual(cache.get(session, url).json(), {"v": 2})
+        self.assertEqual(cache.get(session, url).json(), {"v": 2})
+        self.assertEqual(
+            session.get.call_args_list[2].kwargs["headers"],
+            {"If-Modified-Since": "Tue"},
+        )
+
+    def test_expired_entries_are_not_revalidated(self):
+        url = "https://primary.com" + WELL_KNOWN
+        session = mock.Mock()
+        session.get.return_value = make_response(url, 200, {"ETag": '"v1"'}, b"{}")
+        cache = RwsHttpCache(self.cache_dir.name, ttl=-1)
+        cache.get(session, url)
+        cache.get(session, url)
+        self.assertNotIn("headers", session.get.call_args_list[1].kwargs)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 2})
+
+    def test_prune_evicts_least_recently_used(self):
+        session = mock.Mock()
+        cache = RwsHttpCache(self.cache_dir.name)
+        for i in range(3):
+            url = f"https://site{i}.com" + WELL_KNOWN
+            session.get.return_value = make_response(
+                url, 200, {"ETag": '"v1"'}, b"x" * 100
+            )
+            cache.get(session, url)
+        paths = sorted(
+            os.scandir(self.cache_dir.name), key=lambda entry: entry.stat().st_mtime
+        )
+        for age, entry in enumerate(paths):
+            os.utime(entry.path, (1000 + age, 1000 + age))
+        cache.ttl = float("inf")
+        cache.max_bytes = sum(entry.stat().st_size for entry in paths[1:])
+        cache.prune()
+        self.assertEqual(
+            sorted(entry.name for entry in os.scandir(self.cache_dir.name)),
+            sorted(entry.name for entry in paths[1:]),
+        )
+
+
+class TestRateLimiter(unittest.TestCase):
+    """A test suite for RwsRateLimiter and its token buckets"""
+
+    def test_token_bucket(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0, 0, 0.5, 1.0])
+        now[0] = 2.0
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_hosts_are_limited_separately(self):
+        waits = []
+        limiter = RwsRateLimiter(
+            host_rate=1, host_burst=1, ip_rate=None, sleep=waits.append
+        )
+        for url in ["https://a.com/1", "https://b.com/1", "https://a.com/2"]:
+            limiter.acquire(url)
+        self.assertEqual(len(waits), 1)
+        self.assertAlmostEqual(waits[0], 1, places=2)
+
+    def test_hosts_sharing_an_address_are_limited_together(self):
+        waits = []
+        limiter = RwsRateLimiter(
+            host_rate=None,
+            ip_rate=1,
+            ip_burst=1,
+            resolve=lambda host: "192.0.2.1",
+            sleep=waits.append,
+        )
+        limiter.acquire("https://a.com")
+        limiter.acquire("https://b.com")
+        self.assertEqual(len(waits), 1)
+
+    def test_overridden_hosts_share_their_origin(self):
+        waits = []
+        resolve = mock.Mock(return_value="192.0.2.1")
+        limiter = RwsRateLimiter(
+            host_rate=None,
+            ip_rate=1,
+            ip_burst=2,
+            resolve=resolve,
+            sleep=waits.append,
+            host_overrides={"*": "http://127.0.0.1:8080"},
+        ).split(2)
+        limiter.acquire("https://a.com")
+        limiter.acquire("https://b.com")
+        self.assertEqual(len(waits), 1)
+        resolve.assert_not_called()
+
+    def test_round_robin_by_host(self):
+        self.assertEqual(
+            round_robin_by_host(
+                [
+                    "https://a.com/1",
+                    "https://a.com/2",
+                    "https://a.com/3",
+                    "https://b.com/1",
+                    "https://c.com/1",
+                    "https://b.com/2",
+                ]
+            ),
+            [
+                "https://a.com/1",
+                "https://b.com/1",
+                "https://c.com/1",
+                "https://a.com/2",
+                "https://b.com/2",
+                "https://a.com/3",
+            ],
+        )
+
+
+class TestRunDeadline(unittest.TestCase):
+    """A test suite for the run's time budget and adaptive timeouts"""
+
+    def test_timeout_adapts_to_latency(self):
+        fetcher = RwsFetcher(time_budget=3600)
+        self.assertEqual(fetcher.timeout("https://a.com"), (DEFAULT_TIMEOUT,) * 2)
+        for latency in [1.0] * 95 + [9.0] * 5:
+            fetcher._add_latency(latency)
+        self.assertEqual(fetcher.timeout("https://a.com"), (4.0, 4.0))
+        # The p95 is only recomputed every P95_REFRESH_SAMPLES latencies
+        fetcher._add_latency(0.01)
+        self.assertEqual(fetcher.timeout("https://a.com"), (4.0, 4.0))
+        for latency in [0.01] * 500:
+            fetcher._add_latency(latency)
+        self.assertEqual(fetcher.timeout("https://a.com"), (MIN_TIMEOUT,) * 2)
+
+    def test_timeout_is_fixed_without_a_budget(self):
+        fetcher = RwsFetcher()
+        for latency in [0.01] * 100:
+            fetcher._add_latency(latency)
+        self.assertEqual(fetcher.timeout("https://a.com"), (DEFAULT_TIMEOUT,) * 2)
+
+    def test_timeout_is_cut_to_the_deadline(self):
+        fetcher = RwsFetcher(time_budget=1)
+        self.assertLessEqual(max(fetcher.timeout("https://a.com")), 1)
+
+    def test_spent_budget_does_not_wait_on_the_limiter(self):
+        resolve = mock.Mock(return_value="192.0.2.1")
+        sleep = mock.Mock()
+        limiter = RwsRateLimiter(resolve=resolve, sleep=sleep)
+        fetcher = RwsFetcher(rate_limiter=limiter, time_budget=0)
+        with mock.patch.object(fetcher.session, "request") as request:
+            with self.assertRaises(RunDeadlineExceeded):
+                fetcher.get("https://a.com")
+        request.assert_not_called()
+        resolve.assert_not_called()
+        sleep.assert_not_called()
+
+    def test_limiter_does_not_wait_past_the_deadline(self):
+        sleep = mock.Mock()
+        limiter = RwsRateLimiter(host_rate=0.001, host_burst=1, ip_rate=0, sleep=sleep)
+        self.assertTrue(limiter.acquire("https://a.com"))
+        fetcher = RwsFetcher(rate_limiter=limiter, time_budget=60)
+        with mock.patch.object(fetcher.session, "request") as request:
+            with self.assertRaises(RunDeadlineExceeded):
+                fetcher.get("https://a.com")
+        request.assert_not_called()
+        sleep.assert_not_called()
+
+    def test_slow_lookups_stop_at_the_deadline(self):
+        answered = threading.Event()
+        self.addCleanup(answered.set)
+
+        def getaddrinfo(host, port, proto=0):
+            answered.wait()
+            return [(socket.AF_INET, socket.SOCK_STREAM, proto, "", ("192.0.2.1", 0))]
+
+        resolver = RwsResolver(getaddrinfo=getaddrinfo, timeout=60)
+        fetcher = RwsFetcher(
+            rate_limiter=RwsRateLimiter(resolve=resolver.address),
+            resolver=resolver,
+            time_budget=0.2,
+        )
+        start = time.monotonic()
+        fetcher.resolve_hosts(["https://a.com"])
+        with mock.patch.object(fetcher.session, "request") as request:
+            with self.assertRaises(RunDeadlineExceeded):
+                fetcher.get("https://a.com")
+        request.assert_not_called()
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_exhausted_budget_is_reported(self):
+        json_dict = {
+            "sets": [
+                {
+                    "primary": "https://primary.com",
+                    "associatedSites": ["https://associated.com"],
+                    "serviceSites": ["https://service.com"],
+                }
+            ]
+        }
+        rws_check = RwsCheck(
+            rws_sites=json_dict,
+            etlds=None,
+            icanns=set(),
+            fetcher=RwsFetcher(time_budget=0),
+        )
+        loaded_sets = rws_check.load_sets()
+        with mock.patch.object(rws_check.fetcher.session, "request") as request:
+            rws_check.find_invalid_well_known(loaded_sets)
+            rws_check.find_robots_tag(loaded_sets)
+            rws_check.find_ads_txt(loaded_sets)
+            rws_check.check_for_service_redirect(loaded_sets)
+            rws_check.find_invalid_removal(loaded_sets)
+        request.assert_not_called()
+        self.assertEqual(
+            rws_check.error_list,
+            [
+                f"Not evaluated: {check} for {site}; "
+                + "the run's time budget was exhausted"
+                for check, site in [
+                    ("find_invalid_well_known", "https://primary.com"),
+                    ("check_list_sites", "https://associated.com"),
+                    ("check_list_sites", "https://service.com"),
+                    ("find_robots_tag", "https://service.com"),
+                    ("find_ads_txt", "https://service.com"),
+                    ("check_for_service_redirect", "https://service.com"),
+                    ("find_invalid_removal", "https://primary.com"),
+                ]
+            ],
+        )
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """A test suite for RwsRetryPolicy and the classification of errors"""
+
+    def test_error_classification(self):
+        read_timeout = requests.exceptions.ReadTimeout(
+            "Read timed out. (read timeout=3)"
+        )
+        refused = requests.ConnectionError("Connection refused")
+        tls = requests.exceptions.SSLError("certificate verify failed")
+        self.assertTrue(is_unreachable(read_timeout))
+        self.assertTrue(is_unreachable(tls))
+        self.assertFalse(is_unreachable(ValueError("Expecting value")))
+        self.assertTrue(is_transient(read_timeout))
+        self.assertTrue(is_transient(refused))
+        self.assertFalse(is_transient(tls))
+        self.assertFalse(is_transient(RunDeadlineExceeded("https://a.com")))
+        self.assertFalse(is_transient(ReadDeadlineExceeded("https://a.com", 10)))
+        self.assertFalse(is_transient(ResponseTooLarge("https://a.com", 1024)))
+
+    def test_retry_delay(self):
+        policy = RwsRetryPolicy(max_attempts=3, base_delay=1, random=lambda: 1)
+        url = "https://a.com"
+        timeout = requests.Timeout()
+        self.assertEqual(policy.retry_delay(url, 1, error=timeout), 1)
+        self.assertEqual(policy.retry_delay(url, 2, error=timeout), 2)
+        self.assertIsNone(policy.retry_delay(url, 3, error=timeout))
+        self.assertEqual(
+            policy.retry_delay(
+                url, 1, response=make_response(url, 503, {"Retry-After": "3"})
+            ),
+            3,
+        )
+        self.assertIsNone(policy.retry_delay(url, 1, response=make_response(url, 404)))
+        self.assertIsNone(policy.retry_delay(url, 1, error=timeout, time_left=0.5))
+        self.assertIsNone(
+            policy.retry_delay(
+                url, 1, response=make_response(url, 503), retry_statuses=False
+            )
+        )
+        self.assertEqual(policy.retries_by_host, {"a.com": 3})
+
+    def test_retry_budget(self):
+        policy = RwsRetryPolicy(retry_budget=1, random=lambda: 0)
+        self.assertEqual(
+            policy.retry_delay("https://a.com", 1, error=requests.Timeout()), 0
+        )
+        self.assertIsNone(
+            policy.retry_delay("https://b.com", 1, error=requests.Timeout())
+        )
+
+    def test_retry_budget_is_split_between_workers(self):
+        fetcher = RwsFetcher(retry_policy=RwsRetryPolicy(retry_budget=10))
+        fetcher.retry_policy.retries_by_host["a.com"] = 1
+        fetcher.reset_after_fork(3)
+        self.assertEqual(fetcher.retry_policy.retry_budget, 3)
+        self.assertEqual(fetcher.retry_policy.retries_by_host, {})
+
+    def test_concurrency_is_split_between_workers(self):
+        fetcher = RwsFetcher(max_concurrency=10)
+        fetcher.reset_after_fork(3)
+        self.assertEqual(fetcher.max_concurrency, 3)
+        fetcher = RwsFetcher(max_concurrency=2)
+        fetcher.reset_after_fork(3)
+        self.assertEqual(fetcher.max_concurrency, 1)
+
+    def test_fetcher_retries_transient_errors(self):
+        fetcher = RwsFetcher(retry_policy=RwsRetryPolicy(base_delay=0))
+        with mock.patch.object(
+            fetcher.session,
+            "request",
+            side_effect=[
+                requests.ConnectionError("Connection reset by peer"),
+                make_response("https://a.com", 503),
+                make_response("https://a.com"),
+            ],
+        ) as request:
+            self.assertEqual(fetcher.get("https://a.com").status_code, 200)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(fetcher.retry_policy.retries_by_host, {"a.com": 2})
+
+    def test_probes_do_not_retry_transient_statuses(self):
+        fetcher = RwsFetcher(retry_policy=RwsRetryPolicy(base_delay=0))
+        with mock.patch.object(
+            fetcher.session,
+            "request",
+            side_effect=[
+                requests.ConnectionError("Connection reset by peer"),
+                make_response("https://a.com", 503),
+                make_response("https://a.com"),
+            ],
+        ) as request:
+            self.assertEqual(fetcher.probe("https://a.com").status_code, 503)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(fetcher.retry_policy.retries_by_host, {"a.com": 1})
+
+    def test_unreachable_service_site_passes(self):
+        json_dict = {
+            "sets": [
+                {
+                    "primary": "https://primary.com",
+                    "serviceSites": ["https://service.com"],
+                }
+            ]
+        }
+        rws_check = RwsCheck(rws_sites=json_dict, etlds=None, icanns=set())
+        loaded_sets = rws_check.load_sets()
+        with mock.patch.object(
+            rws_check.fetcher.session,
+            "request",
+            side_effect=requests.exceptions.ReadTimeout(
+                "Read timed out. (read timeout=2.5)"
+            ),
+        ):
+            rws_check.find_ads_txt(loaded_sets)
+            rws_check.check_for_service_redirect(loaded_sets)
+        self.assertEqual(rws_check.error_list, [])
+
+
+class TestCassette(unittest.TestCase):
+    """A test suite for recording and replaying the network checks"""
+
+    json_dict = {
+        "sets": [
+            {
+                "primary": "https://primary.com",
+                "serviceSites": [
+                    "https://service1.com",
+                    "https://service3.com",
+                    "https://service6.com",
+                ],
+            }
+        ]
+    }
+
+    @staticmethod
+    def recording_request(method, url, **kwargs):
+        if url == "https://service6.com":
+            raise requests.ConnectionError("Connection refused")
+        response = requests.models.Response()
+        mocked = mock_get(url, **kwargs)
+        response.url = mocked.url
+        response.status_code = mocked.status_code
+        response.headers = mocked.headers or structures.CaseInsensitiveDict()
+        response._content = b""
+        return response
+
+    def run_checks(self, fetcher):
+        rws_check = RwsCheck(
+            rws_sites=self.json_dict, etlds=None, icanns=set(), fetcher=fetcher
+        )
+        loaded_sets = rws_check.load_sets()
+        rws_check.find_robots_tag(loaded_sets)
+        rws_check.find_ads_txt(loaded_sets)
+        rws_check.check_for_service_redirect(loaded_sets)
+        return rws_check.error_list
+
+    def test_record_and_replay(self):
+        recorder = CassetteRecorder()
+        fetcher = RwsFetcher(recorder=recorder)
+        with mock.patch.object(
+            fetcher.session, "request", side_effect=self.recording_request
+        ):
+            recorded_errors = self.run_checks(fetcher)
+        with tempfile.TemporaryDirectory() as cassette_dir:
+            path = os.path.join(cassette_dir, "run.json.gz")
+            recorder.save(path)
+            player = CassettePlayer.load(path, latency_scale=0)
+        fetcher = RwsFetcher(transport=player)
+        with mock.patch.object(fetcher.session, "request") as request:
+            self.assertEqual(self.run_checks(fetcher), recorded_errors)
+        request.assert_not_called()
+        self.assertIn(
+            "Unexpected error for service site: https://service6.com; "
+            + "Received error: Connection refused",
+            recorded_errors,
+        )
+
+    def test_unresolvable_host_is_replayed(self):
+        def getaddrinfo(host, port, proto=0):
+            if host == "dead.com":
+                raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+            return [(socket.AF_INET, socket.SOCK_STREAM, proto, "", ("192.0.2.1", 0))]
+
+        json_dict = {
+            "sets": [
+                {"primary": "https://primary.com", "serviceSites": ["https://dead.com"]}
+            ]
+        }
+
+        def run_checks(fetcher):
+            rws_check = RwsCheck(
+                rws_sites=json_dict, etlds=None, icanns=set(), fetcher=fetcher
+            )
+            loaded_sets = rws_check.load_sets()
+            rws_check.resolve_hosts(loaded_sets)
+            rws_check.find_robots_tag(loaded_sets)
+            rws_check.find_ads_txt(loaded_sets)
+            rws_check.check_for_service_redirect(loaded_sets)
+            return rws_check.error_list
+
+        recorder = CassetteRecorder()
+        fetcher = RwsFetcher(
+            recorder=recorder, resolver=RwsResolver(getaddrinfo=getaddrinfo)
+        )
+        with mock.patch.object(
+            fetcher.session, "request", side_effect=self.recording_request
+        ):
+            recorded_errors = run_checks(fetcher)
+        self.assertEqual(
+            recorded_errors,
+            [
+                "Unexpected error for service site: https://dead.com; "
+                + "Received error: dead.com could not be resolved (NXDOMAIN)"
+            ],
+        )
+        with tempfile.TemporaryDirectory() as cassette_dir:
+            path = os.path.join(cassette_dir, "run.json.gz")
+            recorder.save(path)
+            player = CassettePlayer.load(path, latency_scale=0)
+        self.assertEqual(run_checks(RwsFetcher(transport=player)), recorded_errors)
+
+    def test_replayed_redirect_is_followed(self):
+        recorder = CassetteRecorder()
+        redirect = requests.models.Response()
+        redirect.url = "https://service.com/"
+        redirect.status_code = 301
+        redirect.headers = structures.CaseInsensitiveDict(
+            {"Location": "https://primary.com/"}
+        )
+        redirect._content = b""
+        recorder.record(
+            "https://service.com", {"allow_redirects": False}, 0, response=redirect
+        )
+        recorder.record(
+            "https://primary.com/",
+            {},
+            0,
+            response=self.recording_request("GET", "https://primary.com"),
+        )
+        fetcher = RwsFetcher(
+            transport=CassettePlayer(recorder._interactions, latency_scale=0)
+        )
+        response = fetcher.get_shared("https://service.com", allow_redirects=False)
+        self.assertEqual(response.status_code, 301)
+        response = fetcher.get_shared("https://service.com")
+        self.assertEqual(response.url, "https://primary.com")
+
+    def test_replayed_redirect_is_followed_by_probes(self):
+        recorder = CassetteRecorder()
+        redirect = requests.models.Response()
+        redirect.url = "https://service.com/"
+        redirect.status_code = 301
+        redirect.headers = structures.CaseInsensitiveDict(
+            {"Location": "https://primary.com/"}
+        )
+        redirect._content = b""
+        recorder.record(
+            "https://service.com",
+            {"allow_redirects": False},
+            0,
+            response=redirect,
+            method="HEAD",
+        )
+        recorder.record(
+            "https://primary.com/",
+            {},
+            0,
+            response=self.recording_request("HEAD", "https://primary.com"),
+            method="HEAD",
+        )
+        fetcher = RwsFetcher(
+            transport=CassettePlayer(recorder._interactions, latency_scale=0)
+        )
+        response = fetcher.get_shared(
+            "https://service.com", allow_redirects=False, probe=True
+        )
+        self.assertEqual(response.status_code, 301)
+        response = fetcher.get_shared("https://service.com", probe=True)
+        self.assertEqual(response.url, "https://primary.com")
+
+    def test_fetcher_errors_are_replayed(self):
+        recorder = CassetteRecorder()
+        too_large = ResponseTooLarge("https://a.com", 1024)
+        too_slow = ReadDeadlineExceeded("https://b.com", 10)
+        recorder.record("https://a.com", {}, 0, error=too_large)
+        recorder.record("https://b.com", {}, 0, error=too_slow)
+        with tempfile.TemporaryDirectory() as cassette_dir:
+            path = os.path.join(cassette_dir, "run.json.gz")
+            recorder.save(path)
+            player = CassettePlayer.load(path, latency_scale=0)
+        with self.assertRaises(ResponseTooLarge) as context:
+            player.get("https://a.com")
+        self.assertEqual(str(context.exception), str(too_large))
+        with self.assertRaises(ReadDeadlineExceeded) as context:
+            player.get("https://b.com")
+        self.assertEqual(str(context.exception), str(too_slow))
+        self.assertFalse(is_transient(context.exception))
+
+    def test_latency_is_scaled(self):
+        sleeps = []
+        recorder = CassetteRecorder()
+        recorder.record(
+            "https://a.com",
+            {},
+            0.5,
+            response=self.recording_request("GET", "https://a.com"),
+        )
+        player = CassettePlayer(
+            recorder._interactions, latency_scale=2, sleep=sleeps.append
+        )
+        self.assertEqual(player.get("https://a.com").status_code, 404)
+        self.assertEqual(sleeps, [1.0])
+
+    def test_unrecorded_request(self):
+        player = CassettePlayer([], latency_scale=0)
+        with self.assertRaises(CassetteMiss):
+            player.get("https://a.com")
+
+
+class TestWellKnownServer(unittest.TestCase):
+    """A test suite for running the network checks against a local
+    WellKnownServer through host overrides"""
+
+    def start_server(self, rws_sites, faults=None):
+        server = WellKnownServer(rws_sites, faults)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_synthetic_sets_pass_network_checks(self):
+        rws_sites = generate_sets(20)
+        server = self.start_server(rws_sites)
+        fetcher = RwsFetcher(host_overrides={"*": server.origin})
+        rws_check = RwsCheck(rws_sites, etlds=None, icanns=set(), fetcher=fetcher)
+        loaded_sets = rws_check.load_sets()
+        rws_check.find_invalid_well_known(loaded_sets)
+        rws_check.find_robots_tag(loaded_sets)
+        rws_check.find_ads_txt(loaded_sets)
+        rws_check.check_for_service_redirect(loaded_sets)
+        self.assertEqual(rws_check.error_list, [])
+        self.assertGreater(fetcher.connection_stats()["reused"], 0)
+
+    def test_overrides_keep_requested_urls(self):
+        rws_sites = {
+            "sets": [
+                {"primary": "https://primary.com", "serviceSites": ["https://s.com"]}
+            ]
+        }
+        server = self.start_server(rws_sites)
+        fetcher = RwsFetcher(host_overrides={"s.com": server.origin})
+        with self.assertRaises(requests.ConnectionError):
+            RwsFetcher(host_overrides={"s.com": "http://127.0.0.1:1"}).get(
+                "https://s.com"
+            )
+        response = fetcher.get("https://s.com", allow_redirects=False)
+        self.assertEqual(response.url, "https://s.com/")
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertEqual(response.next.url, "https://primary.com/")
+
+    def test_reset_fault(self):
+        rws_sites = generate_sets(1)
+        server = self.start_server(rws_sites, FaultProfile(reset_rate=1))
+        fetcher = RwsFetcher(host_overrides={"*": server.origin})
+        with self.assertRaises(requests.ConnectionError):
+            fetcher.get("https://rws0.com" + WELL_KNOWN)
+
+    def test_timeout_fault(self):
+        rws_sites = generate_sets(1)
+        server = self.start_server(rws_sites, FaultProfile(timeout_rate=1))
+        fetcher = RwsFetcher(host_overrides={"*": server.origin})
+        with self.assertRaises(requests.Timeout):
+            fetcher.get("https://rws0.com" + WELL_KNOWN, timeout=0.1)
+
+    def test_slow_drip_fault(self):
+        rws_sites = generate_sets(1)
+        server = self.start_server(
+            rws_sites, FaultProfile(slow_drip_rate=1, drip_interval=0.01)
+        )
+        fetcher = RwsFetcher(host_overrides={"*": server.origin})
+        response = fetcher.get("https://rws0.com" + WELL_KNOWN)
+        self.assertEqual(response.json()["primary"], "https://rws0.com")
+
+    def test_parse_host_overrides(self):
+        self.assertEqual(
+            parse_host_overrides("*=http://127.0.0.1:8080, a.com=http://[::1]:80"),
+            {"*": "http://127.0.0.1:8080", "a.com": "http://[::1]:80"},
+        )
+        with self.assertRaises(ValueError):
+            parse_host_overrides("a.com")
+
+
+class TestResolver(unittest.TestCase):
+    """A test suite for resolving hosts ahead of the network checks"""
+
+    json_dict = {
+        "sets": [
+            {
+                "primary": "https://primary.com",
+                "serviceSites": ["https://dead.com"],
+                "rationaleBySite": {},
+            }
+        ]
+    }
+
+    @staticmethod
+    def getaddrinfo(host, port, proto=0):
+        if host == "dead.com":
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        if host == "broken.com":
+            raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure")
+        return [(socket.AF_INET, socket.SOCK_STREAM, proto, "", ("192.0.2.1", 0))]
+
+    def test_resolve_all(self):
+        lookups = []
+
+        def getaddrinfo(host, port, proto=0):
+            lookups.append(host)
+            return self.getaddrinfo(host, port, proto)
+
+        resolver = RwsResolver(getaddrinfo=getaddrinfo)
+        resolver.resolve_all(["dead.com", "broken.com", "primary.com", "dead.com"])
+        resolver.resolve_all(["primary.com"])
+        self.assertEqual(sorted(lookups), ["broken.com", "dead.com", "primary.com"])
+        self.assertEqual(resolver.address("primary.com"), "192.0.2.1")
+        self.assertIsNone(resolver.address("dead.com"))
+        self.assertEqual(
+            resolver.unresolvable_hosts(),
+            {"dead.com": "NXDOMAIN", "broken.com": "SERVFAIL"},
+        )
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    def test_dead_hosts_fail_fast(self, mock_request):
+        resolver = RwsResolver(getaddrinfo=self.getaddrinfo)
+        fetcher = RwsFetcher(resolver=resolver, retry_policy=RwsRetryPolicy())
+        rws_check = RwsCheck(
+            rws_sites=self.json_dict, etlds=None, icanns=set(), fetcher=fetcher
+        )
+        loaded_sets = rws_check.load_sets()
+        rws_check.resolve_hosts(loaded_sets)
+        rws_check.find_robots_tag(loaded_sets)
+        rws_check.find_ads_txt(loaded_sets)
+        rws_check.check_for_service_redirect(loaded_sets)
+        self.assertEqual(
+            rws_check.error_list,
+            [
+                "Unexpected error for service site: https://dead.com; "
+                + "Received error: dead.com could not be resolved (NXDOMAIN)"
+            ],
+        )
+        mock_request.assert_not_called()
+        self.assertFalse(is_transient(UnresolvableHost("dead.com", "NXDOMAIN")))
+        self.assertTrue(is_unreachable(UnresolvableHost("dead.com", "NXDOMAIN")))
+
+    def test_overridden_hosts_are_not_resolved(self):
+        resolver = RwsResolver(getaddrinfo=self.getaddrinfo)
+        fetcher = RwsFetcher(
+            resolver=resolver, host_overrides={"dead.com": "http://127.0.0.1:1"}
+        )
+        fetcher.resolve_hosts(["https://dead.com", "https://broken.com"])
+        self.assertEqual(resolver.unresolvable_hosts(), {"broken.com": "SERVFAIL"})
+
+    def test_wait_for_lookups(self):
+        answered = threading.Event()
+
+        def getaddrinfo(host, port, proto=0):
+            answered.wait()
+            return self.getaddrinfo(host, port, proto)
+
+        resolver = RwsResolver(getaddrinfo=getaddrinfo, timeout=0.01)
+        resolver.resolve_all(["primary.com"])
+        self.assertFalse(resolver.wait_for_lookups(0.01))
+        answered.set()
+        self.assertTrue(resolver.wait_for_lookups(10))
+        self.assertEqual(resolver.address("primary.com"), "192.0.2.1")
+
+
+class TestCappedReads(unittest.TestCase):
+    """A test suite for reading well-known files within a size and time
+    limit"""
+
+    def start_server(self, handler):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def body_handler(self, body, drip_interval=0):
+        class BodyHandler(http.server.BaseHTTPRequestHandler):
+            # HTTP/1.0 bodies without a Content-Length end when the
+            # connection closes
+            def do_GET(self):
+                self.send_response(200)
+                self.end_headers()
+                for start in range(0, len(body), 16):
+                    self.wfile.write(body[start : start + 16])
+                    self.wfile.flush()
+                    time.sleep(drip_interval)
+
+            def log_message(self, format, *args):
+                pass
+
+        return BodyHandler
+
+    def test_reads_json(self):
+        origin = self.start_server(self.body_handler(b'{"primary": "a"}'))
+        fetcher = RwsFetcher(max_body_bytes=100)
+        self.assertEqual(fetcher.get_json(origin + WELL_KNOWN), {"primary": "a"})
+
+    def test_declared_length_too_large(self):
+        rws_sites = generate_sets(1)
+        rws_sites["sets"][0]["rationaleBySite"] = {"https://a.com": "x" * 1000}
+        server = WellKnownServer(rws_sites)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        fetcher = RwsFetcher(max_body_bytes=500, host_overrides={"*": server.origin})
+        with self.assertRaises(ResponseTooLarge):
+            fetcher.get_json("https://rws0.com" + WELL_KNOWN)
+
+    def test_streamed_body_too_large(self):
+        origin = self.start_server(self.body_handler(b"[" + b"0," * 5000 + b"0]"))
+        fetcher = RwsFetcher(max_body_bytes=1000)
+        with self.assertRaises(ResponseTooLarge):
+            fetcher.get_json(origin + WELL_KNOWN)
+
+    def test_slow_drip_body(self):
+        origin = self.start_server(
+            self.body_handler(b'{"primary": "a"' + b" " * 160 + b"}", 0.05)
+        )
+        fetcher = RwsFetcher(max_read_time=0.1)
+        with self.assertRaises(ReadDeadlineExceeded):
+            fetcher.get_json(origin + WELL_KNOWN)
+
+    def test_markup_is_not_read(self):
+        origin = self.start_server(
+            self.body_handler(b"  <!doctype html>" + b"<p></p>" * 1000, 0.05)
+        )
+        fetcher = RwsFetcher(max_read_time=1)
+        start = time.monotonic()
+        with self.assertRaises(requests.JSONDecodeError) as cm:
+            fetcher.get_json(origin + WELL_KNOWN)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(str(cm.exception), "Expecting value: line 1 column 3 (char 2)")
+
+
+class TestProbes(unittest.TestCase):
+    """A test suite for probing pages without downloading their bodies"""
+
+    def start_server(self, refuse_head=False):
+        methods = []
+
+        class ProbedHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                methods.append("HEAD")
+                if refuse_head:
+                    self.send_response(405)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_headers()
+
+            def do_GET(self):
+                methods.append("GET")
+                self.send_headers()
+                self.wfile.write(b"x" * 100000)
+
+            def send_headers(self):
+                self.send_response(200)
+                self.send_header("X-Robots-Tag", "noindex")
+                self.send_header("Content-Length", "100000")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ProbedHandler)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}", methods
+
+    def test_head_probe(self):
+        origin, methods = self.start_server()
+        response = RwsFetcher().probe(origin + "/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(methods, ["HEAD"])
+
+    def test_refused_head_falls_back_to_get(self):
+        origin, methods = self.start_server(refuse_head=True)
+        fetcher = RwsFetcher()
+        for path in ["/", "/ads.txt"]:
+            response = fetcher.probe(origin + path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b"")
+        self.assertEqual(methods, ["HEAD", "GET", "GET"])
+
+    def test_get_probes(self):
+        origin, methods = self.start_server()
+        response = RwsFetcher(head_probes=False).probe(origin + "/")
+        self.assertEqual(response.headers["X-Robots-Tag"], "noindex")
+        self.assertEqual(methods, ["GET"])
+
+    def test_full_response_answers_probe(self):
+        origin, methods = self.start_server()
+        fetcher = RwsFetcher()
+        response = fetcher.get_shared(origin + "/")
+        self.assertIs(fetcher.get_shared(origin + "/", probe=True), response)
+        fetcher.get_shared(origin + "/ads.txt", probe=True)
+        self.assertEqual(len(fetcher.get_shared(origin + "/ads.txt").content), 100000)
+        self.assertEqual(methods, ["GET", "HEAD", "GET"])
+
+
+class TestShardedChecks(unittest.TestCase):
+    """A test suite for running the nonbreaking checks in worker processes"""
+
+    @staticmethod
+    def make_checker(rws_sites, fetcher=None):
+        with open("ICANN_domains") as f:
+            icanns = set(f.read().split())
+        return RwsCheck(rws_sites=rws_sites, etlds=psl, icanns=icanns, fetcher=fetcher)
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_same_errors_as_single_process(self, mock_get, mock_open_and_load_json):
+        rws_sites = generate_sets(9)
+        rws_sites["sets"][1]["rationaleBySite"] = {}
+        rws_sites["sets"][4]["primary"] = "http://rws4.com"
+        rws_sites["sets"][7]["associatedSites"] = ["https://not-a-suffix.invalid"]
+        results = []
+        for workers in [1, 3]:
+            rws_check = self.make_checker(rws_sites)
+            error_texts = run_nonbreaking_checks(
+                rws_check, "", False, rws_check.load_sets(), workers
+            )
+            results.append([str(e) for e in error_texts] + rws_check.error_list)
+        self.assertGreater(len(results[0]), 9)
+        self.assertEqual(results[1], results[0])
+
+    def test_worker_stats_are_merged(self):
+        rws_sites = generate_sets(12)
+        server = WellKnownServer(rws_sites)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        fetcher = RwsFetcher(host_overrides={"*": server.origin})
+        rws_check = self.make_checker(rws_sites, fetcher)
+        error_texts = run_nonbreaking_checks(
+            rws_check, "", False, rws_check.load_sets(), workers=3
+        )
+        self.assertEqual(error_texts + rws_check.error_list, [])
+        self.assertGreater(fetcher.connection_stats()["requests"], 12)
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_dead_worker_falls_back_to_single_process(
+        self, mock_get, mock_open_and_load_json
+    ):
+        rws_sites = generate_sets(6)
+        rws_sites["sets"][1]["rationaleBySite"] = {}
+        results = []
+        for workers in [1, 3]:
+            rws_check = self.make_checker(rws_sites)
+            with mock.patch("check_sites._init_worker", side_effect=os._exit):
+                error_texts = run_nonbreaking_checks(
+                    rws_check, "", False, rws_check.load_sets(), workers
+                )
+            results.append([str(e) for e in error_texts] + rws_check.error_list)
+        self.assertGreater(len(results[0]), 0)
+        self.assertEqual(results[1], results[0])
+
+    def test_no_fork_during_lookups(self):
+        answered = threading.Event()
+        self.addCleanup(answered.set)
+
+        def getaddrinfo(host, port, proto=0):
+            answered.wait()
+            return [(socket.AF_INET, socket.SOCK_STREAM, proto, "", ("192.0.2.1", 0))]
+
+        resolver = RwsResolver(getaddrinfo=getaddrinfo, timeout=0.01)
+        rws_sites = generate_sets(4)
+        rws_check = self.make_checker(rws_sites, RwsFetcher(resolver=resolver))
+        check_sets = rws_check.load_sets()
+        rws_check.resolve_hosts(check_sets)
+        with mock.patch("check_sites.FORK_LOOKUP_TIMEOUT", 0.01), mock.patch(
+            "concurrent.futures.ProcessPoolExecutor"
+        ) as executor:
+            results = run_sharded_checks(
+                rws_check, check_sets, 2, ["has_all_rationales"]
+            )
+        self.assertEqual(results, {})
+        executor.assert_not_called()
+
+
+class TestResultCache(unittest.TestCase):
+    """A test suite for caching the findings of the offline checks"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        with open("ICANN_domains") as f:
+            self.icanns = set(f.read().split())
+        self.rws_sites = generate_sets(6)
+        self.rws_sites["sets"][1]["rationaleBySite"] = {}
+        self.rws_sites["sets"][2]["primary"] = "http://rws2.com"
+        self.rws_sites["sets"][3]["associatedSites"] = ["https://a.b.rws3.com"]
+        self.rws_sites["sets"][4]["ccTLDs"] = {"https://rws4.com": ["https://x.zz"]}
+
+    def make_cache(self, input_files=["effective_tld_names.dat", "ICANN_domains"]):
+        return RwsResultCache(self.cache_dir.name, input_files)
+
+    def make_checker(self):
+        return RwsCheck(rws_sites=self.rws_sites, etlds=psl, icanns=self.icanns)
+
+    def expected_results(self):
+        rws_check = self.make_checker()
+        check_sets = rws_check.load_sets()
+        expected = {}
+        for check in CACHEABLE_CHECKS:
+            rws_check.error_list = []
+            getattr(rws_check, check)(check_sets)
+            expected[check] = (rws_check.error_list, [])
+        return expected
+
+    def test_hits_replay_findings(self):
+        expected = self.expected_results()
+        self.assertTrue(all(errors for errors, _ in expected.values()))
+        cache = self.make_cache()
+        rws_check = self.make_checker()
+        check_sets = rws_check.load_sets()
+        self.assertEqual(cache.run_checks(rws_check, check_sets), expected)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 6})
+        cache = self.make_cache()
+        with mock.patch.object(RwsCheck, "find_invalid_eTLD_Plus1") as check:
+            self.assertEqual(cache.run_checks(rws_check, check_sets), expected)
+        check.assert_not_called()
+        self.assertEqual(cache.stats(), {"hits": 6, "misses": 0})
+
+    def test_changed_inputs_miss(self):
+        rws_check = self.make_checker()
+        check_sets = rws_check.load_sets()
+        self.make_cache().run_checks(rws_check, check_sets)
+        self.rws_sites["sets"][0]["contact"] = "someone-else@rws0.com"
+        cache = self.make_cache()
+        cache.run_checks(rws_check, check_sets)
+        self.assertEqual(cache.stats(), {"hits": 5, "misses": 1})
+        cache = self.make_cache(["effective_tld_names.dat"])
+        cache.run_checks(rws_check, check_sets)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 6})
+
+    def test_changed_suffix_index_misses(self):
+        rws_check = self.make_checker()
+        check_sets = rws_check.load_sets()
+        self.make_cache().run_checks(rws_check, check_sets)
+
+        def changed_digest(path):
+            if path.endswith("RwsSuffixIndex.py"):
+                return "changed"
+            return file_digest(path)
+
+        with mock.patch("RwsResultCache.file_digest", side_effect=changed_digest):
+            cache = self.make_cache()
+        cache.run_checks(rws_check, check_sets)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 6})
+
+    def test_prune_evicts_least_recently_used(self):
+        rws_check = self.make_checker()
+        check_sets = rws_check.load_sets()
+        cache = self.make_cache()
+        cache.run_checks(rws_check, check_sets)
+        paths = sorted(
+            (
+                os.path.join(self.cache_dir.name, name)
+                for name in os.listdir(cache.cache_dir)
+            ),
+        )
+        for i, path in enumerate(paths):
+            os.utime(path, (i, i))
+        cache.max_entries = 2
+        cache.prune()
+        self.assertEqual(
+            sorted(os.listdir(cache.cache_dir)),
+            [os.path.basename(path) for path in paths[-2:]],
+        )
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_run_nonbreaking_checks(self, mock_get, mock_open_and_load_json):
+        results = []
+        for result_cache in [None, self.make_cache(), self.make_cache()]:
+            rws_check = self.make_checker()
+            error_texts = run_nonbreaking_checks(
+                rws_check, "", False, rws_check.load_sets(), 1, result_cache
+            )
+            results.append(error_texts + rws_check.error_list)
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(results[2], results[0])
+
+
+class TestSuffixIndex(unittest.TestCase):
+    """A test suite for the compiled public suffix list"""
+
+    def setUp(self):
+        with open("effective_tld_names.dat", "rb") as f:
+            self.index = RwsSuffixIndex(f, memo_size=8)
+
+    def test_matches_publicsuffixlist(self):
+        domains = [
+            "example.com",
+            "www.example.co.uk",
+            "co.uk",
+            "com",
+            "EXAMPLE.Com",
+            "example.com.",
+            "a..com",
+            "",
+            "example.unknowntld",
+            "unknowntld",
+            "city.kawasaki.jp",
+            "www.city.kawasaki.jp",
+            "shop.kawasaki.jp",
+            "a.shop.kawasaki.jp",
+            "kawasaki.jp",
+            "www.ck",
+            "example.ck",
+            "a.example.ck",
+            "example.xn--p1ai",
+            "пример.рф",
+            "github.io",
+            "user.github.io",
+        ]
+        for domain in domains:
+            for accept_unknown in [False, True]:
+                self.assertEqual(
+                    self.index.privatesuffix(domain, accept_unknown=accept_unknown),
+                    psl.privatesuffix(domain, accept_unknown=accept_unknown),
+                    f"{domain} {accept_unknown}",
+                )
+
+    def test_memo(self):
+        for _ in range(3):
+            self.index.privatesuffix("www.example.com", accept_unknown=False)
+        info = self.index.memo_info()
+        self.assertEqual((info.hits, info.misses, info.maxsize), (2, 1, 8))
+
+    def test_privatesuffixes(self):
+        self.assertEqual(
+            self.index.privatesuffixes(
+                ["a.example.com", "co.uk", "a.example.com"], accept_unknown=False
+            ),
+            {"a.example.com": "example.com", "co.uk": None},
+        )
+
+    def test_is_eTLD_Plus1(self):
+        rws_sites = generate_sets(3)
+        rws_sites["sets"][0]["associatedSites"] = ["https://a.rws0.com"]
+        rws_sites["sets"][1]["serviceSites"] = ["https://city.kawasaki.jp"]
+        rws_sites["sets"][2]["ccTLDs"] = {"https://rws2.com": ["https://rws2.co.uk"]}
+        error_lists = []
+        for etlds in [psl, self.index]:
+            rws_check = RwsCheck(rws_sites=rws_sites, etlds=etlds, icanns=set())
+            rws_check.find_invalid_eTLD_Plus1(rws_check.load_sets())
+            error_lists.append(rws_check.error_list)
+        self.assertEqual(
+            error_lists[1],
+            ["The provided associated site is not an eTLD+1: https://a.rws0.com"],
+        )
+        self.assertEqual(error_lists[1], error_lists[0])
+
+
+class TestSnapshot(unittest.TestCase):
+    """A test suite for the snapshot of the suffix list and ICANN domains"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "snapshot")
+        self.psl_path = os.path.join(directory.name, "effective_tld_names.dat")
+        self.icann_path = os.path.join(directory.name, "ICANN_domains")
+        with open(self.psl_path, "w") as f:
+            f.write("// comment\ncom\nco.uk\n*.kawasaki.jp\n!city.kawasaki.jp\n")
+        with open(self.icann_path, "w") as f:
+            f.write("com\nuk\n")
+
+    def load(self):
+        return load_snapshot(self.path, self.psl_path, self.icann_path)
+
+    def test_round_trip(self):
+        root, icanns = compile_sources(self.psl_path, self.icann_path)
+        write_snapshot(self.path, ["a", "b"], root, icanns)
+        self.assertEqual(read_snapshot(self.path), (["a", "b"], root, icanns))
+
+    def test_loads_up_to_date_snapshot(self):
+        etlds, icanns = self.load()
+        self.assertEqual(icanns, {"com", "uk"})
+        self.assertEqual(etlds.privatesuffix("a.b.co.uk"), "b.co.uk")
+        with mock.patch("RwsSnapshot.compile_sources") as compile_mock:
+            etlds, icanns = self.load()
+        compile_mock.assert_not_called()
+        self.assertEqual(icanns, {"com", "uk"})
+        self.assertEqual(etlds.privatesuffix("a.city.kawasaki.jp"), "city.kawasaki.jp")
+
+    def test_rebuilds_when_sources_change(self):
+        self.load()
+        with open(self.icann_path, "a") as f:
+            f.write("jp\n")
+        _, icanns = self.load()
+        self.assertEqual(icanns, {"com", "uk", "jp"})
+        self.assertEqual(read_snapshot(self.path)[2], {"com", "uk", "jp"})
+
+    def test_rebuilds_when_code_changes(self):
+        self.load()
+        with mock.patch("RwsSnapshot.code_digest", return_value=bytes(32)):
+            with self.assertRaisesRegex(SnapshotError, "another version of the code"):
+                read_snapshot(self.path)
+            with mock.patch(
+                "RwsSnapshot.compile_sources", wraps=compile_sources
+            ) as compile_mock:
+                _, icanns = self.load()
+            compile_mock.assert_called_once()
+            self.assertEqual(read_snapshot(self.path)[2], {"com", "uk"})
+        self.assertEqual(icanns, {"com", "uk"})
+
+    def test_rejects_corrupt_snapshot(self):
+        self.load()
+        with open(self.path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 1]))
+        with self.assertRaisesRegex(SnapshotError, "checksum"):
+            read_snapshot(self.path)
+        with open(self.path, "wb") as f:
+            f.write(b"RWS")
+        with self.assertRaisesRegex(SnapshotError, "truncated"):
+            read_snapshot(self.path)
+        _, icanns = self.load()
+        self.assertEqual(icanns, {"com", "uk"})
+        self.assertEqual(read_snapshot(self.path)[2], {"com", "uk"})
+
+    def test_unwritable_snapshot(self):
+        self.path = os.path.join(self.path, "missing", "snapshot")
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            etlds, icanns = self.load()
+        self.assertIn("Could not write the snapshot", stderr.getvalue())
+        self.assertEqual(icanns, {"com", "uk"})
+        self.assertEqual(etlds.privatesuffix("a.com"), "a.com")
+
+
+class TestLazyResources(unittest.TestCase):
+    """A test suite for loading the resources of the checks on demand"""
+
+    def test_resources_load_on_first_use(self):
+        loads = []
+
+        def load(name, value):
+            def loader():
+                loads.append(name)
+                return value
+
+            return loader
+
+        rws_sites = generate_sets(2)
+        rws_check = RwsCheck(
+            rws_sites,
+            load("etlds", psl),
+            load("icanns", {"com"}),
+            fetcher=load("fetcher", RwsFetcher()),
+        )
+        rws_check.validate_schema("SCHEMA.json")
+        check_sets = rws_check.load_sets()
+        rws_check.has_all_rationales(check_sets)
+        self.assertEqual(loads, [])
+        rws_check.find_invalid_eTLD_Plus1(check_sets)
+        rws_check.find_invalid_eTLD_Plus1(check_sets)
+        self.assertEqual(loads, ["etlds"])
+        self.assertIs(rws_check.etlds, psl)
+        self.assertEqual(rws_check.icanns, {"com"})
+        self.assertIsInstance(rws_check.fetcher, RwsFetcher)
+        self.assertEqual(loads, ["etlds", "icanns", "fetcher"])
+        self.assertEqual(rws_check.error_list, [])
+
+    def test_fetcher_is_not_built_without_sites_to_check(self):
+        loads = []
+
+        def load_fetcher():
+            loads.append("fetcher")
+            return RwsFetcher()
+
+        rws_check = RwsCheck(generate_sets(2), psl, {"com"}, fetcher=load_fetcher)
+        rws_check.resolve_hosts({})
+        rws_check.find_invalid_well_known({})
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            report_run_stats(rws_check)
+        self.assertEqual(loads, [])
+        self.assertEqual(stderr.getvalue(), "")
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_workers_share_resources(self, mock_get, mock_open_and_load_json):
+        # Loads are counted in a file, so that those made by workers count
+        loads_file = tempfile.NamedTemporaryFile("w+")
+        self.addCleanup(loads_file.close)
+
+        def load(name, value):
+            def loader():
+                with open(loads_file.name, "a") as f:
+                    f.write(name + "\n")
+                return value
+
+            return loader
+
+        rws_check = RwsCheck(
+            generate_sets(6),
+            load("etlds", psl),
+            load("icanns", {"com"}),
+            fetcher=load("fetcher", RwsFetcher()),
+        )
+        run_nonbreaking_checks(rws_check, "", False, rws_check.load_sets(), 3)
+        self.assertEqual(
+            sorted(loads_file.read().split()), ["etlds", "fetcher", "icanns"]
+        )
+
+
+class TestSiteIndex(unittest.TestCase):
+    """A test suite for the index of the sites of a list"""
+
+    def setUp(self):
+        self.check_sets = {
+            "https://primary.com": RwsSet(
+                ccTLDs={"https://primary.com": ["https://primary.ca"]},
+                primary="https://primary.com",
+                associated_sites=["https://associated.com"],
+                service_sites=["https://service.com"],
+            ),
+            "https://primary2.com": RwsSet(
+                ccTLDs={},
+                primary="https://primary2.com",
+                associated_sites=["https://associated.com", "https://primary.ca"],
+            ),
+        }
+        self.index = RwsSiteIndex(self.check_sets)
+
+    def test_roles(self):
+        self.assertEqual(
+            self.index.roles("https://primary.com"),
+            [("https://primary.com", "primary"), ("https://primary.com", "aliased")],
+        )
+        self.assertEqual(
+            self.index.roles("https://associated.com"),
+            [
+                ("https://primary.com", "associated"),
+                ("https://primary2.com", "associated"),
+            ],
+        )
+        self.assertEqual(self.index.roles("https://other.com"), [])
+        self.assertIn("https://service.com", self.index)
+        self.assertEqual(len(self.index), 5)
+
+    def test_primaries(self):
+        self.assertEqual(
+            self.index.primaries("https://primary.ca"),
+            ["https://primary.com", "https://primary2.com"],
+        )
+        self.assertEqual(
+            self.index.primaries("https://primary.ca", with_ccTLDs=False),
+            ["https://primary2.com"],
+        )
+
+    def test_includes_matches_sets(self):
+        sites = list(self.index._sites) + ["https://other.com"]
+        for site in sites:
+            for with_ccTLDs in [True, False]:
+                self.assertEqual(
+                    self.index.includes(site, with_ccTLDs),
+                    any(
+                        rws.includes(site, with_ccTLDs)
+                        for rws in self.check_sets.values()
+                    ),
+                    f"{site} {with_ccTLDs}",
+                )
+
+    def test_find_diff_sets_keeps_moved_primaries(self):
+        old_sets = dict(self.check_sets)
+        old_sets["https://primary3.com"] = RwsSet(
+            ccTLDs={}, primary="https://primary3.com"
+        )
+        old_sets["https://primary.ca"] = RwsSet(ccTLDs={}, primary="https://primary.ca")
+        self.assertEqual(
+            find_diff_sets(old_sets, self.check_sets),
+            ({}, {"https://primary3.com": old_sets["https://primary3.com"]}),
+        )
+
+
+class TestFrozenRwsSet(unittest.TestCase):
+    """A test suite for the immutable, hashable variant of RwsSet"""
+
+    def setUp(self):
+        self.fields = {
+            "ccTLDs": {
+                "https://primary.com": ["https://primary.ca"],
+                "https://associated.com": ["https://associated.ca"],
+            },
+            "primary": "https://primary.com",
+            "associated_sites": ["https://associated.com"],
+            "service_sites": ["https://service.com"],
+        }
+        self.rws = FrozenRwsSet(**self.fields)
+
+    def test_reads_as_rws_set(self):
+        self.assertEqual(self.rws.primary, "https://primary.com")
+        self.assertEqual(self.rws.associated_sites, ["https://associated.com"])
+        self.assertEqual(self.rws.service_sites, ["https://service.com"])
+        self.assertEqual(self.rws.ccTLDs, self.fields["ccTLDs"])
+        self.assertEqual(FrozenRwsSet(None, None).associated_sites, [])
+
+    def test_equals_rws_set(self):
+        self.assertEqual(self.rws, RwsSet(**self.fields))
+        self.assertEqual(RwsSet(**self.fields), self.rws)
+        self.assertEqual(FrozenRwsSet.from_set(RwsSet(**self.fields)), self.rws)
+        self.assertNotEqual(self.rws, RwsSet(**{**self.fields, "service_sites": []}))
+
+    def test_ccTLD_order_is_ignored(self):
+        reordered = FrozenRwsSet(
+            **{**self.fields, "ccTLDs": dict(reversed(self.fields["ccTLDs"].items()))}
+        )
+        self.assertEqual(reordered, self.rws)
+        self.assertEqual(hash(reordered), hash(self.rws))
+
+    def test_roles_are_distinguished(self):
+        moved = FrozenRwsSet(
+            ccTLDs=self.fields["ccTLDs"],
+            primary="https://primary.com",
+            associated_sites=[],
+            service_sites=["https://associated.com", "https://service.com"],
+        )
+        self.assertNotEqual(moved, self.rws)
+
+    def test_hashable(self):
+        copy = FrozenRwsSet(**self.fields)
+        self.assertEqual(hash(copy), hash(self.rws))
+        self.assertEqual({self.rws: "found"}[copy], "found")
+        self.assertEqual(len({self.rws, copy}), 1)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.rws.primary = "https://other.com"
+        self.rws.associated_sites.append("https://other.com")
+        self.assertEqual(self.rws.associated_sites, ["https://associated.com"])
+        self.assertFalse(hasattr(self.rws, "__dict__"))
+
+    def test_includes(self):
+        for site in [
+            "https://primary.com",
+            "https://associated.com",
+            "https://service.com",
+            "https://associated.ca",
+        ]:
+            self.assertTrue(self.rws.includes(site))
+        self.assertFalse(self.rws.includes("https://associated.ca", False))
+        self.assertFalse(self.rws.includes("https://other.com"))
+
+    def test_load_sets(self):
+        loaded_sets = RwsCheck(generate_sets(50, 0), None, set()).load_sets()
+        for primary, rws in loaded_sets.items():
+            self.assertIsInstance(rws, FrozenRwsSet)
+            self.assertEqual(
+                rws,
+                RwsSet(rws.ccTLDs, primary, rws.associated_sites, rws.service_sites),
+            )
+
+
+class TestMemberDiff(unittest.TestCase):
+    """A test suite for the member level diff of --with_diff"""
+
+    def setUp(self):
+        self.old_sites = {
+            "sets": [
+                {
+                    "primary": "https://primary.com",
+                    "associatedSites": [
+                        "https://associated1.com",
+                        "https://associated2.com",
+                    ],
+                    "serviceSites": ["https://service1.com"],
+                    "ccTLDs": {"https://primary.com": ["https://primary.ca"]},
+                    "rationaleBySite": {
+                        "https://associated1.com": "Brand",
+                        "https://associated2.com": "Brand",
+                        "https://service1.com": "Login",
+                    },
+                },
+                {
+                    "primary": "https://primary2.com",
+                    "associatedSites": ["https://associated3.com"],
+                    "rationaleBySite": {"https://associated3.com": "Brand"},
+                },
+            ]
+        }
+        self.new_sites = json.loads(json.dumps(self.old_sites))
+
+    def find_diffs(self):
+        return find_member_diffs(
+            RwsCheck(self.old_sites, None, set()).load_sets(),
+            RwsCheck(self.new_sites, None, set()).load_sets(),
+            self.old_sites,
+            self.new_sites,
+        )
+
+    def test_unchanged(self):
+        self.assertEqual(self.find_diffs(), {})
+
+    def test_added_and_removed_members(self):
+        rws = self.new_sites["sets"][0]
+        rws["associatedSites"] = ["https://associated1.com", "https://new.com"]
+        rws["ccTLDs"]["https://primary.com"].append("https://primary.co.uk")
+        diffs = self.find_diffs()
+        self.assertEqual(
+            diffs,
+            {
+                "https://primary.com": RwsSetDiff(
+                    "https://primary.com",
+                    added={
+                        "associated": ["https://new.com"],
+                        "alias": ["https://primary.co.uk"],
+                    },
+                    removed={"associated": ["https://associated2.com"]},
+                    changed={"https://primary.com": ["aliases"]},
+                )
+            },
+        )
+        self.assertEqual(
+            diffs["https://primary.com"].affected_sites(),
+            ["https://new.com", "https://primary.co.uk"],
+        )
+
+    def test_moved_member(self):
+        rws = self.new_sites["sets"][0]
+        rws["associatedSites"] = ["https://associated1.com"]
+        rws["serviceSites"].append("https://associated2.com")
+        diff = self.find_diffs()["https://primary.com"]
+        self.assertEqual(diff.added, {"service": ["https://associated2.com"]})
+        self.assertEqual(diff.removed, {"associated": ["https://associated2.com"]})
+        self.assertEqual(diff.affected_sites(), ["https://associated2.com"])
+
+    def test_rationale_edit(self):
+        self.new_sites["sets"][1]["rationaleBySite"][
+            "https://associated3.com"
+        ] = "Shared branding"
+        diff = self.find_diffs()["https://primary2.com"]
+        self.assertEqual(diff.changed, {"https://associated3.com": ["rationale"]})
+        self.assertEqual(diff.affected_sites(), [])
+
+    def test_reordered_members(self):
+        self.new_sites["sets"][0]["associatedSites"].reverse()
+        diff = self.find_diffs()["https://primary.com"]
+        self.assertFalse(diff)
+        self.assertEqual(diff.affected_sites(), [])
+
+    def test_new_set(self):
+        rws = RwsSet({}, "https://primary.com", ["https://associated1.com"])
+        diff = diff_set("https://primary.com", None, rws)
+        self.assertEqual(
+            diff.affected_sites(), ["https://primary.com", "https://associated1.com"]
+        )
+
+    def test_checks_only_affected_sites(self):
+        rws_check = RwsCheck(
+            self.old_sites,
+            None,
+            set(),
+            affected_sites={"https://associated2.com"},
+        )
+        check_sets = rws_check.load_sets()
+        with mock.patch.object(
+            rws_check, "open_and_load_json", side_effect=mock_open_and_load_json
+        ) as open_and_load_json:
+            rws_check.find_invalid_well_known(check_sets)
+        self.assertEqual(
+            sorted(call.args[0] for call in open_and_load_json.call_args_list),
+            [
+                "https://associated2.com" + WELL_KNOWN,
+                "https://primary.com" + WELL_KNOWN,
+                "https://primary2.com" + WELL_KNOWN,
+            ],
+        )
+        with mock.patch.object(rws_check.fetcher, "get_shared") as get_shared:
+            rws_check.find_robots_tag(check_sets)
+            rws_check.find_ads_txt(check_sets)
+            rws_check.check_for_service_redirect(check_sets)
+        get_shared.assert_not_called()
+
+
+class TestReporter(unittest.TestCase):
+    """A test suite for publishing findings as they are found"""
+
+    NO_RATIONALES = {
+        "sets": [
+            {
+                "primary": "https://primary4.com",
+                "associatedSites": ["https://associated3.com"],
+                "rationaleBySite": {},
+            }
+        ]
+    }
+
+    @staticmethod
+    def tick_clock():
+        # A clock that advances by a second each time it is read
+        ticks = iter(range(1000))
+        return lambda: next(ticks)
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_findings_are_published_by_check(self, mock_get, mock_open_and_load_json):
+        records = []
+        reporter = RwsReporter([CallbackSink(records.append)], self.tick_clock())
+        rws_check = RwsCheck(
+            rws_sites=self.NO_RATIONALES, etlds=psl, icanns=set(), reporter=reporter
+        )
+        error_texts = run_nonbreaking_checks(
+            rws_check, "", False, rws_check.load_sets()
+        )
+        self.assertEqual(
+            error_texts + rws_check.error_list,
+            ["There is no provided rationale for https://associated3.com"],
+        )
+        self.assertEqual(
+            records,
+            [
+                {
+                    "check": "has_all_rationales",
+                    "finding": "There is no provided rationale for "
+                    + "https://associated3.com",
+                    "seconds": 1,
+                }
+            ],
+        )
+        self.assertEqual(reporter.first_finding, 1)
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_worker_findings_are_published_once(
+        self, mock_get, mock_open_and_load_json
+    ):
+        rws_sites = generate_sets(6)
+        rws_sites["sets"][1]["rationaleBySite"] = {}
+        rws_sites["sets"][4]["primary"] = "http://rws4.com"
+        records = []
+        reporter = RwsReporter([CallbackSink(records.append)])
+        rws_check = RwsCheck(
+            rws_sites=rws_sites, etlds=psl, icanns=set(), reporter=reporter
+        )
+        error_texts = run_nonbreaking_checks(
+            rws_check, "", False, rws_check.load_sets(), workers=3
+        )
+        self.assertGreater(len(records), 2)
+        self.assertEqual(
+            [record["finding"] for record in records],
+            [str(e) for e in rws_check.error_list + error_texts],
+        )
+
+    def test_stdout_sink(self):
+        for findings, output in [
+            ([], "success"),
+            (["one", ValueError("two")], "one\ntwo\n"),
+        ]:
+            stream = io.StringIO()
+            reporter = RwsReporter([StdoutSink(stream)])
+            for finding in findings:
+                reporter.publish(finding)
+            summary = reporter.close()
+            self.assertEqual(stream.getvalue(), output)
+            self.assertEqual(summary["success"], not findings)
+
+    def test_ndjson_sink(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "findings.ndjson")
+            reporter = RwsReporter([NdjsonSink(path)], self.tick_clock())
+            with reporter.checking("find_robots_tag"):
+                reporter.publish("first")
+                with open(path) as f:
+                    # Written before the run ends
+                    self.assertEqual(len(f.readlines()), 1)
+            reporter.publish("second", "find_ads_txt")
+            reporter.close()
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual(
+            events,
+            [
+                {
+                    "event": "finding",
+                    "check": "find_robots_tag",
+                    "finding": "first",
+                    "seconds": 1,
+                },
+                {
+                    "event": "finding",
+                    "check": "find_ads_txt",
+                    "finding": "second",
+                    "seconds": 2,
+                },
+                {
+                    "event": "summary",
+                    "findings": 2,
+                    "success": False,
+                    "time_to_first_finding": 1,
+                    "seconds": 3,
+                },
+            ],
+        )
+        self.assertEqual(reporter.report(), "Findings: 2, the first after 1000.0 ms")
+
+
+class TestTimings(unittest.TestCase):
+    """A test suite for timing the checks and the requests of a run"""
+
+    def start_server(self, rws_sites, faults=None):
+        server = WellKnownServer(rws_sites, faults)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_timer(self):
+        now = [0.0]
+        timer = RwsTimer(clock=lambda: now[0])
+        with timer.phase("parse"):
+            now[0] += 0.25
+        load = timer.timed("load", lambda value: now.__setitem__(0, now[0] + value))
+        load(0.5)
+        load(0.25)
+        self.assertEqual(timer.phases(), {"parse": 0.25, "load": 0.75})
+        self.assertEqual(timer.report(), "Phases: parse 250.0 ms, load 750.0 ms")
+
+    def test_requests_are_logged_by_host(self):
+        rws_sites = generate_sets(2)
+        server = self.start_server(rws_sites)
+        request_log = RwsRequestLog()
+        fetcher = RwsFetcher(
+            host_overrides={"*": server.origin, "down.com": "http://127.0.0.1:1"},
+            request_log=request_log,
+        )
+        well_known = fetcher.get_json("https://rws0.com" + WELL_KNOWN)
+        fetcher.probe("https://rws1.com/robots.txt")
+        with self.assertRaises(requests.ConnectionError):
+            fetcher.get("https://down.com")
+        hosts = request_log.by_host()
+        self.assertEqual(list(hosts), ["rws0.com", "rws1.com", "down.com"])
+        self.assertEqual(hosts["rws0.com"]["statuses"], {"200": 1})
+        self.assertEqual(
+            hosts["rws0.com"]["bytes"], len(json.dumps(well_known).encode())
+        )
+        self.assertEqual(hosts["rws1.com"]["entries"][0]["method"], "HEAD")
+        self.assertEqual(hosts["rws1.com"]["bytes"], 0)
+        self.assertEqual(hosts["down.com"]["statuses"], {"ConnectionError": 1})
+        self.assertIsNone(hosts["down.com"]["entries"][0]["bytes"])
+
+    def test_slowest_hosts(self):
+        request_log = RwsRequestLog()
+        for host, seconds in [("a.com", 1), ("b.com", 3), ("a.com", 3), ("c.com", 2)]:
+            request_log.record("GET", f"https://{host}", seconds, error=Exception())
+        self.assertEqual(
+            request_log.slowest_hosts(2), [("a.com", 4, 2), ("b.com", 3, 1)]
+        )
+
+    @mock.patch("requests.Session.request", side_effect=mock_request)
+    @mock.patch(
+        "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
+    )
+    def test_checks_are_timed(self, mock_get, mock_open_and_load_json):
+        for workers in [1, 3]:
+            rws_check = RwsCheck(rws_sites=generate_sets(6), etlds=psl, icanns=set())
+            timer = RwsTimer()
+            run_nonbreaking_checks(
+                rws_check, "", True, rws_check.load_sets(), workers, timer=timer
+            )
+            self.assertEqual(
+                list(timer.phases()),
+                ["find_format_diff", "check_exclusivity"] + NONBREAKING_CHECKS,
+            )
+
+    def test_write_timings(self):
+        timer = RwsTimer()
+        timer.add("load_sets", 0.5)
+        request_log = RwsRequestLog()
+        request_log.record("GET", "https://a.com/x", 0.25, error=Exception())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "timings.json")
+            with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                write_timings(path, timer, request_log)
+            with open(path) as f:
+                report = json.load(f)
+        self.assertEqual(report["phases"], {"load_sets": 0.5})
+        self.assertEqual(report["hosts"]["a.com"]["requests"], 1)
+        self.assertEqual(
+            report["slowest_hosts"],
+            [{"host": "a.com", "seconds": 0.25, "requests": 1}],
+        )
+        self.assertEqual(
+            stderr.getvalue(), "Slowest hosts: a.com 250.0 ms (1 requests)\n"
+        )
+
+
 class TestRunNonbreakingChecks(unittest.TestCase):
     """A test suite for the run_nonbreaking_checks function.
     Uses mock_get and mock_open_and_load_json."""
@@ -1651,7 +3901,7 @@ class TestRunNonbreakingChecks(unittest.TestCase):
 }
 """
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     @mock.patch(
         "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
     )
@@ -1670,7 +3920,7 @@ class TestRunNonbreakingChecks(unittest.TestCase):
         )
         self.assertEqual(error_texts + rws_check.error_list, [])
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     @mock.patch(
         "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
     )
@@ -1706,7 +3956,7 @@ error was:
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     @mock.patch(
         "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
     )
@@ -1727,7 +3977,7 @@ error was:
             ["There is no provided rationale for https://associated3.com"],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     @mock.patch(
         "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
     )
@@ -1764,7 +4014,7 @@ error was:
             ],
         )
 
-    @mock.patch("requests.get", side_effect=mock_get)
+    @mock.patch("requests.Session.request", side_effect=mock_request)
     @mock.patch(
         "RwsCheck.RwsCheck.open_and_load_json", side_effect=mock_open_and_load_json
     )